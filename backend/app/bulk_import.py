@@ -0,0 +1,320 @@
+"""Bulk import command for backfilling historical images.
+
+Sends a directory or tar archive of report images (optionally with masks) to
+the storage-service bulk import endpoint, then runs the images that arrived
+without a mask through the vision service in batches and uploads the
+resulting masks, which finalizes those reports.
+
+Usage (inside the backend container or a dev environment):
+
+    python -m app.bulk_import /data/site-images --batch-size 100
+    python -m app.bulk_import archive.tar.gz --vision-concurrency 8
+
+Mask pairing follows storage-service: `masks/<stem>.*` or `<stem>_mask.png`
+is the mask for image `<stem>`, and a stem used by more than one image (or
+mask) fails for all but the first path in sorted order. With several storage
+shards, tar archives are unpacked to a temporary directory first so each
+report goes to its shard.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import mimetypes
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from app.config import STORAGE_SERVICE_URL, REPORTS_API_PREFIX
+from app.routes.upload import upload_steps
+from app.sharding import is_sharded, shard_for
+
+
+def is_mask(path: str) -> bool:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    parent = os.path.basename(os.path.dirname(path))
+    return stem.endswith("_mask") or parent == "masks"
+
+
+def pairing_stem(path: str) -> str:
+    """The stem that images and their masks are paired by."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[: -len("_mask")] if stem.endswith("_mask") else stem
+
+
+def collect_directory(root: str) -> List[str]:
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if name.startswith("."):
+                continue
+            paths.append(os.path.join(dirpath, name))
+    return paths
+
+
+def guess_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+async def _post_batch(
+    client: httpx.AsyncClient,
+    url: str,
+    paths: List[str],
+    masks: Dict[str, str],
+    report_ids: Dict[str, str],
+) -> dict:
+    handles = []
+    files = []
+    try:
+        for p in paths:
+            fh = open(p, "rb")
+            handles.append(fh)
+            files.append(("files", (os.path.basename(p), fh, guess_type(p))))
+            stem = os.path.splitext(os.path.basename(p))[0]
+            if stem in masks:
+                mh = open(masks[stem], "rb")
+                handles.append(mh)
+                files.append(("masks", (f"{stem}_mask.png", mh, "image/png")))
+        resp = await client.post(
+            url, files=files, data={"report_ids": json.dumps(report_ids)}
+        )
+    finally:
+        for fh in handles:
+            fh.close()
+
+    if resp.status_code != 200:
+        raise Exception(f"Bulk import failed: {resp.status_code} {resp.text}")
+    return resp.json()
+
+
+async def import_directory(root: str, batch_size: int) -> Dict[str, dict]:
+    """POST images and masks as multipart batches; return pending items by report_id.
+
+    Report ids are assigned here and each batch is split by owning storage
+    shard, so imported reports land where lookups expect them.
+    """
+    masks: Dict[str, str] = {}
+    by_stem: Dict[str, str] = {}
+    for p in sorted(collect_directory(root)):
+        kind = "mask" if is_mask(p) else "image"
+        seen = masks if kind == "mask" else by_stem
+        stem = pairing_stem(p)
+        if stem in seen:
+            # Same rule as storage's pair_files: the first path wins
+            print(
+                f"❌ {p}: duplicate {kind} for {stem!r} (also {seen[stem]})",
+                flush=True,
+            )
+            continue
+        seen[stem] = p
+    images = list(by_stem.values())
+
+    pending: Dict[str, dict] = {}
+    async with httpx.AsyncClient(timeout=300.0) as client:
+        for start in range(0, len(images), batch_size):
+            chunk = images[start : start + batch_size]
+            # Stems are unique, so basenames are too
+            ids = {os.path.basename(p): str(uuid.uuid4()) for p in chunk}
+            paths_by_id = {ids[os.path.basename(p)]: p for p in chunk}
+            by_shard: Dict[str, List[str]] = {}
+            for report_id, p in paths_by_id.items():
+                by_shard.setdefault(shard_for(report_id), []).append(p)
+
+            results = await asyncio.gather(
+                *(
+                    _post_batch(
+                        client,
+                        f"{base}{REPORTS_API_PREFIX}/import",
+                        shard_paths,
+                        masks,
+                        {
+                            os.path.basename(p): ids[os.path.basename(p)]
+                            for p in shard_paths
+                        },
+                    )
+                    for base, shard_paths in by_shard.items()
+                )
+            )
+            print(
+                f"Imported batch {start // batch_size + 1}: "
+                f"{sum(r['committed'] for r in results)} committed, "
+                f"{sum(r['pending'] for r in results)} pending, "
+                f"{sum(r['failed'] for r in results)} failed",
+                flush=True,
+            )
+            for result in results:
+                for item in result["items"]:
+                    if item.get("committed") is False:
+                        pending[item["report_id"]] = {
+                            "filename": item["filename"],
+                            "path": paths_by_id.get(item["report_id"]),
+                        }
+    return pending
+
+
+async def import_tar(archive: str) -> Dict[str, dict]:
+    """Stream a tar archive to storage-service; return pending items by report_id."""
+    url = f"{STORAGE_SERVICE_URL}{REPORTS_API_PREFIX}/import"
+
+    async def body():
+        with open(archive, "rb") as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+
+    async with httpx.AsyncClient(timeout=None) as client:
+        resp = await client.post(
+            url, content=body(), headers={"Content-Type": "application/x-tar"}
+        )
+    if resp.status_code != 200:
+        raise Exception(f"Bulk import failed: {resp.status_code} {resp.text}")
+    result = resp.json()
+    print(
+        f"Imported archive: {result['committed']} committed, "
+        f"{result['pending']} pending, {result['failed']} failed",
+        flush=True,
+    )
+    return {
+        item["report_id"]: {
+            "filename": item["filename"],
+            "path": None,
+            "member": item["source"],
+        }
+        for item in result["items"]
+        if item.get("committed") is False
+    }
+
+
+def unpack_tar(archive: str, dest: str) -> None:
+    """Extract regular files under dest, keeping their member paths."""
+    with tarfile.open(archive, mode="r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            parts = [p for p in member.name.split("/") if p not in ("", ".")]
+            if not parts or parts[-1].startswith(".") or ".." in parts:
+                continue
+            path = os.path.join(dest, *parts)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as out:
+                shutil.copyfileobj(tar.extractfile(member), out)
+
+
+def iter_tar_images(archive: str, members: set) -> Iterator[Tuple[str, bytes]]:
+    """Yield (member path, bytes) for the given members, in one pass."""
+    with tarfile.open(archive, mode="r|*") as tar:
+        for member in tar:
+            if member.isfile() and member.name in members:
+                yield member.name, tar.extractfile(member).read()
+
+
+async def run_vision(
+    pending: Dict[str, dict],
+    batch_size: int,
+    concurrency: int,
+    archive: Optional[str] = None,
+) -> dict:
+    """Send pending images to vision in batches and upload the produced masks."""
+    counts = {"masked": 0, "failed": 0}
+    batches = 0
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(report_id: str, filename: str, data: bytes):
+        async with sem:
+            try:
+                result = await upload_steps.send_to_vision_service(
+                    filename, data, guess_type(filename)
+                )
+                if not (result.get("success") and result.get("mask_base64")):
+                    raise Exception(result.get("detail", "no mask returned"))
+                mask = base64.b64decode(result["mask_base64"])
+                metadata = upload_steps.vision_metadata(result)
+                if not await upload_steps.upload_mask(report_id, mask, metadata):
+                    raise Exception("mask upload rejected by storage service")
+                counts["masked"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"❌ Vision failed for {filename} ({report_id}): {e}", flush=True)
+
+    async def run_batch(batch: List[Tuple[str, str, bytes]]):
+        nonlocal batches
+        batches += 1
+        await asyncio.gather(*(one(*args) for args in batch))
+        print(
+            f"Vision batch {batches}: "
+            f"{counts['masked']} masked, {counts['failed']} failed so far",
+            flush=True,
+        )
+
+    if archive:
+        # Read the archive once, sending images on as each batch fills up
+        by_member = {v["member"]: rid for rid, v in pending.items()}
+        batch = []
+        for member, data in iter_tar_images(archive, set(by_member)):
+            report_id = by_member[member]
+            batch.append((report_id, pending[report_id]["filename"], data))
+            if len(batch) >= batch_size:
+                await run_batch(batch)
+                batch = []
+        if batch:
+            await run_batch(batch)
+        return counts
+
+    items = list(pending.items())
+    for start in range(0, len(items), batch_size):
+        batch = []
+        for report_id, v in items[start : start + batch_size]:
+            with open(v["path"], "rb") as f:
+                batch.append((report_id, v["filename"], f.read()))
+        await run_batch(batch)
+    return counts
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import report images")
+    parser.add_argument("source", help="Directory or tar archive of images")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--vision-concurrency", type=int, default=4)
+    parser.add_argument(
+        "--skip-vision",
+        action="store_true",
+        help="Only import; leave images without masks in staging",
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if os.path.isdir(args.source):
+            pending = await import_directory(args.source, args.batch_size)
+            archive = None
+        elif tarfile.is_tarfile(args.source) and is_sharded():
+            # A streamed archive would be placed on a single shard; unpack it
+            # so every report is sent to the shard that owns it
+            unpack_tar(args.source, work_dir)
+            pending = await import_directory(work_dir, args.batch_size)
+            archive = None
+        elif tarfile.is_tarfile(args.source):
+            pending = await import_tar(args.source)
+            archive = args.source
+        else:
+            print(f"Not a directory or tar archive: {args.source}", file=sys.stderr)
+            return 1
+
+        if pending and not args.skip_vision:
+            counts = await run_vision(
+                pending, args.batch_size, args.vision_concurrency, archive
+            )
+            print(f"✅ Vision done: {counts['masked']} masked, {counts['failed']} failed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
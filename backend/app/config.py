@@ -26,11 +26,26 @@ CORS_ORIGINS = [o.strip() for o in _cors_raw.split(",") if o.strip()]
 # Service endpoints configurable via environment variables. Use these in
 # backend code instead of hard-coded hostnames so deployments can override
 # behaviour without editing source.
-STORAGE_SERVICE_URL = os.environ.get(
-    "STORAGE_SERVICE_URL", "http://storage-service:8002"
-)
+# STORAGE_SERVICE_URL may be a comma-separated list of storage-service shards
+# (see app/sharding.py); STORAGE_SERVICE_URL itself stays the first entry.
+STORAGE_SERVICE_URLS = [
+    u.strip().rstrip("/")
+    for u in os.environ.get(
+        "STORAGE_SERVICE_URL", "http://storage-service:8002"
+    ).split(",")
+    if u.strip()
+]
+STORAGE_SERVICE_URL = STORAGE_SERVICE_URLS[0]
+# Virtual nodes per shard on the hash ring (more = more even placement)
+STORAGE_RING_VNODES = int(os.environ.get("STORAGE_RING_VNODES", "160"))
 VISION_SERVICE_URL = os.environ.get("VISION_SERVICE_URL", "http://vision-service:8001")
 
 # API path prefixes (allow tweaking if services expose routes under a prefix)
 FILES_API_PREFIX = os.environ.get("FILES_API_PREFIX", "/api/files")
 REPORTS_API_PREFIX = os.environ.get("REPORTS_API_PREFIX", "/api/reports")
+
+# Cache for /api/reports pages (see app/listing_cache.py). Pages are
+# invalidated by storage change events; the TTL only bounds staleness if the
+# change feed is unavailable.
+LISTING_CACHE_TTL_SECONDS = float(os.environ.get("LISTING_CACHE_TTL_SECONDS", "30"))
+LISTING_CACHE_MAX_ENTRIES = int(os.environ.get("LISTING_CACHE_MAX_ENTRIES", "256"))
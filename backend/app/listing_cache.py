@@ -0,0 +1,178 @@
+"""Cache for enriched report listing pages.
+
+`/api/reports` responses are cached per (backend base URL, query string),
+already enriched with file URLs. Every entry records the cache version it
+was built at; bumping the version invalidates all pages at once. The
+version is bumped by
+
+- a watcher that follows each storage shard's change feed (a report was
+  finalized, or the feed dropped and events may have been missed), and
+- the upload flow when it finalizes a report through this backend.
+
+LISTING_CACHE_TTL_SECONDS bounds staleness if both of those fail.
+Concurrent misses for the same page share one storage round trip.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+import httpx
+
+from app.config import (
+    LISTING_CACHE_MAX_ENTRIES,
+    LISTING_CACHE_TTL_SECONDS,
+    REPORTS_API_PREFIX,
+)
+from app.sharding import ring
+
+log = logging.getLogger(__name__)
+
+# Number of storage change feeds currently being followed
+watcher_state = {"connected": 0}
+
+
+class CachedPage:
+    __slots__ = ("body", "etag", "version", "created")
+
+    def __init__(self, body: Dict, version: int):
+        self.body = body
+        raw = json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        self.etag = f'"{hashlib.sha1(raw).hexdigest()}"'
+        self.version = version
+        self.created = time.monotonic()
+
+
+class ListingCache:
+    def __init__(
+        self,
+        max_entries: int = LISTING_CACHE_MAX_ENTRIES,
+        ttl: float = LISTING_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = 0
+        self._pages: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._last_invalidated = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.not_modified = 0
+        self._served_age_total = 0.0
+        self._served_age_max = 0.0
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self._last_invalidated = time.monotonic()
+
+    def _fresh(self, page: CachedPage) -> bool:
+        return (
+            page.version == self.version
+            and time.monotonic() - page.created < self.ttl
+        )
+
+    async def get(
+        self, key: Hashable, load: Callable[[], Awaitable[Dict]]
+    ) -> CachedPage:
+        """Return the cached page for key, calling `load()` on a miss."""
+        page = self._pages.get(key)
+        if page is not None and self._fresh(page):
+            self._pages.move_to_end(key)
+            self.hits += 1
+            age = time.monotonic() - page.created
+            self._served_age_total += age
+            self._served_age_max = max(self._served_age_max, age)
+            return page
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            # Loaded in its own task: a client that disconnects doesn't cancel
+            # the storage round trip for the others waiting on the same page
+            task = asyncio.ensure_future(self._load(key, load))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _load(
+        self, key: Hashable, load: Callable[[], Awaitable[Dict]]
+    ) -> CachedPage:
+        version = self.version
+        page = CachedPage(await load(), version)
+        # Only keep it if nothing was finalized while it loaded
+        if version == self.version:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+    def _finished(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark retrieved so waiter-less failures are not logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._pages),
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "not_modified": self.not_modified,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else None,
+            "served_age_avg_seconds": (
+                self._served_age_total / self.hits if self.hits else None
+            ),
+            "served_age_max_seconds": self._served_age_max,
+            "seconds_since_invalidation": time.monotonic() - self._last_invalidated,
+            "feed_watchers_connected": watcher_state["connected"],
+        }
+
+
+cache = ListingCache()
+
+
+async def _watch_shard(base: str) -> None:
+    url = f"{base}{REPORTS_API_PREFIX}/changes"
+    while True:
+        connected = False
+        try:
+            async with httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0, read=None)
+            ) as client:
+                async with client.stream("GET", url) as resp:
+                    if resp.status_code != 200:
+                        raise Exception(f"upstream returned {resp.status_code}")
+                    connected = True
+                    watcher_state["connected"] += 1
+                    # Anything finalized while we were disconnected
+                    cache.invalidate()
+                    async for line in resp.aiter_lines():
+                        if line.startswith("event:"):
+                            cache.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Listing cache lost change feed %s: %s", url, e)
+        finally:
+            if connected:
+                watcher_state["connected"] -= 1
+        cache.invalidate()
+        await asyncio.sleep(5)
+
+
+def start_watchers() -> Tuple[asyncio.Task, ...]:
+    """Start one change feed watcher per storage shard."""
+    return tuple(asyncio.create_task(_watch_shard(base)) for base in ring.nodes)
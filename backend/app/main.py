@@ -5,6 +5,8 @@ from app.routes import health
 from app.routes import upload
 from app.routes import reports
 from app.routes import files
+from app.routes import metrics
+from app import listing_cache
 
 app = FastAPI(
     title="Medical Report API",
@@ -21,8 +23,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+async def startup_event():
+    """Follow storage change feeds to invalidate cached report listings"""
+    app.state.listing_cache_watchers = listing_cache.start_watchers()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks"""
+    for task in getattr(app.state, "listing_cache_watchers", ()):
+        task.cancel()
+
+
 # Include routers
 app.include_router(health.router, tags=["health"])
 app.include_router(upload.router, tags=["upload"])
 app.include_router(reports.router, prefix="/api", tags=["reports"])
 app.include_router(files.router, prefix="/api", tags=["files"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
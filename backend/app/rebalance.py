@@ -0,0 +1,170 @@
+"""Move reports to the storage shard that owns them.
+
+Run after adding or removing an entry in STORAGE_SERVICE_URL. Every shard
+is scanned, plus any removed shard passed with `--from`; reports whose
+report_id now hashes to a different shard are copied there through the
+normal upload endpoints (image, then mask with its vision statistics) and
+deleted from the old shard once the copy is finalized. Reads fall back to
+the other shards, so reports stay reachable while this runs, and an
+interrupted run can simply be restarted.
+
+Usage (inside the backend container or a dev environment):
+
+    python -m app.rebalance --dry-run
+    python -m app.rebalance --concurrency 8
+    python -m app.rebalance --from http://storage-3:8002
+
+Reports on a removed shard are not reachable through the backend until
+they have been drained from it with `--from`.
+
+A moved report keeps its id, files, statistics and created_at/updated_at
+timestamps.
+"""
+
+import argparse
+import asyncio
+import mimetypes
+import os
+import sys
+from typing import AsyncIterator, Dict
+
+import httpx
+
+from app.config import FILES_API_PREFIX, REPORTS_API_PREFIX
+from app.routes.upload import upload_steps
+from app.sharding import ring, shard_for
+
+PAGE_SIZE = 200
+
+# Report columns that are re-sent as mask upload metadata
+VISION_FIELDS = (
+    "segmented_pixels",
+    "total_pixels",
+    "coverage_percent",
+    "threshold",
+    "model_version",
+    "image_width",
+    "image_height",
+)
+
+# Kept by the copy instead of becoming the time of the move
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+
+async def iter_reports(client: httpx.AsyncClient, base: str) -> AsyncIterator[Dict]:
+    """Yield every report on one shard, oldest first, using keyset paging."""
+    params = {"sort": "created_at", "order": "asc", "limit": PAGE_SIZE}
+    while True:
+        resp = await client.get(f"{base}{REPORTS_API_PREFIX}", params=params)
+        resp.raise_for_status()
+        items = resp.json().get("items", [])
+        for item in items:
+            yield item
+        if len(items) < PAGE_SIZE:
+            return
+        params["after_created_at"] = items[-1]["created_at"]
+        params["after_report_id"] = items[-1]["report_id"]
+
+
+def original_filename(report_id: str, path: str) -> str:
+    # Stored names carry one or more `<report_id>_` prefixes
+    name = os.path.basename(path)
+    prefix = f"{report_id}_"
+    while name.startswith(prefix):
+        name = name[len(prefix) :]
+    return name
+
+
+async def move_report(client: httpx.AsyncClient, source: str, item: Dict) -> None:
+    report_id = item["report_id"]
+    target = shard_for(report_id)
+    stored_name = os.path.basename(item["report_image_path"])
+
+    image = await client.get(
+        f"{source}{FILES_API_PREFIX}/{report_id}/report/{stored_name}"
+    )
+    image.raise_for_status()
+    mask = await client.get(f"{source}{FILES_API_PREFIX}/{report_id}/mask")
+    mask.raise_for_status()
+
+    create = {"report_id": report_id, **{k: item.get(k) for k in TIMESTAMP_FIELDS}}
+    resp = await client.post(f"{target}{REPORTS_API_PREFIX}", json=create)
+    if resp.status_code == 409:
+        # Left over from an interrupted run: finalized copy or staged upload
+        existing = await client.get(f"{target}{REPORTS_API_PREFIX}/{report_id}")
+        if existing.status_code != 200:
+            await client.delete(f"{target}{REPORTS_API_PREFIX}/{report_id}")
+            resp = await client.post(f"{target}{REPORTS_API_PREFIX}", json=create)
+    if resp.status_code not in (200, 409):
+        raise Exception(f"create on {target} failed: {resp.status_code} {resp.text}")
+
+    if resp.status_code == 200:
+        filename = original_filename(report_id, stored_name)
+        content_type = (
+            item.get("content_type")
+            or mimetypes.guess_type(filename)[0]
+            or "application/octet-stream"
+        )
+        await upload_steps.upload_report_image(
+            report_id, filename, image.content, content_type
+        )
+        metadata = {k: item.get(k) for k in VISION_FIELDS}
+        result = await upload_steps.upload_mask(report_id, mask.content, metadata)
+        if not (result and result.get("committed")):
+            raise Exception(f"copy on {target} was not finalized")
+
+    resp = await client.delete(f"{source}{REPORTS_API_PREFIX}/{report_id}")
+    if resp.status_code not in (200, 404):
+        raise Exception(f"delete on {source} failed: {resp.status_code} {resp.text}")
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move reports to their owning shard")
+    parser.add_argument("--dry-run", action="store_true", help="Only count reports")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--from",
+        dest="drain",
+        action="append",
+        default=[],
+        metavar="URL",
+        help="Also drain this storage shard, no longer in STORAGE_SERVICE_URL",
+    )
+    args = parser.parse_args(argv)
+
+    counts = {"scanned": 0, "misplaced": 0, "moved": 0, "failed": 0}
+    sem = asyncio.Semaphore(max(1, args.concurrency))
+
+    async with httpx.AsyncClient(timeout=60.0) as client:
+
+        async def one(source: str, item: Dict):
+            async with sem:
+                try:
+                    await move_report(client, source, item)
+                    counts["moved"] += 1
+                except Exception as e:
+                    counts["failed"] += 1
+                    print(f"❌ Failed to move {item['report_id']}: {e}", flush=True)
+
+        drain = [url.rstrip("/") for url in args.drain]
+        for source in ring.nodes + [url for url in drain if url not in ring.nodes]:
+            # Scan the whole shard before moving anything off it
+            misplaced = []
+            async for item in iter_reports(client, source):
+                counts["scanned"] += 1
+                if shard_for(item["report_id"]) != source:
+                    misplaced.append(item)
+            counts["misplaced"] += len(misplaced)
+            print(f"{source}: {len(misplaced)} reports to move", flush=True)
+            if not args.dry_run:
+                await asyncio.gather(*(one(source, item) for item in misplaced))
+
+    print(
+        f"✅ Scanned {counts['scanned']}, misplaced {counts['misplaced']}, "
+        f"moved {counts['moved']}, failed {counts['failed']}"
+    )
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
 import httpx
 import logging
-from app.config import STORAGE_SERVICE_URL
+from app.sharding import candidates, shard_for
 
 log = logging.getLogger(__name__)
 
@@ -16,9 +16,11 @@ async def proxy_report_file(report_id: str, filename: str, request: Request):
     This wrapper logs and converts unexpected exceptions into 502 responses so
     clients don't get 500 without diagnostics.
     """
-    storage_url = (
-        f"{STORAGE_SERVICE_URL.rstrip('/')}/api/files/{report_id}/report/{filename}"
-    )
+    path = f"/api/files/{report_id}/report/{filename}"
+    # Forward query parameters such as `variant=thumb|web`
+    if request.url.query:
+        path = f"{path}?{request.url.query}"
+    storage_url = f"{shard_for(report_id)}{path}"
 
     try:
         # Forward Range and Authorization headers if present
@@ -32,9 +34,14 @@ async def proxy_report_file(report_id: str, filename: str, request: Request):
         # Do a HEAD first to obtain headers and status without consuming the body.
         try:
             try:
-                head_resp = await client.head(
-                    storage_url, headers=headers, timeout=20.0
-                )
+                # Owner shard first; the others only if it lacks the file
+                for base in candidates(report_id):
+                    storage_url = f"{base}{path}"
+                    head_resp = await client.head(
+                        storage_url, headers=headers, timeout=20.0
+                    )
+                    if head_resp.status_code != 404:
+                        break
             except httpx.HTTPError as e:
                 log.exception(
                     "HTTP error while contacting upstream (HEAD) %s: %s", storage_url, e
@@ -225,7 +232,10 @@ async def proxy_mask_file(report_id: str, request: Request):
 
     Add logging and robust error handling to return 502 on upstream failures.
     """
-    storage_url = f"{STORAGE_SERVICE_URL.rstrip('/')}/api/files/{report_id}/mask"
+    path = f"/api/files/{report_id}/mask"
+    if request.url.query:
+        path = f"{path}?{request.url.query}"
+    storage_url = f"{shard_for(report_id)}{path}"
 
     try:
         headers = {}
@@ -234,13 +244,21 @@ async def proxy_mask_file(report_id: str, request: Request):
         # forward Range header for mask as well (support partial requests)
         if "range" in request.headers:
             headers["Range"] = request.headers["range"]
+        # The mask encoding is negotiated upstream from Accept
+        if "accept" in request.headers:
+            headers["Accept"] = request.headers["accept"]
 
         client = httpx.AsyncClient(timeout=60.0)
         try:
             try:
-                head_resp = await client.head(
-                    storage_url, headers=headers, timeout=20.0
-                )
+                # Owner shard first; the others only if it lacks the file
+                for base in candidates(report_id):
+                    storage_url = f"{base}{path}"
+                    head_resp = await client.head(
+                        storage_url, headers=headers, timeout=20.0
+                    )
+                    if head_resp.status_code != 404:
+                        break
             except httpx.HTTPError as e:
                 log.exception(
                     "HTTP error while contacting upstream (HEAD) %s: %s", storage_url, e
@@ -291,6 +309,9 @@ async def proxy_mask_file(report_id: str, request: Request):
                         "content-disposition",
                         "cache-control",
                         "etag",
+                        "vary",
+                        "x-mask-height",
+                        "x-mask-width",
                     ):
                         if h in resp.headers:
                             headers_out[h] = resp.headers[h]
@@ -341,6 +362,9 @@ async def proxy_mask_file(report_id: str, request: Request):
                 "content-disposition",
                 "cache-control",
                 "etag",
+                "vary",
+                "x-mask-height",
+                "x-mask-width",
             ):
                 if h in head_resp.headers:
                     headers_out[h] = head_resp.headers[h]
@@ -408,3 +432,54 @@ async def proxy_mask_file(report_id: str, request: Request):
     except Exception as e:
         log.exception("Failed to proxy mask file %s -> %s", report_id, e)
         raise HTTPException(status_code=502, detail=str(e))
+
+
+@router.get("/files/{report_id}/overlay")
+async def proxy_overlay(report_id: str, request: Request):
+    """Relay a rendered mask overlay from storage-service.
+
+    Query parameters (mode, size, quality, format) are forwarded unchanged.
+    """
+    client = httpx.AsyncClient(timeout=60.0)
+    try:
+        shards = candidates(report_id)
+        for i, base in enumerate(shards):
+            storage_url = f"{base}/api/files/{report_id}/overlay"
+            upstream = client.build_request(
+                "GET", storage_url, params=request.query_params
+            )
+            resp = await client.send(upstream, stream=True)
+            if resp.status_code != 404 or i == len(shards) - 1:
+                break
+            await resp.aclose()
+    except httpx.HTTPError as e:
+        await client.aclose()
+        log.exception("HTTP error while contacting upstream %s: %s", storage_url, e)
+        raise HTTPException(status_code=502, detail=str(e))
+
+    if resp.status_code != 200:
+        detail = (await resp.aread()).decode(errors="replace")
+        await resp.aclose()
+        await client.aclose()
+        raise HTTPException(status_code=resp.status_code, detail=detail)
+
+    async def stream_generator():
+        try:
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        except Exception as e:
+            log.exception("Error while streaming overlay from %s: %s", storage_url, e)
+        finally:
+            await resp.aclose()
+            await client.aclose()
+
+    headers_out = {}
+    for h in ("cache-control", "etag"):
+        if h in resp.headers:
+            headers_out[h] = resp.headers[h]
+
+    return StreamingResponse(
+        stream_generator(),
+        media_type=resp.headers.get("content-type", "application/octet-stream"),
+        headers=headers_out,
+    )
@@ -0,0 +1,13 @@
+"""Operational metrics for the backend"""
+
+from fastapi import APIRouter
+
+from app import listing_cache
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Return report listing cache counters."""
+    return {"listing_cache": listing_cache.cache.stats}
@@ -1,54 +1,455 @@
-from fastapi import APIRouter, HTTPException
-from app.config import STORAGE_SERVICE_URL, REPORTS_API_PREFIX
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.config import REPORTS_API_PREFIX
+import asyncio
+import base64
+import heapq
 import httpx
-from typing import List, Dict
+import json
+import logging
+from typing import List, Dict, Optional, Tuple
 from app.config import FILES_API_PREFIX
+from app.sharding import ring, is_sharded, candidates, group_by_shard
+from app import listing_cache
 import os
 from fastapi import Request
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+@router.get("/reports/export")
+async def export_reports(request: Request):
+    """Stream a report archive (tar/zip) from storage-service.
+
+    Query parameters (format, after, since, until, limit) are forwarded
+    unchanged; the body is relayed chunk by chunk without buffering. With
+    several storage shards, `shard=<index>` selects which one to export.
+    """
+    params = dict(request.query_params)
+    shard = params.pop("shard", None)
+    if shard is None and is_sharded():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Pass shard=0..{len(ring.nodes) - 1} to export from one storage shard",
+        )
+    try:
+        base = ring.nodes[int(shard or 0)]
+    except (ValueError, IndexError):
+        raise HTTPException(status_code=400, detail="Invalid shard")
+
+    url = f"{base}{REPORTS_API_PREFIX}/export"
+    client = httpx.AsyncClient(timeout=60.0)
+    try:
+        upstream = client.build_request("GET", url, params=params)
+        resp = await client.send(upstream, stream=True)
+    except httpx.HTTPError as e:
+        await client.aclose()
+        log.exception("HTTP error while contacting upstream %s: %s", url, e)
+        raise HTTPException(status_code=502, detail=str(e))
+
+    if resp.status_code != 200:
+        detail = (await resp.aread()).decode(errors="replace")
+        await resp.aclose()
+        await client.aclose()
+        raise HTTPException(status_code=resp.status_code, detail=detail)
+
+    async def stream_generator():
+        try:
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        except Exception as e:
+            log.exception("Error while streaming export from %s: %s", url, e)
+        finally:
+            await resp.aclose()
+            await client.aclose()
+
+    headers = {}
+    if "content-disposition" in resp.headers:
+        headers["content-disposition"] = resp.headers["content-disposition"]
+
+    return StreamingResponse(
+        stream_generator(),
+        media_type=resp.headers.get("content-type", "application/octet-stream"),
+        headers=headers,
+    )
+
+
+def enrich_report(it: Dict, backend_base: str) -> Dict:
+    """Return a copy of a storage report item with backend file proxy URLs added."""
+    report_id = it.get("report_id")
+    report_image_path = it.get("report_image_path")
+
+    filename = None
+    if report_image_path:
+        filename = os.path.basename(report_image_path)
+
+    report_url = (
+        f"{backend_base}{FILES_API_PREFIX}/{report_id}/report/{filename}"
+        if filename
+        else None
+    )
+    mask_url = (
+        f"{backend_base}{FILES_API_PREFIX}/{report_id}/mask" if report_id else None
+    )
+
+    new_item = dict(it)
+    new_item["report_image_url"] = report_url
+    new_item["mask_image_url"] = mask_url
+    # Downscaled WebP derivatives for list previews
+    new_item["report_thumb_url"] = f"{report_url}?variant=thumb" if report_url else None
+    new_item["mask_thumb_url"] = f"{mask_url}?variant=thumb" if mask_url else None
+    new_item["overlay_url"] = (
+        f"{backend_base}{FILES_API_PREFIX}/{report_id}/overlay" if report_id else None
+    )
+    return new_item
+
+
+@router.get("/reports/changes")
+async def report_changes(request: Request):
+    """Relay the storage-service change feed (server-sent events).
+
+    `after` and the `Last-Event-ID` header are forwarded so clients can
+    resume; each event's report is enriched with backend file URLs. With
+    several storage shards the feeds are merged (see `_merged_changes`).
+    """
+    if is_sharded():
+        return await _merged_changes(request)
+
+    url = f"{ring.nodes[0]}{REPORTS_API_PREFIX}/changes"
+    headers = {}
+    if "last-event-id" in request.headers:
+        headers["Last-Event-ID"] = request.headers["last-event-id"]
+
+    # No read timeout: the upstream sends heartbeats while idle
+    client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=None))
+    try:
+        upstream = client.build_request(
+            "GET", url, params=request.query_params, headers=headers
+        )
+        resp = await client.send(upstream, stream=True)
+    except httpx.HTTPError as e:
+        await client.aclose()
+        log.exception("HTTP error while contacting upstream %s: %s", url, e)
+        raise HTTPException(status_code=502, detail=str(e))
+
+    if resp.status_code != 200:
+        detail = (await resp.aread()).decode(errors="replace")
+        await resp.aclose()
+        await client.aclose()
+        raise HTTPException(status_code=resp.status_code, detail=detail)
+
+    backend_base = str(request.base_url).rstrip("/")
+
+    async def stream_generator():
+        try:
+            event = "report"
+            async for line in resp.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: ") :]
+                elif line.startswith("data: ") and event == "report":
+                    item = enrich_report(json.loads(line[len("data: ") :]), backend_base)
+                    line = f"data: {json.dumps(item)}"
+                elif not line:
+                    event = "report"
+                yield f"{line}\n"
+        except Exception as e:
+            log.exception("Error while streaming changes from %s: %s", url, e)
+        finally:
+            await resp.aclose()
+            await client.aclose()
+
+    return StreamingResponse(
+        stream_generator(),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"},
+    )
+
+
+def _encode_positions(positions: List[Optional[int]]) -> str:
+    return ",".join(f"{i}:{p}" for i, p in enumerate(positions) if p is not None)
+
+
+def _decode_positions(token: Optional[str], shards: int) -> List[Optional[int]]:
+    """Parse a merged resume token ("<shard>:<seq>,..."); "0" replays all."""
+    if not token:
+        return [None] * shards
+    if token == "0":
+        return [0] * shards
+    positions: List[Optional[int]] = [None] * shards
+    for part in token.split(","):
+        index, _, seq = part.partition(":")
+        positions[int(index)] = int(seq)
+    return positions
+
+
+async def _merged_changes(request: Request):
+    """Merge the change feeds of all storage shards into one SSE stream.
+
+    Sequence numbers are per shard, so the event id is a composite token of
+    every shard's position; it resumes through `after` or `Last-Event-ID`.
+    Shard indexes follow the order of STORAGE_SERVICE_URL. `delete` events
+    have no id upstream and are forwarded unchanged.
+    """
+    token = request.query_params.get("after") or request.headers.get("last-event-id")
+    try:
+        positions = _decode_positions(token, len(ring.nodes))
+    except (ValueError, IndexError):
+        raise HTTPException(status_code=400, detail="Invalid change feed cursor")
+
+    backend_base = str(request.base_url).rstrip("/")
+    queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+    client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=None))
+
+    async def pump(index: int, base: str):
+        url = f"{base}{REPORTS_API_PREFIX}/changes"
+        params = {} if positions[index] is None else {"after": positions[index]}
+        try:
+            async with client.stream("GET", url, params=params) as resp:
+                if resp.status_code != 200:
+                    raise Exception(f"upstream returned {resp.status_code}")
+                frame: Dict[str, str] = {}
+                async for line in resp.aiter_lines():
+                    if not line:
+                        if "id" in frame or "data" in frame:
+                            await queue.put((index, frame))
+                        frame = {}
+                        continue
+                    field, _, value = line.partition(":")
+                    if field:
+                        frame[field] = value[1:] if value.startswith(" ") else value
+        except Exception as e:
+            log.exception("Change feed from %s failed: %s", url, e)
+        # Ending the merged stream makes the client reconnect and resume
+        await queue.put((index, None))
+
+    tasks = [asyncio.create_task(pump(i, base)) for i, base in enumerate(ring.nodes)]
+
+    async def stream_generator():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                index, frame = await queue.get()
+                if frame is None:
+                    return
+                if "id" not in frame:
+                    # Delete events carry no id: forwarded as they are,
+                    # without moving the resume token
+                    yield (
+                        f"event: {frame.get('event', 'message')}\n"
+                        f"data: {frame['data']}\n\n"
+                    )
+                    continue
+                positions[index] = int(frame["id"])
+                if "data" not in frame:
+                    # Position-only frame (the shard's starting point)
+                    continue
+                item = enrich_report(json.loads(frame["data"]), backend_base)
+                yield (
+                    f"id: {_encode_positions(positions)}\n"
+                    f"event: {frame.get('event', 'report')}\n"
+                    f"data: {json.dumps(item)}\n\n"
+                )
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await client.aclose()
+
+    return StreamingResponse(
+        stream_generator(),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"},
+    )
+
+
+def encode_cursor(item: Dict) -> str:
+    raw = json.dumps([item["created_at"], item["report_id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, report_id = json.loads(raw)
+    except Exception:
+        raise ValueError("invalid cursor")
+    return str(created_at), str(report_id)
+
+
+def _merge_key(sort: str):
+    # Matches storage ordering: NULLs sort lowest, report_id breaks ties
+    return lambda it: (it.get(sort) is not None, it.get(sort), it["report_id"])
+
+
+async def _fetch_list(client: httpx.AsyncClient, base: str, params: Dict) -> List[Dict]:
+    resp = await client.get(f"{base}{REPORTS_API_PREFIX}", params=params, timeout=10.0)
+    if resp.status_code == 400:
+        raise HTTPException(status_code=400, detail=resp.json().get("detail"))
+    if resp.status_code != 200:
+        raise HTTPException(
+            status_code=502, detail="Failed to fetch reports from storage service"
+        )
+    return resp.json().get("items", [])
+
+
 @router.get("/reports")
 async def list_reports(request: Request):
-    """Proxy endpoint to fetch all reports from storage-service and enrich with backend file URLs."""
-    url = f"{STORAGE_SERVICE_URL}{REPORTS_API_PREFIX}"
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, timeout=10.0)
-        if resp.status_code != 200:
+    """Proxy endpoint to fetch all reports from storage-service and enrich with backend file URLs.
+
+    Filter/sort query parameters (min_coverage, max_coverage, model_version,
+    sort, order, limit, offset) are forwarded to storage-service. With several
+    storage shards each one is queried and the sorted pages are merged
+    (`sort=id`, a per-shard row id, is then rejected).
+
+    For `sort=created_at` with a `limit`, the response has a `next_cursor`;
+    pass it back as `cursor` for the next page (stable across shards, unlike
+    `offset`).
+
+    Pages are served from the listing cache and carry an ETag; a matching
+    `If-None-Match` gets a 304.
+    """
+    backend_base = str(request.base_url).rstrip("/")
+    key = (backend_base, tuple(sorted(request.query_params.multi_items())))
+    page = await listing_cache.cache.get(key, lambda: _load_listing(request))
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if page.etag in (tag.strip() for tag in if_none_match.split(",")):
+        listing_cache.cache.not_modified += 1
+        return Response(status_code=304, headers={"etag": page.etag})
+    return JSONResponse(page.body, headers={"etag": page.etag, "cache-control": "no-cache"})
+
+
+async def _load_listing(request: Request) -> Dict:
+    params = dict(request.query_params)
+    sort = params.get("sort", "created_at")
+    descending = params.get("order", "desc").lower() == "desc"
+    try:
+        limit = int(params["limit"]) if params.get("limit") else None
+        offset = int(params.pop("offset", 0) or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="limit and offset must be integers")
+
+    cursor = params.pop("cursor", None)
+    if cursor:
+        try:
+            params["after_created_at"], params["after_report_id"] = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if is_sharded():
+        if sort == "id":
+            # Row ids are assigned by each shard, so they can't be merged
             raise HTTPException(
-                status_code=502, detail="Failed to fetch reports from storage service"
+                status_code=400, detail="sort=id is not supported with several shards"
             )
-        data = resp.json()
+        # Any shard may hold the whole page: ask each for offset + limit
+        if limit is not None:
+            params["limit"] = str(offset + limit)
+    elif offset:
+        params["offset"] = str(offset)
+        offset = 0
 
-    items: List[Dict] = data.get("items", [])
+    async with httpx.AsyncClient() as client:
+        pages = await asyncio.gather(
+            *(_fetch_list(client, base, params) for base in ring.nodes)
+        )
+
+    if len(pages) == 1:
+        items: List[Dict] = pages[0]
+    else:
+        items = list(heapq.merge(*pages, key=_merge_key(sort), reverse=descending))
+    items = items[offset:]
+    if limit is not None:
+        items = items[:limit]
+
+    next_cursor = None
+    if sort == "created_at" and limit is not None and len(items) == limit:
+        next_cursor = encode_cursor(items[-1])
 
     # Build backend-hosted base for proxying files
     # Use request.base_url to construct absolute backend URL
     backend_base = str(request.base_url).rstrip("/")
 
-    enriched = []
-    for it in items:
-        report_id = it.get("report_id")
-        report_image_path = it.get("report_image_path")
-        mask_image_path = it.get("mask_image_path")
+    enriched = [enrich_report(it, backend_base) for it in items]
+
+    return {"success": True, "items": enriched, "next_cursor": next_cursor}
 
-        filename = None
-        if report_image_path:
-            filename = os.path.basename(report_image_path)
 
-        report_url = (
-            f"{backend_base}{FILES_API_PREFIX}/{report_id}/report/{filename}"
-            if filename
-            else None
+class BatchGetRequest(BaseModel):
+    report_ids: List[str]
+
+
+async def _storage_batch_get(
+    client: httpx.AsyncClient, base: str, report_ids: List[str]
+) -> Dict:
+    resp = await client.post(
+        f"{base}{REPORTS_API_PREFIX}:batchGet",
+        json={"report_ids": report_ids},
+        timeout=10.0,
+    )
+    if resp.status_code == 400:
+        raise HTTPException(status_code=400, detail=resp.json().get("detail"))
+    if resp.status_code != 200:
+        raise HTTPException(
+            status_code=502, detail="Failed to fetch reports from storage service"
         )
-        mask_url = (
-            f"{backend_base}{FILES_API_PREFIX}/{report_id}/mask" if report_id else None
+    return resp.json()
+
+
+@router.post("/reports:batchGet")
+async def batch_get_reports(payload: BatchGetRequest, request: Request):
+    """Fetch several reports by id (one round trip per storage shard) and enrich them.
+
+    Ids are sent to the shard that owns them; ids an owner does not have are
+    looked up on the other shards (reports not yet moved by a rebalance).
+    """
+    report_ids = list(dict.fromkeys(payload.report_ids))
+    found: Dict[str, Dict] = {}
+    async with httpx.AsyncClient() as client:
+        groups = group_by_shard(report_ids)
+        results = await asyncio.gather(
+            *(_storage_batch_get(client, base, ids) for base, ids in groups.items())
         )
+        for data in results:
+            found.update((it["report_id"], it) for it in data.get("items", []))
+
+        missing = [rid for rid in report_ids if rid not in found]
+        if missing and is_sharded():
+            results = await asyncio.gather(
+                *(_storage_batch_get(client, base, missing) for base in ring.nodes)
+            )
+            for data in results:
+                found.update((it["report_id"], it) for it in data.get("items", []))
+
+    backend_base = str(request.base_url).rstrip("/")
+    return {
+        "success": True,
+        "items": [
+            enrich_report(found[rid], backend_base) for rid in report_ids if rid in found
+        ],
+        "missing": [rid for rid in report_ids if rid not in found],
+    }
 
-        new_item = dict(it)
-        new_item["report_image_url"] = report_url
-        new_item["mask_image_url"] = mask_url
-        enriched.append(new_item)
 
-    return {"success": True, "items": enriched}
+@router.get("/reports/{report_id}")
+async def get_report(report_id: str, request: Request):
+    """Fetch a single report by id and enrich it with backend file URLs."""
+    async with httpx.AsyncClient() as client:
+        # Owner shard first; the others only if it does not have the report
+        for base in candidates(report_id):
+            resp = await client.get(f"{base}{REPORTS_API_PREFIX}/{report_id}", timeout=10.0)
+            if resp.status_code != 404:
+                break
+    if resp.status_code == 404:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if resp.status_code != 200:
+        raise HTTPException(
+            status_code=502, detail="Failed to fetch report from storage service"
+        )
+
+    backend_base = str(request.base_url).rstrip("/")
+    return {"success": True, "item": enrich_report(resp.json()["item"], backend_base)}
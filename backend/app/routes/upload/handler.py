@@ -84,7 +84,9 @@ async def websocket_upload(websocket: WebSocket):
 
             mask_data = base64.b64decode(vision_result["mask_base64"])
             await websocket.send_json(messages.sending_mask_message())
-            mask_result = await upload_steps.upload_mask(upload_id, mask_data)
+            mask_result = await upload_steps.upload_mask(
+                upload_id, mask_data, upload_steps.vision_metadata(vision_result)
+            )
             if mask_result:
                 print(f"Saved mask to: {mask_result['path']}", flush=True)
 
@@ -11,14 +11,16 @@ return results or raise on fatal errors. Message sending stays in
 
 from typing import Any, Dict, Optional, Tuple
 import json
+import uuid
 import httpx
 from io import BytesIO
 from app.config import (
-    STORAGE_SERVICE_URL,
     VISION_SERVICE_URL,
     FILES_API_PREFIX,
     REPORTS_API_PREFIX,
 )
+from app.sharding import shard_for
+from app import listing_cache
 
 
 async def receive_metadata(websocket) -> Dict[str, Any]:
@@ -34,11 +36,15 @@ async def receive_metadata(websocket) -> Dict[str, Any]:
 async def create_staging_report() -> str:
     """Create a staging report at the storage service and return report_id.
 
-    Raises Exception on failure.
+    The report_id is generated here so the report can be placed on the
+    storage shard that owns it. Raises Exception on failure.
     """
+    report_id = str(uuid.uuid4())
     async with httpx.AsyncClient() as client:
         resp = await client.post(
-            f"{STORAGE_SERVICE_URL}{REPORTS_API_PREFIX}", timeout=10.0
+            f"{shard_for(report_id)}{REPORTS_API_PREFIX}",
+            json={"report_id": report_id},
+            timeout=10.0,
         )
         if resp.status_code != 200:
             raise Exception(f"Failed to create report on storage service: {resp.text}")
@@ -60,7 +66,7 @@ async def upload_report_image(
     files = {"file": (filename, BytesIO(file_data), content_type)}
     async with httpx.AsyncClient() as client:
         response = await client.post(
-            f"{STORAGE_SERVICE_URL}{FILES_API_PREFIX}/upload/{upload_id}/report",
+            f"{shard_for(upload_id)}{FILES_API_PREFIX}/upload/{upload_id}/report",
             files=files,
             timeout=30.0,
         )
@@ -85,18 +91,41 @@ async def send_to_vision_service(
         return response.json()
 
 
-async def upload_mask(upload_id: str, mask_bytes: bytes) -> Optional[Dict[str, Any]]:
+def vision_metadata(vision_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Pick the values storage persists on the report from a vision response."""
+    stats = vision_result.get("statistics") or {}
+    return {
+        "segmented_pixels": stats.get("segmented_pixels"),
+        "total_pixels": stats.get("total_pixels"),
+        "coverage_percent": stats.get("coverage_percent"),
+        "threshold": stats.get("threshold_used"),
+        "model_version": vision_result.get("model_version"),
+        "image_width": vision_result.get("image_width"),
+        "image_height": vision_result.get("image_height"),
+    }
+
+
+async def upload_mask(
+    upload_id: str, mask_bytes: bytes, metadata: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
     """Upload a segmentation mask to the storage service.
 
+    `metadata` (see `vision_metadata`) is stored on the report row.
     Returns parsed JSON on success, or None on failure (mask saving is non-fatal).
     """
     files = {"file": ("mask.png", BytesIO(mask_bytes), "image/png")}
+    data = {"metadata": json.dumps(metadata)} if metadata else None
     async with httpx.AsyncClient() as client:
         response = await client.post(
-            f"{STORAGE_SERVICE_URL}{FILES_API_PREFIX}/upload/{upload_id}/mask",
+            f"{shard_for(upload_id)}{FILES_API_PREFIX}/upload/{upload_id}/mask",
             files=files,
+            data=data,
             timeout=30.0,
         )
         if response.status_code != 200:
             return None
-        return response.json()
+        result = response.json()
+    if result.get("committed"):
+        # The report is now listed; don't wait for the change feed
+        listing_cache.cache.invalidate()
+    return result
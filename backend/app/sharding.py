@@ -0,0 +1,65 @@
+"""Placement of reports on storage-service shards.
+
+STORAGE_SERVICE_URL may list several storage-service instances. Each report
+lives on the shard that owns its report_id on a consistent-hash ring, so
+adding a shard only moves the reports that now hash to it (roughly 1/N of
+them); `python -m app.rebalance` copies those over.
+
+Reads go to the owner first and fall back to the other shards on a 404,
+which keeps reports reachable while a rebalance is still running.
+"""
+
+import bisect
+import hashlib
+from typing import Dict, Iterable, List
+
+from app.config import STORAGE_SERVICE_URLS, STORAGE_RING_VNODES
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring with `vnodes` points per node."""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = STORAGE_RING_VNODES):
+        self.nodes: List[str] = list(dict.fromkeys(nodes))
+        if not self.nodes:
+            raise ValueError("At least one storage-service URL is required")
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(max(1, vnodes))
+        )
+        self._keys = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[i]
+
+
+ring = HashRing(STORAGE_SERVICE_URLS)
+
+
+def is_sharded() -> bool:
+    return len(ring.nodes) > 1
+
+
+def shard_for(report_id: str) -> str:
+    """Base URL of the storage-service that owns report_id."""
+    return ring.node_for(report_id)
+
+
+def candidates(report_id: str) -> List[str]:
+    """Shards to try for a read: the owner first, then the rest."""
+    owner = shard_for(report_id)
+    return [owner] + [n for n in ring.nodes if n != owner]
+
+
+def group_by_shard(report_ids: Iterable[str]) -> Dict[str, List[str]]:
+    groups: Dict[str, List[str]] = {}
+    for rid in report_ids:
+        groups.setdefault(shard_for(rid), []).append(rid)
+    return groups
@@ -103,14 +103,13 @@ export default function ReportPage({ params }: { params: any }) {
         }
 
         try {
-          const res = await fetch(`${envBase}/api/reports`, {
-            cache: 'no-store',
-          });
+          const res = await fetch(
+            `${envBase}/api/reports/${encodeURIComponent(id)}`,
+            { cache: 'no-store' }
+          );
           if (res.ok) {
             const data = await res.json();
-            const items: Report[] = data.items || [];
-            const match = items.find((it) => it.report_id === id);
-            if (match) found = match;
+            if (data.item) found = data.item as Report;
           }
         } catch (e) {
           // network error — treat as not found
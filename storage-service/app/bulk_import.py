@@ -0,0 +1,253 @@
+"""Bulk ingest of report images (and optional masks).
+
+Used by `POST /api/reports/import` to backfill historical data without going
+through the one-file-per-WebSocket upload flow. Input is either a multipart
+batch or a streamed tar archive; both are reduced to a list of ImportItem
+pairs and written with bounded parallelism.
+
+Pairing rules (tar member paths or multipart filenames):
+- hidden files and `__MACOSX/` entries (archive metadata) are ignored
+- files without an image extension (IMAGE_EXTENSIONS) fail as "not an image"
+- `masks/<stem>.<ext>` or `<stem>_mask.png` is the mask for image `<stem>`
+- everything else is a report image
+- a stem used by more than one image (or mask) fails for all but the first
+  name in sorted order, instead of one silently replacing the other
+
+Images that come with a mask are written straight to final storage and
+inserted as reports. Images without a mask are staged exactly like a normal
+upload, so posting a mask later (e.g. after running vision) finalizes them.
+"""
+
+import asyncio
+import mimetypes
+import os
+import shutil
+import tarfile
+import tempfile
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from .config import (
+    REPORTS_DIR,
+    MASKS_DIR,
+    STAGING_DIR,
+    IMPORT_WRITE_CONCURRENCY,
+    DERIVATIVES_ON_FINALIZE,
+)
+from . import derivatives, staging
+from .insert_batcher import REPORT_INSERT_COLUMNS, report_inserts, report_row
+
+# Source for a file: a path on the same volume (moved into place) or a
+# callable returning a readable binary file object (copied)
+Opener = Union[str, Callable[[], BinaryIO]]
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+
+@dataclass
+class ImportItem:
+    filename: str
+    image: Optional[Opener]
+    mask: Optional[Opener] = None
+    # Assigned by the caller (sharded placement); generated when None
+    report_id: Optional[str] = None
+    # Set when the file can't be imported; the item is reported as failed
+    error: Optional[str] = None
+    # Tar member path or multipart filename of the image, echoed back as
+    # `source` so callers can tell same-named files in different folders apart
+    source: Optional[str] = None
+
+
+def classify(name: str):
+    """Return (kind, stem) for an archive/multipart file name.
+
+    kind is "report", "mask", "other" (not an image) or None (archive
+    metadata such as `.DS_Store` or `__MACOSX/`, to be ignored).
+    """
+    parts = Path(name).parts
+    base = os.path.basename(name)
+    stem, ext = os.path.splitext(base)
+    if base.startswith(".") or "__MACOSX" in parts:
+        return None, stem
+    if ext.lower() not in IMAGE_EXTENSIONS:
+        return "other", stem
+    if stem.endswith("_mask"):
+        return "mask", stem[: -len("_mask")]
+    if len(parts) > 1 and parts[-2] == "masks":
+        return "mask", stem
+    return "report", stem
+
+
+def pair_files(named: Iterable[Tuple[str, Opener]]) -> List[ImportItem]:
+    """Group (name, opener) pairs into image/mask ImportItems.
+
+    Masks without an image are dropped; files that can't be imported (see
+    the pairing rules above) come back as items with `error` set.
+    """
+    images: Dict[str, tuple] = {}
+    masks: Dict[str, tuple] = {}
+    failed: List[ImportItem] = []
+    for name, opener in sorted(named, key=lambda pair: pair[0]):
+        kind, stem = classify(name)
+        filename = os.path.basename(name)
+        if kind is None:
+            continue
+        if kind == "other":
+            error = f"{name} is not an image"
+            failed.append(ImportItem(filename, None, error=error, source=name))
+            continue
+        seen = masks if kind == "mask" else images
+        if stem in seen:
+            error = f"{name}: duplicate {kind} for {stem!r} (also {seen[stem][0]})"
+            failed.append(ImportItem(filename, None, error=error, source=name))
+            continue
+        seen[stem] = (name, opener)
+
+    items = [
+        ImportItem(
+            filename=os.path.basename(name),
+            image=opener,
+            mask=masks[stem][1] if stem in masks else None,
+            source=name,
+        )
+        for stem, (name, opener) in images.items()
+    ]
+    return items + failed
+
+
+def extract_tar(fileobj: BinaryIO, work_dir: str) -> List[Tuple[str, Opener]]:
+    """Extract regular files from a (possibly compressed) tar stream into work_dir.
+
+    The archive is read sequentially ('r|*'), so it never needs to be
+    seekable and members are copied to disk one at a time.
+    """
+    named: List[Tuple[str, Opener]] = []
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            src = tar.extractfile(member)
+            if src is None:
+                continue
+            dest = os.path.join(work_dir, uuid.uuid4().hex)
+            with open(dest, "wb") as out:
+                shutil.copyfileobj(src, out)
+            named.append((member.name, dest))
+    return named
+
+
+def _copy(source: Opener, dest: str) -> int:
+    if isinstance(source, str):
+        shutil.move(source, dest)
+    else:
+        with source() as src, open(dest, "wb") as out:
+            shutil.copyfileobj(src, out)
+    return os.path.getsize(dest)
+
+
+def _write_item(item: ImportItem, report_id: str) -> dict:
+    """Write one item to final storage (with mask) or staging (without)."""
+    staged_name = f"{report_id}_{item.filename}"
+
+    if item.mask is None:
+        path = staging.create_entry(report_id) / staged_name
+        size = _copy(item.image, str(path))
+        staging.record_file(report_id, "report", staged_name, size)
+        content_type = mimetypes.guess_type(item.filename)[0]
+        if content_type:
+            staging.merge_metadata(report_id, {"content_type": content_type})
+        return {
+            "report_id": report_id,
+            "filename": item.filename,
+            "source": item.source,
+            "committed": False,
+        }
+
+    # Same final naming as finalize_report_if_ready
+    final_report_path = os.path.join(REPORTS_DIR, f"{report_id}_{staged_name}")
+    final_mask_path = os.path.join(MASKS_DIR, f"{report_id}_mask.png")
+    report_bytes = _copy(item.image, final_report_path)
+    mask_bytes = _copy(item.mask, final_mask_path)
+    return {
+        "report_id": report_id,
+        "filename": item.filename,
+        "source": item.source,
+        "committed": True,
+        "row": report_row(
+            report_id=report_id,
+            report_image_path=final_report_path,
+            mask_image_path=final_mask_path,
+            report_image_bytes=report_bytes,
+            mask_image_bytes=mask_bytes,
+            content_type=mimetypes.guess_type(item.filename)[0],
+        ),
+    }
+
+
+async def import_items(
+    items: List[ImportItem],
+    concurrency: int = IMPORT_WRITE_CONCURRENCY,
+    exists: Optional[Callable[[str], bool]] = None,
+) -> dict:
+    """Write items with at most `concurrency` file writes in flight.
+
+    Report rows are inserted through the group-commit batcher, so rows from
+    one import share transactions. Items with a caller-assigned report_id
+    fail if `exists(report_id)` reports it as taken.
+    """
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    os.makedirs(MASKS_DIR, exist_ok=True)
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(item: ImportItem) -> dict:
+        report_id = item.report_id or str(uuid.uuid4())
+        try:
+            if item.error:
+                raise ValueError(item.error)
+            if item.report_id and exists and await asyncio.to_thread(exists, report_id):
+                raise ValueError(f"report_id {report_id} already exists")
+            async with sem:
+                result = await asyncio.to_thread(_write_item, item, report_id)
+            row = result.pop("row", None)
+            if row:
+                await report_inserts.submit(row)
+                if DERIVATIVES_ON_FINALIZE:
+                    cols = dict(zip(REPORT_INSERT_COLUMNS, row))
+                    derivatives.schedule(
+                        report_id, cols["report_image_path"], cols["mask_image_path"]
+                    )
+            return result
+        except Exception as e:
+            print(f"❌ Import failed for {item.filename}: {e}")
+            return {
+                "report_id": None,
+                "filename": item.filename,
+                "source": item.source,
+                "error": str(e),
+            }
+
+    results = await asyncio.gather(*(one(it) for it in items))
+    return {
+        "success": True,
+        "items": results,
+        "committed": sum(1 for r in results if r.get("committed")),
+        "pending": sum(1 for r in results if r.get("committed") is False),
+        "failed": sum(1 for r in results if "error" in r),
+    }
+
+
+async def import_tar_stream(chunks) -> dict:
+    """Import from an async iterator of tar bytes (e.g. request.stream())."""
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=STAGING_DIR, prefix=".import_") as work_dir:
+        spool = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024, dir=work_dir)
+        try:
+            async for chunk in chunks:
+                spool.write(chunk)
+            spool.seek(0)
+            named = await asyncio.to_thread(extract_tar, spool, work_dir)
+        finally:
+            spool.close()
+        return await import_items(pair_files(named))
@@ -0,0 +1,131 @@
+"""Change feed of finalized reports (server-sent events).
+
+The sequence number of an event is the report's `reports.id`, which SQLite
+assigns monotonically (AUTOINCREMENT), so "everything after N" is a plain
+keyset query and a client can resume from the last id it saw. The insert
+batcher calls `feed.notify()` after each commit; subscribers then read the
+new rows from the database, so no events are held in memory.
+
+Deleted reports (moved to another shard by the rebalancer) are announced
+as `delete` events to the subscribers connected at the time. They carry no
+id and are not replayed: a client that reconnects has to assume it missed
+some, as the backend listing cache does.
+"""
+
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator, Deque, Iterable, List, Optional, Tuple
+
+from .config import CHANGES_HEARTBEAT_SECONDS
+from .db import db_connect
+
+PAGE_SIZE = 200
+# Deletions kept for subscribers that haven't caught up yet
+DELETED_BACKLOG = 1000
+
+
+class ChangeFeed:
+    """Wakes subscribers whenever new reports have been committed."""
+
+    def __init__(self):
+        self.version = 0
+        self.subscribers = 0
+        self.events_sent = 0
+        self.deletions = 0
+        self._deleted: Deque[str] = deque(maxlen=DELETED_BACKLOG)
+        self._event: Optional[asyncio.Event] = None
+
+    def notify(self) -> None:
+        self.version += 1
+        if self._event is not None:
+            self._event.set()
+            self._event = None
+
+    def notify_deleted(self, report_id: str) -> None:
+        self._deleted.append(report_id)
+        self.deletions += 1
+        self.notify()
+
+    def deleted_since(self, deletions: int) -> List[str]:
+        """report_ids deleted after `deletions` was read (the latest ones)."""
+        new = min(self.deletions - deletions, len(self._deleted))
+        return list(self._deleted)[len(self._deleted) - new :]
+
+    async def wait(self, version: int) -> None:
+        """Return once notify() has been called after `version` was read."""
+        if self.version != version:
+            return
+        if self._event is None:
+            self._event = asyncio.Event()
+        await self._event.wait()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "notifications": self.version,
+            "events_sent": self.events_sent,
+            "deletions": self.deletions,
+        }
+
+
+feed = ChangeFeed()
+
+
+def latest_sequence() -> int:
+    conn = db_connect()
+    row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM reports").fetchone()
+    conn.close()
+    return row[0]
+
+
+def rows_after(after: int, columns: Iterable[str], limit: int = PAGE_SIZE) -> List[Tuple]:
+    """(id, *columns) rows with id > after, oldest first."""
+    conn = db_connect()
+    rows = conn.execute(
+        f"SELECT id, {', '.join(columns)} FROM reports WHERE id > ? ORDER BY id LIMIT ?",
+        (after, limit),
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def _event(seq: int, name: str, data: dict) -> str:
+    return f"id: {seq}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream(
+    after: int,
+    columns: Tuple[str, ...],
+    heartbeat: float = CHANGES_HEARTBEAT_SECONDS,
+) -> AsyncIterator[str]:
+    """Yield SSE frames for reports after `after`, then follow new commits."""
+    feed.subscribers += 1
+    try:
+        # Reconnect delay, plus the starting position as an id-only frame
+        # (no event is dispatched) so a client that sees no events before
+        # reconnecting still resumes from here rather than from the head
+        yield f"retry: 3000\nid: {after}\n\n"
+        last = after
+        deletions = feed.deletions
+        while True:
+            version = feed.version
+            for report_id in feed.deleted_since(deletions):
+                feed.events_sent += 1
+                yield f"event: delete\ndata: {json.dumps({'report_id': report_id})}\n\n"
+            deletions = feed.deletions
+            rows = await asyncio.to_thread(rows_after, last, columns)
+            for row in rows:
+                last = row[0]
+                feed.events_sent += 1
+                yield _event(last, "report", dict(zip(columns, row[1:])))
+            if len(rows) == PAGE_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(feed.wait(version), heartbeat)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": heartbeat\n\n"
+    finally:
+        feed.subscribers -= 1
@@ -0,0 +1,57 @@
+"""Storage service configuration.
+
+Paths and tunables are read from environment variables so several local
+instances (or a test run) can point at their own data directory without
+editing source. Defaults match the container layout.
+"""
+
+import os
+
+# Root data directory (mounted volume in docker-compose)
+DATA_DIR = os.environ.get("STORAGE_DATA_DIR", "/app/data")
+
+# Final storage directories
+REPORTS_DIR = os.path.join(DATA_DIR, "uploads", "reports")
+MASKS_DIR = os.path.join(DATA_DIR, "uploads", "masks")
+
+# Staging area for uploads until both files and report are present
+STAGING_DIR = os.path.join(DATA_DIR, "uploads", "staging")
+
+# SQLite database file
+DB_PATH = os.environ.get("DB_PATH", os.path.join(DATA_DIR, "database.db"))
+
+# Staging entries older than this are considered abandoned and swept
+STAGING_TTL_SECONDS = int(os.environ.get("STAGING_TTL_SECONDS", str(6 * 3600)))
+# How often the background sweeper wakes up
+STAGING_SWEEP_INTERVAL_SECONDS = float(
+    os.environ.get("STAGING_SWEEP_INTERVAL_SECONDS", "60")
+)
+# Maximum number of staging entries removed per sweep (rate limit)
+STAGING_SWEEP_BATCH = int(os.environ.get("STAGING_SWEEP_BATCH", "100"))
+
+# Group commit for report inserts: rows arriving within this window (or until
+# the batch is full) share one transaction / fsync
+INSERT_BATCH_MAX_ROWS = int(os.environ.get("INSERT_BATCH_MAX_ROWS", "64"))
+INSERT_BATCH_MAX_WAIT_MS = float(os.environ.get("INSERT_BATCH_MAX_WAIT_MS", "5"))
+
+# Bulk import: files written concurrently and maximum files per request
+IMPORT_WRITE_CONCURRENCY = int(os.environ.get("IMPORT_WRITE_CONCURRENCY", "8"))
+IMPORT_MAX_FILES = int(os.environ.get("IMPORT_MAX_FILES", "5000"))
+
+# Derived images (thumbnails / web-optimized versions) served via ?variant=
+DERIVATIVES_DIR = os.path.join(DATA_DIR, "uploads", "derivatives")
+THUMB_MAX_SIZE = int(os.environ.get("THUMB_MAX_SIZE", "256"))
+WEB_MAX_SIZE = int(os.environ.get("WEB_MAX_SIZE", "1280"))
+DERIVATIVE_QUALITY = int(os.environ.get("DERIVATIVE_QUALITY", "80"))
+DERIVATIVE_WORKERS = int(os.environ.get("DERIVATIVE_WORKERS", "2"))
+# Generate all variants right after finalize (otherwise only on first request)
+DERIVATIVES_ON_FINALIZE = os.environ.get("DERIVATIVES_ON_FINALIZE", "1") == "1"
+
+# Mask overlay rendering (/api/files/{id}/overlay) and its in-memory cache
+OVERLAY_MAX_SIZE = int(os.environ.get("OVERLAY_MAX_SIZE", "2048"))
+OVERLAY_CACHE_MAX_BYTES = int(
+    os.environ.get("OVERLAY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+
+# Change feed (/api/reports/changes): idle heartbeat interval
+CHANGES_HEARTBEAT_SECONDS = float(os.environ.get("CHANGES_HEARTBEAT_SECONDS", "15"))
@@ -0,0 +1,15 @@
+"""SQLite connection helpers shared by the route modules."""
+
+import sqlite3
+
+from .config import DB_PATH
+from .migrate import run_migrations
+
+
+def db_connect():
+    return sqlite3.connect(DB_PATH)
+
+
+def init_db():
+    """Create the database file if needed and apply pending migrations."""
+    run_migrations(DB_PATH)
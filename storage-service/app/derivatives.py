@@ -0,0 +1,122 @@
+"""Thumbnail and web-optimized derivatives of report images and masks.
+
+Derivatives are WebP files cached on disk under DERIVATIVES_DIR:
+
+    <report_id>/<kind>_<variant>.webp      kind: report | mask
+
+They are produced by a small worker pool so encoding never runs on the
+event loop: eagerly right after finalize (DERIVATIVES_ON_FINALIZE) and lazily
+on the first request for a missing variant. Concurrent requests for the same
+derivative share one generation job.
+"""
+
+import asyncio
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
+
+from PIL import Image, ImageOps
+
+from .config import (
+    DERIVATIVES_DIR,
+    THUMB_MAX_SIZE,
+    WEB_MAX_SIZE,
+    DERIVATIVE_QUALITY,
+    DERIVATIVE_WORKERS,
+)
+
+VARIANTS = {
+    "thumb": THUMB_MAX_SIZE,
+    "web": WEB_MAX_SIZE,
+}
+
+MEDIA_TYPE = "image/webp"
+
+# Pillow releases the GIL while decoding, resizing and encoding, so threads
+# give real parallelism here without the cost of shipping images to processes
+_pool = ThreadPoolExecutor(
+    max_workers=max(1, DERIVATIVE_WORKERS), thread_name_prefix="derivatives"
+)
+# In-flight jobs keyed by destination path (single-flight)
+_jobs: Dict[str, Future] = {}
+
+
+def report_dir(report_id: str) -> str:
+    return os.path.join(DERIVATIVES_DIR, report_id)
+
+
+def derivative_path(report_id: str, kind: str, variant: str) -> str:
+    return os.path.join(report_dir(report_id), f"{kind}_{variant}.webp")
+
+
+def _is_fresh(dest: str, source: str) -> bool:
+    try:
+        return os.path.getmtime(dest) >= os.path.getmtime(source)
+    except OSError:
+        return False
+
+
+def render(source: str, dest: str, kind: str, variant: str) -> str:
+    """Generate one derivative file (blocking). Returns dest."""
+    max_size = VARIANTS[variant]
+    with Image.open(source) as img:
+        if kind == "mask":
+            # Binary masks: keep hard edges and encode losslessly
+            img = img.convert("L")
+            img.thumbnail((max_size, max_size), Image.NEAREST)
+            save_args = {"lossless": True}
+        else:
+            # Let the JPEG decoder skip detail we are about to throw away
+            img.draft("RGB", (max_size, max_size))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("L" if img.mode in ("L", "I", "I;16") else "RGB")
+            img.thumbnail((max_size, max_size), Image.LANCZOS)
+            save_args = {"quality": DERIVATIVE_QUALITY, "method": 4}
+
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.tmp{os.getpid()}"
+        img.save(tmp, format="WEBP", **save_args)
+    os.replace(tmp, dest)
+    return dest
+
+
+def _submit(source: str, kind: str, variant: str, dest: str) -> Future:
+    job = _jobs.get(dest)
+    if job is not None and not job.done():
+        return job
+    job = _pool.submit(render, source, dest, kind, variant)
+    _jobs[dest] = job
+    job.add_done_callback(lambda f, d=dest: _jobs.pop(d) if _jobs.get(d) is f else None)
+    return job
+
+
+async def get_or_create(report_id: str, kind: str, source: str, variant: str) -> str:
+    """Return the path of a cached derivative, generating it if needed.
+
+    Raises KeyError for an unknown variant.
+    """
+    if variant not in VARIANTS:
+        raise KeyError(variant)
+    dest = derivative_path(report_id, kind, variant)
+    if _is_fresh(dest, source):
+        return dest
+    return await asyncio.wrap_future(_submit(source, kind, variant, dest))
+
+
+async def run(fn, *args):
+    """Run a blocking image job on the derivative worker pool."""
+    return await asyncio.get_running_loop().run_in_executor(_pool, fn, *args)
+
+
+def schedule(report_id: str, report_path: str, mask_path: str) -> None:
+    """Queue every variant of a report's image and mask (fire and forget)."""
+    for kind, source in (("report", report_path), ("mask", mask_path)):
+        for variant in VARIANTS:
+            job = _submit(source, kind, variant, derivative_path(report_id, kind, variant))
+            job.add_done_callback(_log_failure)
+
+
+def _log_failure(job: Future) -> None:
+    err = job.exception()
+    if err is not None:
+        print(f"⚠️  Derivative generation failed: {err}")
@@ -0,0 +1,202 @@
+"""Streaming archive export of finalized reports.
+
+Archives are generated on the fly: rows are read in keyset pages, files are
+copied in fixed-size chunks, and only the current chunk is held in memory.
+The metadata manifest (`manifest.jsonl`) is spooled to a temporary file while
+reports are written and appended as the last member.
+
+Layout:
+    reports/<report_id>/<image filename>
+    reports/<report_id>/mask.png
+    manifest.jsonl        one JSON object per exported report
+
+Reports are exported in insertion order (`reports.id`). To resume an
+interrupted export, pass the report_id of the last complete report as
+`after`; the next export starts with the report after it.
+"""
+
+import json
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from typing import Iterator, List, Optional
+
+from .db import db_connect
+from .insert_batcher import REPORT_INSERT_COLUMNS
+
+CHUNK_SIZE = 256 * 1024
+PAGE_SIZE = 200
+
+EXPORT_COLUMNS = ("id", *REPORT_INSERT_COLUMNS, "created_at", "updated_at")
+
+
+def resolve_cursor(after: Optional[str]) -> int:
+    """Map a report_id cursor to its row id (0 = from the beginning).
+
+    Raises KeyError if the report_id does not exist.
+    """
+    if not after:
+        return 0
+    conn = db_connect()
+    row = conn.execute("SELECT id FROM reports WHERE report_id = ?", (after,)).fetchone()
+    conn.close()
+    if row is None:
+        raise KeyError(after)
+    return row[0]
+
+
+def iter_rows(
+    after_id: int,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Iterator[dict]:
+    """Yield report rows with id > after_id in id order, one page at a time."""
+    where = ["id > ?"]
+    params: List = []
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until:
+        where.append("created_at < ?")
+        params.append(until)
+
+    sql = (
+        f"SELECT {', '.join(EXPORT_COLUMNS)} FROM reports "
+        f"WHERE {' AND '.join(where)} ORDER BY id LIMIT ?"
+    )
+    remaining = limit
+    last_id = after_id
+    while remaining is None or remaining > 0:
+        page = PAGE_SIZE if remaining is None else min(PAGE_SIZE, remaining)
+        conn = db_connect()
+        rows = conn.execute(sql, (last_id, *params, page)).fetchall()
+        conn.close()
+        if not rows:
+            return
+        for r in rows:
+            yield dict(zip(EXPORT_COLUMNS, r))
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < page:
+            return
+
+
+def _members(row: dict):
+    """(archive name, disk path) pairs for a report's files that exist on disk."""
+    out = []
+    image = row["report_image_path"]
+    if image and os.path.exists(image):
+        # Stored names carry `<report_id>_` prefixes; strip them for the archive
+        name = os.path.basename(image)
+        prefix = f"{row['report_id']}_"
+        while name.startswith(prefix):
+            name = name[len(prefix) :]
+        out.append((f"reports/{row['report_id']}/{name}", image))
+    mask = row["mask_image_path"]
+    if mask and os.path.exists(mask):
+        out.append((f"reports/{row['report_id']}/mask.png", mask))
+    return out
+
+
+def _manifest_entry(row: dict, members) -> bytes:
+    entry = {k: v for k, v in row.items() if k not in ("id",)}
+    entry["files"] = [name for name, _ in members]
+    return (json.dumps(entry) + "\n").encode("utf-8")
+
+
+def _read_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _tar_member(name: str, size: int, mtime: float, chunks: Iterator[bytes]):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+    for chunk in chunks:
+        yield chunk
+    remainder = size % tarfile.BLOCKSIZE
+    if remainder:
+        yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+
+
+def stream_tar(rows: Iterator[dict]) -> Iterator[bytes]:
+    with tempfile.TemporaryFile() as manifest:
+        for row in rows:
+            members = _members(row)
+            for name, path in members:
+                st = os.stat(path)
+                yield from _tar_member(name, st.st_size, st.st_mtime, _read_chunks(path))
+            manifest.write(_manifest_entry(row, members))
+
+        size = manifest.tell()
+        manifest.seek(0)
+        yield from _tar_member(
+            "manifest.jsonl", size, time.time(), iter(lambda: manifest.read(CHUNK_SIZE), b"")
+        )
+    # End-of-archive marker: two zero blocks
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def stream_zip(rows: Iterator[dict]) -> Iterator[bytes]:
+    for chunk in _stream_zip(rows):
+        if chunk:
+            yield chunk
+
+
+def _stream_zip(rows: Iterator[dict]) -> Iterator[bytes]:
+    # Images are already compressed, so members are stored as-is
+    sink = _ChunkSink()
+    with tempfile.TemporaryFile() as manifest:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as zf:
+            for row in rows:
+                members = _members(row)
+                for name, path in members:
+                    with zf.open(name, mode="w", force_zip64=True) as dest:
+                        for chunk in _read_chunks(path):
+                            dest.write(chunk)
+                            yield sink.drain()
+                    yield sink.drain()
+                manifest.write(_manifest_entry(row, members))
+
+            manifest.seek(0)
+            with zf.open("manifest.jsonl", mode="w", force_zip64=True) as dest:
+                for chunk in iter(lambda: manifest.read(CHUNK_SIZE), b""):
+                    dest.write(chunk)
+                    yield sink.drain()
+        # Central directory is written on close
+        yield sink.drain()
@@ -0,0 +1,216 @@
+"""Group-commit batching for report inserts.
+
+Every finalize used to open a connection and commit a single-row INSERT, so
+each upload paid for its own fsync. The batcher collects rows submitted
+within a short window (INSERT_BATCH_MAX_WAIT_MS, up to INSERT_BATCH_MAX_ROWS)
+and writes them in one transaction. Rows queued while a commit is in flight
+join the next batch, so the window only matters under sustained load.
+`submit` only returns once the transaction containing the row has
+committed, so callers still acknowledge uploads after their row is durable.
+"""
+
+import asyncio
+import sqlite3
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from .config import DB_PATH, INSERT_BATCH_MAX_ROWS, INSERT_BATCH_MAX_WAIT_MS
+
+# Columns written when a report is finalized (order of report_row tuples)
+REPORT_INSERT_COLUMNS = (
+    "report_id",
+    "report_image_path",
+    "mask_image_path",
+    "segmented_pixels",
+    "total_pixels",
+    "coverage_percent",
+    "threshold",
+    "model_version",
+    "image_width",
+    "image_height",
+    "report_image_bytes",
+    "mask_image_bytes",
+    "content_type",
+)
+
+# Written after them: default to the insert time, but a report copied from
+# another shard keeps its original timestamps
+REPORT_TIMESTAMP_COLUMNS = ("created_at", "updated_at")
+
+INSERT_REPORT_SQL = (
+    "INSERT INTO reports "
+    f"({', '.join(REPORT_INSERT_COLUMNS + REPORT_TIMESTAMP_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in REPORT_INSERT_COLUMNS)}, "
+    f"{', '.join('COALESCE(?, CURRENT_TIMESTAMP)' for _ in REPORT_TIMESTAMP_COLUMNS)})"
+)
+
+
+def report_row(**values) -> tuple:
+    """Build an insert tuple; columns not given are stored as NULL (the
+    timestamps as the insert time)."""
+    columns = REPORT_INSERT_COLUMNS + REPORT_TIMESTAMP_COLUMNS
+    unknown = set(values) - set(columns)
+    if unknown:
+        raise ValueError(f"Unknown report columns: {sorted(unknown)}")
+    return tuple(values.get(c) for c in columns)
+
+
+class InsertBatcher:
+    """Coalesce concurrent single-row inserts into shared transactions."""
+
+    def __init__(
+        self,
+        sql: str = INSERT_REPORT_SQL,
+        db_path: str = DB_PATH,
+        max_rows: int = INSERT_BATCH_MAX_ROWS,
+        max_wait_ms: float = INSERT_BATCH_MAX_WAIT_MS,
+    ):
+        self.sql = sql
+        self.db_path = db_path
+        self.max_rows = max(1, max_rows)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_batch_rows = 0
+        self._listeners: List[Callable[[], None]] = []
+        self.stats = {
+            "batches_total": 0,
+            "rows_total": 0,
+            "failed_rows_total": 0,
+            "max_batch_rows": 0,
+        }
+
+    def start(self) -> None:
+        """Start the writer task on the running event loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Call `callback()` on the event loop after each commit that stored rows."""
+        self._listeners.append(callback)
+
+    async def submit(self, params: Sequence) -> None:
+        """Queue one row and wait until it has been committed.
+
+        Raises the sqlite error for this row if it could not be inserted.
+        """
+        self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((tuple(params), fut))
+        await fut
+
+    async def _collect(self) -> List[Tuple[tuple, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        # Only hold the window open when the last batch was shared; a lone
+        # writer commits immediately, and rows arriving during its commit
+        # form the next batch anyway.
+        wait = self.max_wait if self._last_batch_rows > 1 else 0.0
+        deadline = loop.time() + wait
+        while len(batch) < self.max_rows:
+            # Take whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            rows = [params for params, _ in batch]
+            self._last_batch_rows = len(rows)
+            try:
+                errors = await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                errors = [e] * len(rows)
+
+            for (_, fut), err in zip(batch, errors):
+                if fut.done():
+                    continue
+                if err is None:
+                    fut.set_result(None)
+                else:
+                    fut.set_exception(err)
+
+            if any(err is None for err in errors):
+                for callback in self._listeners:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"⚠️  Insert listener failed: {e}")
+
+    def _connection(self) -> sqlite3.Connection:
+        # Only the writer task touches this connection, one batch at a time,
+        # but to_thread may run successive batches on different threads.
+        # Transactions are managed explicitly (isolation_level=None).
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, isolation_level=None
+            )
+        return self._conn
+
+    def _write(self, rows: List[tuple]) -> List[Optional[Exception]]:
+        """Insert rows in one transaction; isolate failures row by row.
+
+        Returns a list with None for committed rows and the exception for
+        rows that failed.
+        """
+        conn = self._connection()
+        errors: List[Optional[Exception]] = [None] * len(rows)
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(self.sql, rows)
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK")
+            # One bad row (e.g. duplicate report_id) must not fail the others:
+            # retry each row under its own savepoint, still one commit.
+            conn.execute("BEGIN")
+            try:
+                for i, row in enumerate(rows):
+                    conn.execute("SAVEPOINT row_insert")
+                    try:
+                        conn.execute(self.sql, row)
+                    except sqlite3.Error as e:
+                        conn.execute("ROLLBACK TO row_insert")
+                        errors[i] = e
+                    conn.execute("RELEASE row_insert")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        failed = sum(1 for e in errors if e is not None)
+        self.stats["batches_total"] += 1
+        self.stats["rows_total"] += len(rows) - failed
+        self.stats["failed_rows_total"] += failed
+        self.stats["max_batch_rows"] = max(self.stats["max_batch_rows"], len(rows))
+        return errors
+
+
+# Shared batcher for finalize inserts
+report_inserts = InsertBatcher()
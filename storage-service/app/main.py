@@ -1,8 +1,13 @@
 """Storage Service - File Storage for Images"""
 
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import files, reports
+from .db import init_db
+from . import changes, staging
+from .insert_batcher import report_inserts
+from .routes import files, reports, metrics
 
 app = FastAPI(
     title="Storage Service",
@@ -23,12 +28,29 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     """Initialize service"""
+    init_db()
+    adopted = staging.reconcile_orphans()
+    if adopted:
+        print(f"📋 Registered {adopted} untracked staging directories")
+    app.state.staging_sweeper = asyncio.create_task(staging.run_sweeper())
+    report_inserts.add_listener(changes.feed.notify)
+    report_inserts.start()
     print("✅ Storage service started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks"""
+    sweeper = getattr(app.state, "staging_sweeper", None)
+    if sweeper:
+        sweeper.cancel()
+    await report_inserts.stop()
+
+
 # Include routers
 app.include_router(files.router, prefix="/api", tags=["files"])
 app.include_router(reports.router, prefix="/api", tags=["reports"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 
 
 @app.get("/")
@@ -37,7 +59,7 @@ async def root():
     return {
         "service": "Storage Service",
         "status": "running",
-        "endpoints": {"files": "/api/files"},
+        "endpoints": {"files": "/api/files", "metrics": "/api/metrics"},
     }
 
 
@@ -7,6 +7,9 @@ Usage:
     python app/migrate.py
 
 The default DB path is /app/data/database.db. You can override it with DB_PATH env var.
+
+The storage service also calls `run_migrations` on startup, so a fresh
+container gets an up-to-date schema without a manual step.
 """
 
 import os
@@ -54,9 +57,10 @@ def apply_migration(conn: sqlite3.Connection, path: Path):
     print(f"Applied migration: {path.name}")
 
 
-def main():
-    ensure_db_dir(DB_PATH)
-    conn = sqlite3.connect(DB_PATH)
+def run_migrations(db_path: str = DB_PATH):
+    """Apply all pending migrations to the database at db_path."""
+    ensure_db_dir(db_path)
+    conn = sqlite3.connect(db_path)
     ensure_migrations_table(conn)
     files = get_migration_files()
     for f in files:
@@ -68,5 +72,9 @@ def main():
     print("All migrations applied.")
 
 
+def main():
+    run_migrations(DB_PATH)
+
+
 if __name__ == "__main__":
     main()
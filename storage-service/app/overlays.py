@@ -0,0 +1,160 @@
+"""Report images with the segmentation mask composited on top.
+
+Overlays are rendered on the derivative worker pool and kept in a
+byte-bounded in-memory LRU keyed by (report_id, source mtimes, params), so a
+repeated view is served without touching the originals.
+"""
+
+import asyncio
+import io
+import os
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+from .config import OVERLAY_CACHE_MAX_BYTES
+from . import derivatives
+
+MODES = ("contour", "fill")
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+
+OVERLAY_COLOR = (255, 64, 64)
+FILL_OPACITY = 0.4
+
+
+class ByteLRU:
+    """LRU cache of bytes values evicted by total size rather than count."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._items[key] = value
+        self._bytes += len(value)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._items),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+cache = ByteLRU(OVERLAY_CACHE_MAX_BYTES)
+# Renders in flight, so concurrent requests for one overlay share the work
+_inflight: Dict[Hashable, asyncio.Future] = {}
+
+
+def render(
+    report_path: str, mask_path: str, mode: str, size: int, quality: int, fmt: str
+) -> bytes:
+    """Composite the mask over the report image (blocking). Returns encoded bytes."""
+    with Image.open(report_path) as src:
+        src.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(src).convert("RGB")
+    img.thumbnail((size, size), Image.LANCZOS)
+
+    with Image.open(mask_path) as m:
+        mask = m.convert("L").resize(img.size, Image.NEAREST)
+    mask = mask.point(lambda v: 255 if v >= 128 else 0)
+
+    color = Image.new("RGB", img.size, OVERLAY_COLOR)
+    if mode == "fill":
+        img = Image.composite(color, img, mask.point(lambda v: int(v * FILL_OPACITY)))
+    else:
+        # Outline: dilated mask minus the mask, ~1px per 256px of output
+        k = 2 * max(1, round(min(img.size) / 256)) + 1
+        edge = ImageChops.subtract(mask.filter(ImageFilter.MaxFilter(k)), mask)
+        img.paste(color, mask=edge)
+
+    pil_format, _ = FORMATS[fmt]
+    buf = io.BytesIO()
+    if pil_format == "PNG":
+        img.save(buf, format="PNG", optimize=False)
+    else:
+        img.save(buf, format=pil_format, quality=quality)
+    return buf.getvalue()
+
+
+async def get_or_render(
+    report_id: str,
+    report_path: str,
+    mask_path: str,
+    mode: str,
+    size: int,
+    quality: int,
+    fmt: str,
+) -> bytes:
+    """Return cached overlay bytes, rendering on the worker pool on a miss."""
+    # Source mtimes in the key: replaced files never serve a stale overlay
+    key = (
+        report_id,
+        os.path.getmtime(report_path),
+        os.path.getmtime(mask_path),
+        mode,
+        size,
+        quality if fmt != "png" else None,
+        fmt,
+    )
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    task = _inflight.get(key)
+    if task is None:
+        # Rendered in its own task: a client that disconnects doesn't cancel
+        # the render for the others waiting on the same overlay
+        task = asyncio.ensure_future(
+            _render(key, report_path, mask_path, mode, size, quality, fmt)
+        )
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _finished(key, t))
+    return await asyncio.shield(task)
+
+
+async def _render(key, report_path, mask_path, mode, size, quality, fmt) -> bytes:
+    data = await derivatives.run(
+        render, report_path, mask_path, mode, size, quality, fmt
+    )
+    cache.put(key, data)
+    return data
+
+
+def _finished(key: Hashable, task: asyncio.Future) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Mark retrieved so waiter-less failures are not logged as unhandled
+    if not task.cancelled():
+        task.exception()
@@ -1,43 +1,51 @@
 """File upload and retrieval endpoints with staging and atomic commit"""
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Response
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    UploadFile,
+    File,
+    Form,
+    Header,
+    Query,
+    Response,
+)
 from fastapi.responses import FileResponse
+from typing import Optional
 import mimetypes
 import hashlib
+import json
 import os
 import shutil
-from pathlib import Path
 
-from .reports import finalize_report_if_ready
+from ..config import REPORTS_DIR, MASKS_DIR, OVERLAY_MAX_SIZE
+from ..db import db_connect
+from .. import derivatives, mask_codecs, overlays, staging
+from .reports import finalize_report_if_ready, VISION_METADATA_FIELDS
 
 router = APIRouter()
 
-# Final storage directories
-REPORTS_DIR = "/app/data/uploads/reports"
-MASKS_DIR = "/app/data/uploads/masks"
-
-# Staging area for uploads until both files and report are present
-STAGING_DIR = "/app/data/uploads/staging"
-
 
 @router.post("/files/upload/{report_id}/report")
 async def upload_report_file(report_id: str, file: UploadFile = File(...)):
     """Upload report image into staging for the given report_id."""
     # Ensure staging exists for this report
-    staging_path = Path(STAGING_DIR) / report_id
-    if not staging_path.exists():
+    if not staging.exists(report_id):
         raise HTTPException(
             status_code=404, detail="Staging report not found. Create report first."
         )
 
     # Save to staging
     staged_name = f"{report_id}_{file.filename}"
-    staged_path = staging_path / staged_name
+    staged_path = staging.staging_path(report_id) / staged_name
     with open(staged_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+    staging.record_file(report_id, "report", staged_name, os.path.getsize(staged_path))
+    if file.content_type:
+        staging.merge_metadata(report_id, {"content_type": file.content_type})
 
     # Attempt to finalize (will only commit if mask also exists)
-    result = finalize_report_if_ready(report_id)
+    result = await finalize_report_if_ready(report_id)
     if result:
         return {"success": True, "committed": True, "path": result["report_image_path"]}
 
@@ -45,30 +53,51 @@ async def upload_report_file(report_id: str, file: UploadFile = File(...)):
 
 
 @router.post("/files/upload/{report_id}/mask")
-async def upload_mask_file(report_id: str, file: UploadFile = File(...)):
-    """Upload mask image into staging for the given report_id."""
-    staging_path = Path(STAGING_DIR) / report_id
-    if not staging_path.exists():
+async def upload_mask_file(
+    report_id: str,
+    file: UploadFile = File(...),
+    metadata: Optional[str] = Form(None),
+):
+    """Upload mask image into staging for the given report_id.
+
+    `metadata` is an optional JSON object with the vision statistics for the
+    mask (see VISION_METADATA_FIELDS); it is stored on the report row.
+    """
+    if not staging.exists(report_id):
         raise HTTPException(
             status_code=404, detail="Staging report not found. Create report first."
         )
 
+    vision_metadata = {}
+    if metadata:
+        try:
+            parsed = json.loads(metadata)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="metadata must be valid JSON")
+        if not isinstance(parsed, dict):
+            raise HTTPException(status_code=400, detail="metadata must be an object")
+        vision_metadata = {
+            k: v for k, v in parsed.items() if k in VISION_METADATA_FIELDS
+        }
+
     # Save mask to staging with a consistent name
-    staged_mask = staging_path / f"{report_id}_mask.png"
+    staged_mask = staging.staging_path(report_id) / f"{report_id}_mask.png"
     with open(staged_mask, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+    staging.record_file(
+        report_id, "mask", staged_mask.name, os.path.getsize(staged_mask)
+    )
+    staging.merge_metadata(report_id, vision_metadata)
 
     # Attempt to finalize
-    result = finalize_report_if_ready(report_id)
+    result = await finalize_report_if_ready(report_id)
     if result:
         return {"success": True, "committed": True, "path": result["mask_image_path"]}
 
     return {"success": True, "committed": False, "path": str(staged_mask)}
 
 
-@router.get("/files/{report_id}/report/{filename}")
-async def get_report_file(report_id: str, filename: str):
-    """Retrieve report file for a report (final storage)"""
+def _report_file_path(report_id: str, filename: str) -> Optional[str]:
     # filename may already include the report_id prefix (stored as basename in DB).
     # Normalize to a basename to avoid path traversal, then try a couple of
     # candidate paths for compatibility:
@@ -81,65 +110,217 @@ async def get_report_file(report_id: str, filename: str):
 
     for path in candidates:
         if os.path.exists(path):
-            return FileResponse(path)
+            return path
+    return None
+
+
+def _mask_file_path(report_id: str) -> Optional[str]:
+    path = os.path.join(MASKS_DIR, f"{report_id}_mask.png")
+    return path if os.path.exists(path) else None
+
+
+async def _variant_path(report_id: str, kind: str, source: str, variant: str) -> str:
+    """Resolve ?variant= to a cached derivative path (400 for unknown variants)."""
+    try:
+        return await derivatives.get_or_create(report_id, kind, source, variant)
+    except KeyError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown variant. Use one of: {', '.join(derivatives.VARIANTS)}",
+        )
+
+
+def _file_headers(path: str, media_type: Optional[str] = None) -> dict:
+    size = os.path.getsize(path)
+    ctype = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    etag = f"{int(os.path.getmtime(path))}-{size}"
+    return {
+        "content-type": ctype,
+        "content-length": str(size),
+        "accept-ranges": "bytes",
+        "etag": etag,
+        "cache-control": "public, max-age=3600",
+    }
+
+
+@router.get("/files/{report_id}/report/{filename}")
+async def get_report_file(report_id: str, filename: str, variant: Optional[str] = None):
+    """Retrieve report file for a report (final storage).
+
+    `variant=thumb|web` returns a downscaled WebP derivative instead.
+    """
+    path = _report_file_path(report_id, filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Report file not found")
 
-    raise HTTPException(status_code=404, detail="Report file not found")
+    if variant:
+        path = await _variant_path(report_id, "report", path, variant)
+        return FileResponse(path, media_type=derivatives.MEDIA_TYPE)
+    return FileResponse(path)
 
 
 @router.head("/files/{report_id}/report/{filename}")
-async def head_report_file(report_id: str, filename: str):
+async def head_report_file(
+    report_id: str, filename: str, variant: Optional[str] = None
+):
     """Return headers for report file without body (HEAD)."""
-    safe_name = os.path.basename(filename)
-    candidates = [
-        os.path.join(REPORTS_DIR, safe_name),
-        os.path.join(REPORTS_DIR, f"{report_id}_{safe_name}"),
-    ]
+    path = _report_file_path(report_id, filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Report file not found")
+
+    media_type = None
+    if variant:
+        path = await _variant_path(report_id, "report", path, variant)
+        media_type = derivatives.MEDIA_TYPE
+    return Response(status_code=200, headers=_file_headers(path, media_type))
+
+
+# Mask responses depend on the Accept header (see _mask_encoding)
+MASK_VARY = {"vary": "Accept"}
+
+
+def _mask_encoding(
+    mask_encoding: Optional[str], accept: Optional[str], variant: Optional[str]
+) -> str:
+    """Resolve ?mask_encoding= / Accept to a mask encoding (400 if unknown)."""
+    try:
+        resolved = mask_codecs.negotiate(mask_encoding, accept)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if resolved != "png" and variant:
+        raise HTTPException(
+            status_code=400, detail="variant and mask_encoding cannot be combined"
+        )
+    return resolved
+
+
+def _encode_mask_file(path: str, encoding: str):
+    """Re-encode a stored PNG mask (blocking). Returns (body, extra headers)."""
+    with open(path, "rb") as f:
+        mask = mask_codecs.decode_png(f.read())
+    height, width = mask.shape
+    if encoding == "bitpacked":
+        headers = {"x-mask-height": str(height), "x-mask-width": str(width)}
+        return mask_codecs.pack_bits(mask), headers
+    body = mask_codecs.encode(mask, encoding)
+    return json.dumps(body, separators=(",", ":")).encode("utf-8"), {}
 
-    for path in candidates:
-        if os.path.exists(path):
-            size = os.path.getsize(path)
-            ctype, _ = mimetypes.guess_type(path)
-            ctype = ctype or "application/octet-stream"
-            etag = f"{int(os.path.getmtime(path))}-{size}"
-            headers = {
-                "content-type": ctype,
-                "content-length": str(size),
-                "accept-ranges": "bytes",
-                "etag": etag,
-                "cache-control": "public, max-age=3600",
-            }
-            return Response(status_code=200, headers=headers)
-
-    raise HTTPException(status_code=404, detail="Report file not found")
+
+async def _encoded_mask_response(path: str, encoding: str, head: bool) -> Response:
+    body, headers = await derivatives.run(_encode_mask_file, path, encoding)
+    source_etag = f"{int(os.path.getmtime(path))}-{os.path.getsize(path)}"
+    headers.update(
+        {
+            "content-length": str(len(body)),
+            "etag": f'"{source_etag}-{encoding}"',
+            "cache-control": "public, max-age=3600",
+            **MASK_VARY,
+        }
+    )
+    return Response(
+        content=b"" if head else body,
+        media_type=mask_codecs.MEDIA_TYPES[encoding],
+        headers=headers,
+    )
 
 
 @router.get("/files/{report_id}/mask")
-async def get_mask_file(report_id: str):
-    """Retrieve mask file for a report (final storage)"""
-    file_path = os.path.join(MASKS_DIR, f"{report_id}_mask.png")
+async def get_mask_file(
+    report_id: str,
+    variant: Optional[str] = None,
+    mask_encoding: Optional[str] = Query(
+        None, description="png | rle | bitpacked | polygons"
+    ),
+    accept: Optional[str] = Header(None),
+):
+    """Retrieve mask file for a report (final storage).
 
-    if not os.path.exists(file_path):
+    `variant=thumb|web` returns a downscaled lossless WebP derivative instead.
+    `mask_encoding=rle|polygons` returns JSON, `mask_encoding=bitpacked` the
+    raw packed bits (size in X-Mask-Height / X-Mask-Width); see
+    app/mask_codecs.py. The encoding can also be requested with an Accept
+    header of mask_codecs.MEDIA_TYPES, so every response has `Vary: Accept`.
+    """
+    encoding = _mask_encoding(mask_encoding, accept, variant)
+    file_path = _mask_file_path(report_id)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="Mask file not found")
 
-    return FileResponse(file_path)
+    if variant:
+        file_path = await _variant_path(report_id, "mask", file_path, variant)
+        return FileResponse(
+            file_path, media_type=derivatives.MEDIA_TYPE, headers=MASK_VARY
+        )
+    if encoding != "png":
+        return await _encoded_mask_response(file_path, encoding, head=False)
+    return FileResponse(file_path, headers=MASK_VARY)
 
 
 @router.head("/files/{report_id}/mask")
-async def head_mask_file(report_id: str):
+async def head_mask_file(
+    report_id: str,
+    variant: Optional[str] = None,
+    mask_encoding: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+):
     """Return headers for mask file without body (HEAD)."""
-    file_path = os.path.join(MASKS_DIR, f"{report_id}_mask.png")
-    if not os.path.exists(file_path):
+    encoding = _mask_encoding(mask_encoding, accept, variant)
+    file_path = _mask_file_path(report_id)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="Mask file not found")
 
-    size = os.path.getsize(file_path)
-    ctype, _ = mimetypes.guess_type(file_path)
-    ctype = ctype or "application/octet-stream"
-    etag = f"{int(os.path.getmtime(file_path))}-{size}"
-    headers = {
-        "content-type": ctype,
-        "content-length": str(size),
-        "accept-ranges": "bytes",
-        "etag": etag,
-        "cache-control": "public, max-age=3600",
-    }
+    if encoding != "png":
+        return await _encoded_mask_response(file_path, encoding, head=True)
+    media_type = None
+    if variant:
+        file_path = await _variant_path(report_id, "mask", file_path, variant)
+        media_type = derivatives.MEDIA_TYPE
+    headers = {**_file_headers(file_path, media_type), **MASK_VARY}
     return Response(status_code=200, headers=headers)
+
+
+@router.get("/files/{report_id}/overlay")
+async def get_overlay(
+    report_id: str,
+    mode: str = Query("contour", description="contour | fill"),
+    size: int = Query(512, ge=16, le=OVERLAY_MAX_SIZE),
+    quality: int = Query(80, ge=1, le=100),
+    format: str = Query("webp", description="webp | jpeg | png"),
+):
+    """Render the report image with its mask outlined or filled on top."""
+    if mode not in overlays.MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid mode. Use one of: {', '.join(overlays.MODES)}",
+        )
+    if format not in overlays.FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format. Use one of: {', '.join(overlays.FORMATS)}",
+        )
+
+    conn = db_connect()
+    row = conn.execute(
+        "SELECT report_image_path, mask_image_path FROM reports WHERE report_id = ?",
+        (report_id,),
+    ).fetchone()
+    conn.close()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    report_path, mask_path = row
+    if not (report_path and os.path.exists(report_path)):
+        raise HTTPException(status_code=404, detail="Report file not found")
+    if not (mask_path and os.path.exists(mask_path)):
+        raise HTTPException(status_code=404, detail="Mask file not found")
+
+    data = await overlays.get_or_render(
+        report_id, report_path, mask_path, mode, size, quality, format
+    )
+    return Response(
+        content=data,
+        media_type=overlays.FORMATS[format][1],
+        headers={
+            "etag": f'"{hashlib.sha1(data).hexdigest()}"',
+            "cache-control": "public, max-age=3600",
+        },
+    )
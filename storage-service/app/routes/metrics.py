@@ -0,0 +1,19 @@
+"""Operational metrics for the storage service"""
+
+from fastapi import APIRouter
+
+from .. import changes, overlays, staging
+from ..insert_batcher import report_inserts
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Return staging, insert batching, overlay cache and change feed counters."""
+    return {
+        "staging": staging.stats(),
+        "insert_batching": report_inserts.stats,
+        "overlay_cache": overlays.cache.stats,
+        "change_feed": changes.feed.stats,
+    }
@@ -1,20 +1,97 @@
 """Report endpoints and finalize logic"""
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile
+import asyncio
 import os
+import json
+import re
 import shutil
-import sqlite3
-from pathlib import Path
+import tarfile
 import uuid
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from ..config import (
+    REPORTS_DIR,
+    MASKS_DIR,
+    STAGING_DIR,
+    IMPORT_MAX_FILES,
+    DERIVATIVES_ON_FINALIZE,
+)
+from ..db import db_connect
+from .. import staging
+from .. import bulk_import
+from .. import changes
+from .. import derivatives
+from .. import export
+from ..insert_batcher import report_inserts, report_row
 
 router = APIRouter()
 
-# Final storage directories (same as files.py)
-REPORTS_DIR = "/app/data/uploads/reports"
-MASKS_DIR = "/app/data/uploads/masks"
-STAGING_DIR = "/app/data/uploads/staging"
-DB_PATH = "/app/data/database.db"
+# report_ids currently being finalized (the report and mask uploads can both
+# see a complete staging entry while the insert is waiting on the batcher)
+_finalizing = set()
+
+# Vision statistics accepted with a mask upload and stored on the report
+VISION_METADATA_FIELDS = (
+    "segmented_pixels",
+    "total_pixels",
+    "coverage_percent",
+    "threshold",
+    "model_version",
+    "image_width",
+    "image_height",
+)
+
+# Columns returned by the listing and lookup endpoints (in this order)
+REPORT_COLUMNS = (
+    "report_id",
+    "report_image_path",
+    "mask_image_path",
+    "created_at",
+    "updated_at",
+    *VISION_METADATA_FIELDS,
+    "report_image_bytes",
+    "mask_image_bytes",
+    "content_type",
+)
+
+# Columns the listing can be sorted by (all indexed except the byte sizes)
+SORTABLE_COLUMNS = ("created_at", "coverage_percent", "model_version", "id")
+
+BATCH_GET_MAX_IDS = 1000
+
+
+# Caller-chosen report_ids end up in file names, so keep them path-safe
+REPORT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class BatchGetRequest(BaseModel):
+    report_ids: List[str]
+
+
+class CreateReportRequest(BaseModel):
+    report_id: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+
+def report_exists(report_id: str) -> bool:
+    """True if report_id is taken, either as a final report or in staging."""
+    conn = db_connect()
+    row = conn.execute(
+        "SELECT 1 FROM reports WHERE report_id = ?", (report_id,)
+    ).fetchone()
+    conn.close()
+    return row is not None or staging.exists(report_id)
+
+
+def _row_to_item(row) -> dict:
+    return dict(zip(REPORT_COLUMNS, row))
 
 
 def ensure_dirs():
@@ -23,68 +100,84 @@ def ensure_dirs():
     os.makedirs(STAGING_DIR, exist_ok=True)
 
 
-def db_connect():
-    return sqlite3.connect(DB_PATH)
-
-
-def finalize_report_if_ready(report_id: str) -> Optional[dict]:
+async def finalize_report_if_ready(report_id: str) -> Optional[dict]:
     """If both report image and mask exist in staging for report_id,
     move them to final dirs and insert a row into reports table. Returns
     the inserted DB row dict on success, or None if not ready yet.
+
+    Which files are staged is looked up in the staging index rather than
+    by listing the staging directory. The insert goes through the group
+    commit batcher and this returns only after the row is committed.
     """
-    staging = Path(STAGING_DIR) / report_id
-    if not staging.exists():
+    if report_id in _finalizing:
+        return None
+    staged = staging.get_files(report_id)
+    if "report" not in staged or "mask" not in staged:
         return None
 
-    # Find staged files
-    report_file = None
-    mask_file = None
-    for p in staging.iterdir():
-        if p.name.endswith("_mask.png"):
-            mask_file = p
-        else:
-            report_file = p
+    _finalizing.add(report_id)
+    # Finalized in its own task: a client that disconnects mid-commit
+    # doesn't leave moved files behind without their row
+    task = asyncio.ensure_future(_finalize(report_id, staged))
+    task.add_done_callback(lambda t: _finalized(report_id, t))
+    return await asyncio.shield(task)
 
-    if not report_file or not mask_file:
-        return None
+
+def _finalized(report_id: str, task: asyncio.Future) -> None:
+    _finalizing.discard(report_id)
+    # Mark retrieved so waiter-less failures are not logged as unhandled
+    if not task.cancelled():
+        task.exception()
+
+
+async def _finalize(report_id: str, staged: dict) -> dict:
+    """Move staged files into final storage and insert the report row."""
+    staging_dir = staging.staging_path(report_id)
+    report_name = staged["report"]["filename"]
+    mask_name = staged["mask"]["filename"]
 
     ensure_dirs()
 
     # Move files to final locations
-    final_report_path = os.path.join(REPORTS_DIR, f"{report_id}_{report_file.name}")
+    final_report_path = os.path.join(REPORTS_DIR, f"{report_id}_{report_name}")
     final_mask_path = os.path.join(MASKS_DIR, f"{report_id}_mask.png")
 
-    shutil.move(str(report_file), final_report_path)
-    shutil.move(str(mask_file), final_mask_path)
+    metadata = staging.get_metadata(report_id)
 
-    # Remove staging dir
+    moved = []
     try:
-        shutil.rmtree(staging)
-    except Exception:
-        pass
+        for name, final_path in (
+            (report_name, final_report_path),
+            (mask_name, final_mask_path),
+        ):
+            shutil.move(str(staging_dir / name), final_path)
+            moved.append((name, final_path))
 
-    # Insert into DB
-    conn = db_connect()
-    cur = conn.cursor()
-    # Ensure reports table exists (safety)
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS reports (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            report_id TEXT NOT NULL UNIQUE,
-            report_image_path TEXT,
-            mask_image_path TEXT,
-            created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
-            updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+        # Insert into DB (table is created by migrations on startup)
+        await report_inserts.submit(
+            report_row(
+                report_id=report_id,
+                report_image_path=final_report_path,
+                mask_image_path=final_mask_path,
+                report_image_bytes=staged["report"]["size_bytes"],
+                mask_image_bytes=staged["mask"]["size_bytes"],
+                content_type=metadata.get("content_type"),
+                created_at=metadata.get("created_at"),
+                updated_at=metadata.get("updated_at"),
+                **{k: metadata.get(k) for k in VISION_METADATA_FIELDS},
+            )
         )
-        """
-    )
-    cur.execute(
-        "INSERT INTO reports (report_id, report_image_path, mask_image_path) VALUES (?, ?, ?)",
-        (report_id, final_report_path, final_mask_path),
-    )
-    conn.commit()
-    conn.close()
+    except Exception:
+        # No row: put the files back so the staged report can be retried
+        for name, final_path in moved:
+            shutil.move(final_path, str(staging_dir / name))
+        raise
+
+    # Only drop the staging dir and index rows once the row is committed
+    staging.remove_entry(report_id)
+
+    if DERIVATIVES_ON_FINALIZE:
+        derivatives.schedule(report_id, final_report_path, final_mask_path)
 
     return {
         "report_id": report_id,
@@ -94,52 +187,315 @@ def finalize_report_if_ready(report_id: str) -> Optional[dict]:
 
 
 @router.post("/reports")
-async def create_report():
+async def create_report(payload: Optional[CreateReportRequest] = None):
     """Create a new report in staging. No DB row or final files are created until both images are uploaded.
 
-    Returns a `report_id` which must be used for subsequent upload calls.
+    Returns a `report_id` which must be used for subsequent upload calls. A
+    caller that places reports itself (the sharded backend) may pass its own
+    `report_id` in the JSON body. The shard rebalancer also passes the
+    `created_at` and `updated_at` of the report it copies, which the report
+    keeps instead of the time it is finalized here.
     """
-    report_id = str(uuid.uuid4())
-    staging_path = os.path.join(STAGING_DIR, report_id)
-    os.makedirs(staging_path, exist_ok=True)
+    payload = payload or CreateReportRequest()
+    report_id = payload.report_id or None
+    if report_id is None:
+        report_id = str(uuid.uuid4())
+    else:
+        if not REPORT_ID_PATTERN.match(report_id):
+            raise HTTPException(status_code=400, detail="Invalid report_id")
+        if report_exists(report_id):
+            raise HTTPException(status_code=409, detail="report_id already exists")
+    timestamps = payload.model_dump(
+        include={"created_at", "updated_at"}, exclude_none=True
+    )
+    for key, value in timestamps.items():
+        try:
+            datetime.fromisoformat(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid {key}")
+    staging.create_entry(report_id)
+    if timestamps:
+        staging.merge_metadata(report_id, timestamps)
     return {"success": True, "report_id": report_id}
 
 
+@router.post("/reports/import")
+async def import_reports(request: Request):
+    """Bulk-ingest report images and optional masks.
+
+    Accepts either a tar stream (`application/x-tar`, optionally gzip'd) or a
+    multipart form with repeated `files` (images) and `masks` fields. Masks
+    are paired with images by name (see `app/bulk_import.py`). Images with a
+    mask are committed immediately; the rest are left in staging and are
+    reported as `committed: false` so a mask can be uploaded for them later.
+    Multipart requests may carry a `report_ids` JSON object mapping image
+    filenames to caller-chosen report_ids. Every item echoes the tar member
+    path or multipart filename of its image as `source`.
+    """
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=IMPORT_MAX_FILES)
+        named = []
+        for field in ("files", "masks"):
+            for upload in form.getlist(field):
+                if not isinstance(upload, UploadFile) or not upload.filename:
+                    continue
+                name = upload.filename
+                if field == "masks" and bulk_import.classify(name)[0] != "mask":
+                    name = f"masks/{name}"
+                named.append((name, lambda f=upload.file: f))
+        if not named:
+            raise HTTPException(status_code=400, detail="No files in request")
+        items = bulk_import.pair_files(named)
+
+        # Optional {"<image filename>": "<report_id>"} for caller-placed reports
+        if form.get("report_ids"):
+            try:
+                ids = json.loads(form["report_ids"])
+            except json.JSONDecodeError:
+                raise HTTPException(
+                    status_code=400, detail="report_ids must be valid JSON"
+                )
+            if not isinstance(ids, dict) or not all(
+                isinstance(v, str) and REPORT_ID_PATTERN.match(v) for v in ids.values()
+            ):
+                raise HTTPException(status_code=400, detail="Invalid report_ids")
+            for item in items:
+                item.report_id = ids.get(item.filename)
+        return await bulk_import.import_items(items, exists=report_exists)
+
+    if content_type in (
+        "application/x-tar",
+        "application/gzip",
+        "application/x-gzip",
+        "application/octet-stream",
+    ):
+        try:
+            return await bulk_import.import_tar_stream(request.stream())
+        except tarfile.TarError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid tar archive: {e}")
+
+    raise HTTPException(
+        status_code=415,
+        detail="Expected multipart/form-data or application/x-tar body",
+    )
+
+
+@router.get("/reports/export")
+async def export_reports(
+    format: str = "tar",
+    after: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    """Stream a tar or zip archive of report images, masks and a JSONL manifest.
+
+    Filters: `since`/`until` bound created_at, `limit` caps the number of
+    reports. Pass the report_id of the last complete report as `after` to
+    resume an interrupted export.
+    """
+    if format not in ("tar", "zip"):
+        raise HTTPException(status_code=400, detail="format must be 'tar' or 'zip'")
+    try:
+        after_id = export.resolve_cursor(after)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Cursor report not found")
+
+    rows = export.iter_rows(after_id, since=since, until=until, limit=limit)
+    if format == "zip":
+        body, media_type = export.stream_zip(rows), "application/zip"
+    else:
+        body, media_type = export.stream_tar(rows), "application/x-tar"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "content-disposition": f'attachment; filename="reports-export.{format}"'
+        },
+    )
+
+
+@router.get("/reports/changes")
+async def report_changes(request: Request, after: Optional[int] = None):
+    """Server-sent events for reports as they are finalized.
+
+    Each event is `event: report` with the report as JSON and `id:` set to
+    its sequence number. Resume with `after=<id>` or the standard
+    `Last-Event-ID` header; `after=0` replays every report. Without a cursor
+    the feed starts at the current head and only delivers new reports.
+    Connected clients also get an `event: delete` with the `report_id` of
+    every report deleted meanwhile (no id, not replayed on resume).
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if after is None and last_event_id:
+        try:
+            after = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    if after is None:
+        after = await asyncio.to_thread(changes.latest_sequence)
+
+    return StreamingResponse(
+        changes.stream(after, REPORT_COLUMNS),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"},
+    )
+
+
 @router.get("/reports")
-async def list_reports():
-    """Return all reports from the database (simple demo listing)."""
-    # Ensure DB exists
+async def list_reports(
+    min_coverage: Optional[float] = None,
+    max_coverage: Optional[float] = None,
+    model_version: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+    after_created_at: Optional[str] = None,
+    after_report_id: Optional[str] = None,
+):
+    """Return reports from the database, newest first by default.
+
+    Optional filters: coverage range (`min_coverage`/`max_coverage`, percent)
+    and `model_version`. `sort` is one of SORTABLE_COLUMNS and `order` is
+    asc or desc. For keyset paging with `sort=created_at`, pass the last
+    item's `created_at` and `report_id` as `after_created_at` and
+    `after_report_id`.
+    """
+    if sort not in SORTABLE_COLUMNS:
+        raise HTTPException(
+            status_code=400, detail=f"sort must be one of {', '.join(SORTABLE_COLUMNS)}"
+        )
+    if order.lower() not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+
+    where = []
+    params: list = []
+    if min_coverage is not None:
+        where.append("coverage_percent >= ?")
+        params.append(min_coverage)
+    if max_coverage is not None:
+        where.append("coverage_percent <= ?")
+        params.append(max_coverage)
+    if model_version is not None:
+        where.append("model_version = ?")
+        params.append(model_version)
+    if after_created_at is not None or after_report_id is not None:
+        if sort != "created_at" or after_created_at is None or after_report_id is None:
+            raise HTTPException(
+                status_code=400,
+                detail="after_created_at and after_report_id require sort=created_at",
+            )
+        op = "<" if order.lower() == "desc" else ">"
+        where.append(f"(created_at {op} ? OR (created_at = ? AND report_id {op} ?))")
+        params.extend([after_created_at, after_created_at, after_report_id])
+
+    sql = f"SELECT {', '.join(REPORT_COLUMNS)} FROM reports"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # report_id breaks ties so pages are stable, and ordered the same way on
+    # every shard so the backend can merge them
+    sql += f" ORDER BY {sort} {order.upper()}, report_id {order.upper()}"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+    elif offset:
+        # SQLite only takes OFFSET after a LIMIT; -1 means no limit
+        sql += " LIMIT -1 OFFSET ?"
+        params.append(offset)
+
     conn = db_connect()
     cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS reports (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            report_id TEXT NOT NULL UNIQUE,
-            report_image_path TEXT,
-            mask_image_path TEXT,
-            created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
-            updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
-        )
-        """
-    )
-    conn.commit()
-    cur.execute(
-        "SELECT report_id, report_image_path, mask_image_path, created_at, updated_at FROM reports ORDER BY created_at DESC"
-    )
+    cur.execute(sql, params)
     rows = cur.fetchall()
     conn.close()
 
-    items = []
-    for r in rows:
-        items.append(
-            {
-                "report_id": r[0],
-                "report_image_path": r[1],
-                "mask_image_path": r[2],
-                "created_at": r[3],
-                "updated_at": r[4],
-            }
-        )
+    items = [_row_to_item(r) for r in rows]
 
     return {"success": True, "items": items}
+
+
+@router.post("/reports:batchGet")
+async def batch_get_reports(payload: BatchGetRequest):
+    """Return the reports for up to BATCH_GET_MAX_IDS ids in a single query.
+
+    Items come back in request order; ids without a report are listed in
+    `missing`.
+    """
+    report_ids = list(dict.fromkeys(payload.report_ids))
+    if len(report_ids) > BATCH_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_GET_MAX_IDS} report_ids per request",
+        )
+    if not report_ids:
+        return {"success": True, "items": [], "missing": []}
+
+    # json_each keeps this a single statement with one bound parameter no
+    # matter how many ids are passed; the lookup uses the report_id index.
+    conn = db_connect()
+    rows = conn.execute(
+        f"""
+        SELECT {', '.join(REPORT_COLUMNS)} FROM reports
+        WHERE report_id IN (SELECT value FROM json_each(?))
+        """,
+        (json.dumps(report_ids),),
+    ).fetchall()
+    conn.close()
+
+    found = {r[0]: _row_to_item(r) for r in rows}
+    return {
+        "success": True,
+        "items": [found[rid] for rid in report_ids if rid in found],
+        "missing": [rid for rid in report_ids if rid not in found],
+    }
+
+
+@router.get("/reports/{report_id}")
+async def get_report(report_id: str):
+    """Return a single report by report_id."""
+    conn = db_connect()
+    row = conn.execute(
+        f"SELECT {', '.join(REPORT_COLUMNS)} FROM reports WHERE report_id = ?",
+        (report_id,),
+    ).fetchone()
+    conn.close()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return {"success": True, "item": _row_to_item(row)}
+
+
+@router.delete("/reports/{report_id}")
+async def delete_report(report_id: str):
+    """Delete a report with its files and derivatives (or a staged upload).
+
+    Used by the backend shard rebalancer after a report has been copied to
+    its new shard.
+    """
+    conn = db_connect()
+    row = conn.execute(
+        "SELECT report_image_path, mask_image_path FROM reports WHERE report_id = ?",
+        (report_id,),
+    ).fetchone()
+    if row is None and not staging.exists(report_id):
+        conn.close()
+        raise HTTPException(status_code=404, detail="Report not found")
+    conn.execute("DELETE FROM reports WHERE report_id = ?", (report_id,))
+    conn.commit()
+    conn.close()
+
+    for path in row or ():
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    shutil.rmtree(derivatives.report_dir(report_id), ignore_errors=True)
+    staging.remove_entry(report_id)
+    if row is not None:
+        changes.feed.notify_deleted(report_id)
+    return {"success": True, "report_id": report_id}
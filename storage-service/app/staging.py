@@ -0,0 +1,253 @@
+"""Staging index and background sweeper.
+
+Every upload attempt gets a staging directory under STAGING_DIR. The
+`staging_reports` / `staging_files` tables mirror what is in those
+directories (creation time, which files are present and their sizes) so
+finalize logic can look the state up instead of listing directories.
+
+Uploads that never complete (e.g. vision failed so the mask never arrives)
+are expired by the sweeper once they are older than STAGING_TTL_SECONDS.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict
+
+from .config import (
+    STAGING_DIR,
+    STAGING_TTL_SECONDS,
+    STAGING_SWEEP_INTERVAL_SECONDS,
+    STAGING_SWEEP_BATCH,
+)
+from .db import db_connect
+
+# Counters exposed through /api/metrics (process lifetime)
+_sweep_stats = {
+    "sweeps_total": 0,
+    "expired_reports_total": 0,
+    "reclaimed_bytes_total": 0,
+    "last_sweep_at": None,
+    "last_sweep_duration_ms": None,
+}
+
+
+def staging_path(report_id: str) -> Path:
+    return Path(STAGING_DIR) / report_id
+
+
+def create_entry(report_id: str) -> Path:
+    """Create the staging directory and its index row."""
+    path = staging_path(report_id)
+    os.makedirs(path, exist_ok=True)
+    conn = db_connect()
+    conn.execute(
+        "INSERT OR IGNORE INTO staging_reports (report_id) VALUES (?)", (report_id,)
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def exists(report_id: str) -> bool:
+    conn = db_connect()
+    cur = conn.execute(
+        "SELECT 1 FROM staging_reports WHERE report_id = ?", (report_id,)
+    )
+    found = cur.fetchone() is not None
+    conn.close()
+    return found
+
+
+def record_file(report_id: str, kind: str, filename: str, size_bytes: int) -> None:
+    """Record that a file of `kind` ('report' or 'mask') was staged."""
+    conn = db_connect()
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO staging_files (report_id, kind, filename, size_bytes)
+        VALUES (?, ?, ?, ?)
+        """,
+        (report_id, kind, filename, size_bytes),
+    )
+    conn.execute(
+        "UPDATE staging_reports SET updated_at = CURRENT_TIMESTAMP WHERE report_id = ?",
+        (report_id,),
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_files(report_id: str) -> Dict[str, dict]:
+    """Return staged files for report_id keyed by kind."""
+    conn = db_connect()
+    cur = conn.execute(
+        "SELECT kind, filename, size_bytes FROM staging_files WHERE report_id = ?",
+        (report_id,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return {r[0]: {"filename": r[1], "size_bytes": r[2]} for r in rows}
+
+
+def merge_metadata(report_id: str, values: dict) -> None:
+    """Merge values into the JSON metadata kept for a staged report."""
+    if not values:
+        return
+    conn = db_connect()
+    row = conn.execute(
+        "SELECT metadata FROM staging_reports WHERE report_id = ?", (report_id,)
+    ).fetchone()
+    if row is not None:
+        merged = json.loads(row[0]) if row[0] else {}
+        merged.update(values)
+        conn.execute(
+            "UPDATE staging_reports SET metadata = ? WHERE report_id = ?",
+            (json.dumps(merged), report_id),
+        )
+        conn.commit()
+    conn.close()
+
+
+def get_metadata(report_id: str) -> dict:
+    conn = db_connect()
+    row = conn.execute(
+        "SELECT metadata FROM staging_reports WHERE report_id = ?", (report_id,)
+    ).fetchone()
+    conn.close()
+    return json.loads(row[0]) if row and row[0] else {}
+
+
+def remove_entry(report_id: str) -> None:
+    """Drop the index rows and the staging directory for report_id."""
+    conn = db_connect()
+    conn.execute("DELETE FROM staging_files WHERE report_id = ?", (report_id,))
+    conn.execute("DELETE FROM staging_reports WHERE report_id = ?", (report_id,))
+    conn.commit()
+    conn.close()
+
+    try:
+        shutil.rmtree(staging_path(report_id))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️  Failed to remove staging dir for {report_id}: {e}")
+
+
+def reconcile_orphans() -> int:
+    """Register staging directories that have no index row.
+
+    Directories created before the index existed would otherwise never be
+    swept. They are registered with their mtime as created_at so the normal
+    TTL applies. Returns the number of directories adopted.
+    """
+    root = Path(STAGING_DIR)
+    if not root.exists():
+        return 0
+
+    conn = db_connect()
+    known = {r[0] for r in conn.execute("SELECT report_id FROM staging_reports")}
+    adopted = 0
+    for d in root.iterdir():
+        # Dot-directories are scratch space (e.g. bulk import work dirs)
+        if not d.is_dir() or d.name.startswith(".") or d.name in known:
+            continue
+        created = datetime.fromtimestamp(d.stat().st_mtime, tz=timezone.utc)
+        conn.execute(
+            "INSERT OR IGNORE INTO staging_reports (report_id, created_at) VALUES (?, ?)",
+            (d.name, created.strftime("%Y-%m-%d %H:%M:%S")),
+        )
+        for f in d.iterdir():
+            kind = "mask" if f.name.endswith("_mask.png") else "report"
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO staging_files (report_id, kind, filename, size_bytes)
+                VALUES (?, ?, ?, ?)
+                """,
+                (d.name, kind, f.name, f.stat().st_size),
+            )
+        adopted += 1
+    conn.commit()
+    conn.close()
+    return adopted
+
+
+def sweep_expired(
+    ttl_seconds: int = STAGING_TTL_SECONDS, limit: int = STAGING_SWEEP_BATCH
+) -> dict:
+    """Remove at most `limit` staging entries older than ttl_seconds.
+
+    Returns a summary with the number of entries expired and bytes reclaimed.
+    """
+    started = time.monotonic()
+    conn = db_connect()
+    cur = conn.execute(
+        """
+        SELECT s.report_id, COALESCE(SUM(f.size_bytes), 0)
+        FROM staging_reports s
+        LEFT JOIN staging_files f ON f.report_id = s.report_id
+        WHERE s.created_at < datetime('now', ?)
+        GROUP BY s.report_id
+        ORDER BY s.created_at
+        LIMIT ?
+        """,
+        (f"-{int(ttl_seconds)} seconds", limit),
+    )
+    expired = cur.fetchall()
+    conn.close()
+
+    reclaimed = 0
+    for report_id, size_bytes in expired:
+        remove_entry(report_id)
+        reclaimed += size_bytes
+
+    _sweep_stats["sweeps_total"] += 1
+    _sweep_stats["expired_reports_total"] += len(expired)
+    _sweep_stats["reclaimed_bytes_total"] += reclaimed
+    _sweep_stats["last_sweep_at"] = datetime.now(timezone.utc).isoformat()
+    _sweep_stats["last_sweep_duration_ms"] = round(
+        (time.monotonic() - started) * 1000, 2
+    )
+
+    if expired:
+        print(
+            f"🧹 Swept {len(expired)} abandoned staging reports ({reclaimed} bytes)"
+        )
+    return {"expired": len(expired), "reclaimed_bytes": reclaimed}
+
+
+async def run_sweeper(interval_seconds: float = STAGING_SWEEP_INTERVAL_SECONDS):
+    """Background loop: sweep expired staging entries every interval.
+
+    Each pass is capped at STAGING_SWEEP_BATCH entries so a large backlog is
+    drained gradually instead of stalling the disk in one go.
+    """
+    while True:
+        try:
+            await asyncio.to_thread(sweep_expired)
+        except Exception as e:
+            print(f"❌ Staging sweep failed: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def stats() -> dict:
+    """Current staging backlog plus sweeper counters."""
+    conn = db_connect()
+    count, oldest = conn.execute(
+        "SELECT COUNT(*), MIN(created_at) FROM staging_reports"
+    ).fetchone()
+    (backlog_bytes,) = conn.execute(
+        "SELECT COALESCE(SUM(size_bytes), 0) FROM staging_files"
+    ).fetchone()
+    conn.close()
+
+    return {
+        "backlog_reports": count,
+        "backlog_bytes": backlog_bytes,
+        "oldest_created_at": oldest,
+        "ttl_seconds": STAGING_TTL_SECONDS,
+        **_sweep_stats,
+    }
@@ -0,0 +1,114 @@
+"""Benchmark report inserts: one commit per row vs. group commit.
+
+Runs against a throwaway SQLite database and prints rows/second for each
+concurrency level, e.g.:
+
+    cd storage-service
+    python benchmarks/bench_insert_batching.py --rows 2000 --concurrency 1 8 32 128
+
+Only the standard library is needed, so it can run outside the container.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.insert_batcher import INSERT_REPORT_SQL, InsertBatcher, report_row  # noqa: E402
+from app.migrate import run_migrations  # noqa: E402
+
+
+def make_db(directory: str) -> str:
+    path = os.path.join(directory, f"bench_{uuid.uuid4().hex}.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_migrations(path)
+    return path
+
+
+def row():
+    rid = str(uuid.uuid4())
+    return report_row(
+        report_id=rid,
+        report_image_path=f"/reports/{rid}_img.png",
+        mask_image_path=f"/masks/{rid}_mask.png",
+        coverage_percent=12.5,
+        model_version="bench",
+    )
+
+
+async def run_direct(db_path: str, rows: int, concurrency: int) -> float:
+    """Previous behaviour: each insert opens a connection and commits."""
+
+    def insert_one():
+        conn = sqlite3.connect(db_path, timeout=30.0)
+        conn.execute(INSERT_REPORT_SQL, row())
+        conn.commit()
+        conn.close()
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def worker():
+        async with sem:
+            await asyncio.to_thread(insert_one)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(rows)))
+    return time.perf_counter() - started
+
+
+async def run_batched(
+    db_path: str, rows: int, concurrency: int, max_rows: int, max_wait_ms: float
+) -> float:
+    batcher = InsertBatcher(db_path=db_path, max_rows=max_rows, max_wait_ms=max_wait_ms)
+    batcher.start()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def worker():
+        async with sem:
+            await batcher.submit(row())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(rows)))
+    elapsed = time.perf_counter() - started
+    await batcher.stop()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 4, 16, 64, 256]
+    )
+    parser.add_argument("--max-rows", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument(
+        "--dir",
+        default=None,
+        help="Directory for the temporary databases (use the real data volume "
+        "to measure its fsync cost)",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        print(f"{'concurrency':>11} {'direct rows/s':>14} {'batched rows/s':>15} {'speedup':>8}")
+        for c in args.concurrency:
+            direct = await run_direct(make_db(tmp), args.rows, c)
+            batched = await run_batched(
+                make_db(tmp), args.rows, c, args.max_rows, args.max_wait_ms
+            )
+            d_rate = args.rows / direct
+            b_rate = args.rows / batched
+            print(f"{c:>11} {d_rate:>14.0f} {b_rate:>15.0f} {b_rate / d_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,23 @@
+-- Migration: 0002_create_staging_tables.sql
+-- Tracks staging reports (uploads that have not been finalized yet) so the
+-- service does not need to scan the staging directory, and so abandoned
+-- uploads can be expired by age.
+
+CREATE TABLE IF NOT EXISTS staging_reports (
+    report_id TEXT PRIMARY KEY,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+);
+
+CREATE INDEX IF NOT EXISTS idx_staging_reports_created_at
+    ON staging_reports (created_at);
+
+-- One row per staged file. `kind` is either 'report' or 'mask'.
+CREATE TABLE IF NOT EXISTS staging_files (
+    report_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    uploaded_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    PRIMARY KEY (report_id, kind)
+);
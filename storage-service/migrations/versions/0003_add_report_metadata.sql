@@ -0,0 +1,22 @@
+-- Migration: 0003_add_report_metadata.sql
+-- Persists vision statistics and file metadata on each report so they can be
+-- filtered and sorted without downloading masks or re-running inference.
+
+ALTER TABLE reports ADD COLUMN segmented_pixels INTEGER;
+ALTER TABLE reports ADD COLUMN total_pixels INTEGER;
+ALTER TABLE reports ADD COLUMN coverage_percent REAL;
+ALTER TABLE reports ADD COLUMN threshold REAL;
+ALTER TABLE reports ADD COLUMN model_version TEXT;
+ALTER TABLE reports ADD COLUMN image_width INTEGER;
+ALTER TABLE reports ADD COLUMN image_height INTEGER;
+ALTER TABLE reports ADD COLUMN report_image_bytes INTEGER;
+ALTER TABLE reports ADD COLUMN mask_image_bytes INTEGER;
+ALTER TABLE reports ADD COLUMN content_type TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_coverage_percent ON reports (coverage_percent);
+CREATE INDEX IF NOT EXISTS idx_reports_model_version ON reports (model_version, created_at);
+
+-- Metadata collected while a report is staged (JSON object), copied onto the
+-- reports row at finalize time.
+ALTER TABLE staging_reports ADD COLUMN metadata TEXT;
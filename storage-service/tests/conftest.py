@@ -0,0 +1,49 @@
+import io
+import os
+import tempfile
+
+# The configuration is read on import: point it at a throwaway data directory
+# before any test imports the app
+os.environ.setdefault("STORAGE_DATA_DIR", tempfile.mkdtemp(prefix="storage-tests-"))
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+def _png(value=0, size=8):
+    buf = io.BytesIO()
+    Image.fromarray(np.full((size, size), value, np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def upload_report(client):
+    """Create a report, upload its image and mask, and return the stored row"""
+
+    def upload(report_id, **create):
+        resp = client.post("/api/reports", json={"report_id": report_id, **create})
+        assert resp.status_code == 200, resp.text
+        files = {"file": ("scan.png", _png(), "image/png")}
+        client.post(f"/api/files/upload/{report_id}/report", files=files)
+        files = {"file": ("mask.png", _png(255), "image/png")}
+        resp = client.post(f"/api/files/upload/{report_id}/mask", files=files)
+        assert resp.json()["committed"]
+        return client.get(f"/api/reports/{report_id}").json()["item"]
+
+    return upload
+
+
+@pytest.fixture
+def png():
+    """Encode a small uniform grayscale PNG"""
+    return _png
@@ -0,0 +1,65 @@
+import io
+import tarfile
+
+from app.bulk_import import classify, pair_files
+
+
+def test_archive_metadata_is_ignored_and_other_files_fail():
+    assert classify("__MACOSX/scans/._a.png")[0] is None
+    assert classify("scans/.DS_Store")[0] is None
+    assert classify("README.md") == ("other", "README")
+    assert classify("scans/a.JPG") == ("report", "a")
+    assert classify("masks/a.png") == ("mask", "a")
+    assert classify("a_mask.png") == ("mask", "a")
+
+
+def test_duplicate_stems_fail_instead_of_replacing_each_other():
+    items = pair_files(
+        [
+            ("site2/a.png", "second"),
+            ("site1/a.png", "first"),
+            ("masks/a.png", "mask"),
+            ("a_mask.png", "other mask"),
+            ("notes.txt", "text"),
+        ]
+    )
+    imported = [item for item in items if not item.error]
+    assert [(i.filename, i.image, i.mask) for i in imported] == [
+        ("a.png", "first", "other mask")
+    ]
+    errors = [item.error for item in items if item.error]
+    assert errors == [
+        "masks/a.png: duplicate mask for 'a' (also a_mask.png)",
+        "notes.txt is not an image",
+        "site2/a.png: duplicate report for 'a' (also site1/a.png)",
+    ]
+
+
+def test_tar_import_reports_skipped_and_duplicate_members(client, png):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name, data in (
+            ("scans/tar-a.png", png(10)),
+            ("masks/tar-a.png", png(255)),
+            ("scans/tar-b.png", png(20)),
+            ("other/tar-b.png", png(30)),
+            ("README.txt", b"exported 2019"),
+            (".DS_Store", b"\0\0"),
+            ("__MACOSX/scans/._tar-a.png", b"\0"),
+        ):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    resp = client.post(
+        "/api/reports/import",
+        content=buf.getvalue(),
+        headers={"content-type": "application/x-tar"},
+    )
+    body = resp.json()
+    assert resp.status_code == 200, body
+    assert (body["committed"], body["pending"], body["failed"]) == (1, 1, 2)
+    failed = {item["filename"] for item in body["items"] if "error" in item}
+    assert failed == {"README.txt", "tar-b.png"}
+    pending = [item for item in body["items"] if item.get("committed") is False]
+    assert [item["source"] for item in pending] == ["other/tar-b.png"]
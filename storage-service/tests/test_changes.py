@@ -0,0 +1,29 @@
+import asyncio
+import json
+
+from app import changes
+
+
+def test_deleting_a_report_announces_it(client, upload_report):
+    upload_report("moved-away")
+    deletions = changes.feed.deletions
+    assert client.delete("/api/reports/moved-away").status_code == 200
+    assert changes.feed.deleted_since(deletions) == ["moved-away"]
+
+
+def test_subscribers_receive_delete_events(client):
+    async def follow():
+        stream = changes.stream(changes.latest_sequence(), ("report_id",), 5)
+        await stream.__anext__()  # starting position
+        frame = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        changes.feed.notify_deleted("gone")
+        try:
+            return await asyncio.wait_for(frame, 2)
+        finally:
+            await stream.aclose()
+
+    frame = asyncio.run(follow())
+    assert frame.startswith("event: delete\n")
+    assert json.loads(frame.split("data: ", 1)[1]) == {"report_id": "gone"}
+    assert "id:" not in frame
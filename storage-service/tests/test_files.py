@@ -0,0 +1,25 @@
+import json
+
+from app import mask_codecs
+
+
+def test_mask_encodings_and_vary_header(client, upload_report):
+    upload_report("encoded-mask")
+    url = "/api/files/encoded-mask/mask"
+
+    png = client.get(url)
+    assert png.status_code == 200
+    assert png.headers["content-type"] == "image/png"
+    assert png.headers["vary"] == "Accept"
+
+    rle = client.get(url, params={"mask_encoding": "rle"})
+    assert rle.headers["vary"] == "Accept"
+    mask = mask_codecs.decode(json.loads(rle.content))
+    assert mask.shape == (8, 8) and mask.all()
+
+    accept = {"accept": mask_codecs.MEDIA_TYPES["bitpacked"]}
+    packed = client.get(url, headers=accept)
+    assert packed.headers["x-mask-height"] == "8"
+    assert client.head(url).headers["vary"] == "Accept"
+
+    assert client.get(url, params={"mask_encoding": "jpeg"}).status_code == 400
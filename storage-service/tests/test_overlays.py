@@ -0,0 +1,26 @@
+import asyncio
+
+import numpy as np
+from PIL import Image
+
+from app import overlays
+
+
+def test_cancelling_the_first_viewer_keeps_the_shared_render(tmp_path):
+    report = tmp_path / "scan.png"
+    mask = tmp_path / "mask.png"
+    Image.fromarray(np.full((64, 64), 90, np.uint8)).save(report)
+    Image.fromarray(np.eye(64, dtype=np.uint8) * 255).save(mask)
+    args = ("r1", str(report), str(mask), "contour", 64, 80, "png")
+
+    async def main():
+        first = asyncio.ensure_future(overlays.get_or_render(*args))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(overlays.get_or_render(*args))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    data = asyncio.run(main())
+    assert data.startswith(b"\x89PNG")
+    assert not overlays._inflight
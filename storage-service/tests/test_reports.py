@@ -0,0 +1,67 @@
+import os
+import sqlite3
+
+import pytest
+
+
+def test_copied_report_keeps_its_timestamps(upload_report):
+    item = upload_report(
+        "copied",
+        created_at="2021-03-04 05:06:07",
+        updated_at="2021-03-05 00:00:00",
+    )
+    assert item["created_at"] == "2021-03-04 05:06:07"
+    assert item["updated_at"] == "2021-03-05 00:00:00"
+
+
+def test_new_report_is_stamped_when_finalized(upload_report):
+    item = upload_report("fresh")
+    assert item["created_at"] and item["created_at"] > "2021"
+    assert item["updated_at"] == item["created_at"]
+
+
+def test_invalid_timestamp_is_rejected(client):
+    resp = client.post(
+        "/api/reports", json={"report_id": "bad-time", "created_at": "yesterday"}
+    )
+    assert resp.status_code == 400
+
+
+def test_failed_insert_leaves_the_report_staged(client, png, monkeypatch):
+    from app import staging
+    from app.routes import reports
+
+    async def fail(params):
+        raise sqlite3.OperationalError("database is locked")
+
+    client.post("/api/reports", json={"report_id": "retry"})
+    files = {"file": ("scan.png", png(), "image/png")}
+    client.post("/api/files/upload/retry/report", files=files)
+    monkeypatch.setattr(reports.report_inserts, "submit", fail)
+    files = {"file": ("mask.png", png(255), "image/png")}
+    with pytest.raises(sqlite3.OperationalError):
+        client.post("/api/files/upload/retry/mask", files=files)
+    assert staging.exists("retry")
+    assert sorted(os.listdir(staging.staging_path("retry"))) == [
+        "retry_mask.png",
+        "retry_scan.png",
+    ]
+    assert not any("retry" in name for name in os.listdir(reports.REPORTS_DIR))
+
+    monkeypatch.undo()
+    resp = client.post("/api/files/upload/retry/mask", files=files)
+    assert resp.json()["committed"]
+    assert not staging.exists("retry")
+    assert os.path.exists(resp.json()["path"])
+
+
+def test_offset_applies_without_a_limit(client, upload_report):
+    for i in range(3):
+        upload_report(f"page-{i}", created_at=f"2019-01-0{i + 1} 00:00:00")
+    params = {"sort": "created_at", "order": "asc", "offset": 1}
+    resp = client.get("/api/reports", params={**params, "limit": 10000})
+    expected = [item["report_id"] for item in resp.json()["items"]]
+    resp = client.get("/api/reports", params=params)
+    ids = [item["report_id"] for item in resp.json()["items"]]
+    assert ids == expected
+    assert ids[:2] == ["page-1", "page-2"]
@@ -0,0 +1,188 @@
+"""Sweep inference thread settings and batch sizes, and keep the fastest.
+
+Usage (inside the vision-service container, with the service's limits):
+
+    python -m app.autotune
+    python -m app.autotune --runtime tflite_int8 --batch-sizes 1,4,8,16
+
+TensorFlow's thread pools can only be set once per process, so every
+(intra-op, inter-op) candidate runs in a fresh subprocess that loads the
+model with those settings and times each batch size. The candidate with the
+highest throughput across the batch sizes (geometric mean) is written to
+INFERENCE_AUTOTUNE_FILE together with the whole sweep and the batch size at
+which it was fastest. The service uses both on the next start if the
+runtime, CPU budget and INFERENCE_PROCESSES still match: the thread counts,
+and the batch size as the cap on micro-batches (at most
+PREDICT_MAX_BATCH_SIZE). Environment overrides (TF_INTRA_OP_THREADS, ...,
+PREDICT_MAX_BATCH_SIZE) still win.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .config import (
+    INFERENCE_AUTOTUNE_FILE,
+    INFERENCE_PROCESSES,
+    INFERENCE_RUNTIME,
+    MODEL_PATH,
+    PREDICT_WARMUP_BATCH_SIZES,
+)
+from .threads import cpu_budget
+
+
+def _probe(runtime, model_path, processes, batch_sizes, iterations):
+    """Time each batch size with the thread settings from the environment."""
+    from .runtimes import load_engine
+
+    engine, path = load_engine(runtime, model_path, processes)
+    engine.warmup(batch_sizes)
+    rng = np.random.default_rng(0)
+    results = []
+    for size in batch_sizes:
+        batch = rng.random((size, 128, 128, 1), dtype=np.float32)
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            engine.predict(batch)
+            samples.append(time.perf_counter() - start)
+        p50 = float(np.percentile(samples, 50))
+        results.append(
+            {
+                "batch_size": size,
+                "p50_ms": round(p50 * 1000, 3),
+                "images_per_s": round(size / p50, 2),
+            }
+        )
+    print(json.dumps({"model_path": path, "results": results}))
+
+
+def _candidates(per_process, runtime):
+    intra = sorted({1, 2, 4, 8, 16, per_process} & set(range(1, per_process + 1)))
+    # TFLite has a single thread pool; inter-op only matters for TensorFlow
+    inter = [1] if runtime.startswith("tflite") else sorted({1, min(2, per_process)})
+    return [(a, b) for a in intra for b in inter]
+
+
+def _run_candidate(args, intra, inter, batch_sizes):
+    env = dict(
+        os.environ,
+        TF_INTRA_OP_THREADS=str(intra),
+        TF_INTER_OP_THREADS=str(inter),
+        TFLITE_NUM_THREADS=str(intra),
+        TF_CPP_MIN_LOG_LEVEL="2",
+    )
+    command = [
+        sys.executable,
+        "-m",
+        "app.autotune",
+        "--probe",
+        "--runtime",
+        args.runtime,
+        "--model-path",
+        args.model_path,
+        "--processes",
+        str(args.processes),
+        "--batch-sizes",
+        ",".join(str(n) for n in batch_sizes),
+        "--iterations",
+        str(args.iterations),
+    ]
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(command, env=env, cwd=cwd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"exit code {proc.returncode}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runtime", default=INFERENCE_RUNTIME)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=INFERENCE_PROCESSES,
+        help="Model processes the CPUs are shared with (INFERENCE_PROCESSES)",
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        default=",".join(str(n) for n in PREDICT_WARMUP_BATCH_SIZES),
+    )
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", default=INFERENCE_AUTOTUNE_FILE)
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    batch_sizes = [int(n) for n in args.batch_sizes.split(",") if n.strip()]
+
+    if args.probe:
+        _probe(
+            args.runtime, args.model_path, args.processes, batch_sizes, args.iterations
+        )
+        return
+
+    cpus = cpu_budget()
+    per_process = max(1, cpus // max(1, args.processes))
+    print(
+        f"🔧 Tuning {args.runtime} on {cpus} CPUs "
+        f"({per_process} per model process), batch sizes {batch_sizes}"
+    )
+    header = "".join(f"{f'bs={n}':>10}" for n in batch_sizes)
+    print(f"{'intra':>6}{'inter':>6}{header}{'score':>10}   (images/s)")
+
+    sweep = []
+    for intra, inter in _candidates(per_process, args.runtime):
+        try:
+            probe = _run_candidate(args, intra, inter, batch_sizes)
+        except Exception as e:
+            print(f"{intra:>6}{inter:>6}  ❌ {e}")
+            continue
+        model_file = probe["model_path"]
+        rates = [r["images_per_s"] for r in probe["results"]]
+        score = float(np.exp(np.mean(np.log(rates))))
+        sweep.append(
+            {
+                "intra_op": intra,
+                "inter_op": inter,
+                "score": round(score, 2),
+                "results": probe["results"],
+            }
+        )
+        row = "".join(f"{rate:>10.1f}" for rate in rates)
+        print(f"{intra:>6}{inter:>6}{row}{score:>10.1f}")
+
+    if not sweep:
+        print("❌ No configuration completed")
+        sys.exit(1)
+
+    best = max(sweep, key=lambda entry: entry["score"])
+    best_batch = max(best["results"], key=lambda r: r["images_per_s"])
+    tuned = {
+        "runtime": args.runtime,
+        "cpus": cpus,
+        "processes": args.processes,
+        "intra_op": best["intra_op"],
+        "inter_op": best["inter_op"],
+        "best_batch_size": best_batch["batch_size"],
+        "model_path": model_file,
+        "tuned_at": datetime.now(timezone.utc).isoformat(),
+        "sweep": sweep,
+    }
+    with open(args.output, "w") as f:
+        json.dump(tuned, f, indent=2)
+    print(
+        f"✅ Best: intra-op {best['intra_op']}, inter-op {best['inter_op']} "
+        f"(highest throughput at batch size {best_batch['batch_size']}); "
+        f"saved to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
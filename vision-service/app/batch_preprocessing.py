@@ -0,0 +1,122 @@
+"""Batched preprocessing for the U-Net with reduced-resolution decoding.
+
+Everything the model sees is 128x128, so decoding a multi-megapixel
+upload at full size is wasted work. For JPEG the decoder can scale by
+1/2, 1/4 or 1/8 during the IDCT (`cv2.IMREAD_REDUCED_GRAYSCALE_*`);
+`decode_reduced` picks the largest factor that keeps both sides at or above
+128 and reports the original size from the header. Other formats are
+decoded normally. This is opt-in (PREPROCESS_REDUCED_DECODE=1): the result
+is close to, but not the same as, the full-resolution input train.py uses.
+
+`normalize_batch` resizes each image and then min-max scales the whole
+stack with single array operations, writing into a caller-provided
+(preallocated) float32 buffer. tests/test_preprocessing.py checks parity
+with `preprocessImg` / `preprocessMask`.
+"""
+
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .config import PREPROCESS_REDUCED_DECODE
+from .preprocessing import decode_image
+
+TARGET_SIZE = 128
+
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+def image_size(image_bytes):
+    """(width, height) from the image header, or None if unreadable"""
+    try:
+        with Image.open(BytesIO(image_bytes)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def decode_reduced(
+    image_bytes, target=TARGET_SIZE, reduced=PREPROCESS_REDUCED_DECODE
+):
+    """
+    Decode image bytes to a 2D grayscale array, as small as the codec allows
+
+    Args:
+        image_bytes: Raw image bytes from upload
+        target: Smallest side length the decoded image must keep
+        reduced: Allow reduced-resolution decoding (PREPROCESS_REDUCED_DECODE)
+
+    Returns:
+        (2D uint8 array, (original width, original height))
+    """
+    if reduced and image_bytes[:2] == b"\xff\xd8":  # JPEG
+        size = image_size(image_bytes)
+        if size is not None:
+            for factor, flag in REDUCED_FLAGS:
+                if min(size) // factor >= target:
+                    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+                    if img is None:
+                        break
+                    # The decoder applies EXIF rotation; the header size doesn't
+                    if (img.shape[1] >= img.shape[0]) != (size[0] >= size[1]):
+                        size = (size[1], size[0])
+                    return img, size
+    img = decode_image(image_bytes)
+    return img, (img.shape[1], img.shape[0])
+
+
+def normalize_batch(images, out=None):
+    """
+    Resize images to 128x128 and min-max scale each one to [0, 1]
+
+    Args:
+        images: list of 2D uint8 arrays
+        out: optional preallocated float32 array of shape (>= N, 128, 128, 1)
+
+    Returns:
+        float32 array of shape (N, 128, 128, 1) (a view of `out` if given)
+    """
+    n = len(images)
+    if out is None:
+        out = np.empty((n, TARGET_SIZE, TARGET_SIZE, 1), dtype=np.float32)
+    batch = out[:n, :, :, 0]
+    for i, img in enumerate(images):
+        batch[i] = cv2.resize(img, (TARGET_SIZE, TARGET_SIZE))
+    if n == 0:
+        return out[:0]
+
+    low = batch.min(axis=(1, 2), keepdims=True)
+    span = batch.max(axis=(1, 2), keepdims=True) - low
+    flat = span == 0
+    # Flat images become all zeros, as in preprocessImg
+    span[flat] = 1
+    np.subtract(batch, low, out=batch)
+    np.divide(batch, span, out=batch)
+    batch[flat[:, 0, 0]] = 0
+    return out[:n]
+
+
+def binarize_masks(masks, out=None):
+    """
+    Resize masks to 128x128 and binarize them (as preprocessMask)
+
+    Args:
+        masks: list of 2D arrays
+        out: optional preallocated array of shape (>= N, 128, 128, 1)
+
+    Returns:
+        array of shape (N, 128, 128, 1) with values 0 / 1
+    """
+    n = len(masks)
+    if out is None:
+        out = np.empty((n, TARGET_SIZE, TARGET_SIZE, 1), dtype=np.float32)
+    for i, mask in enumerate(masks):
+        mask = np.asarray(mask, dtype=np.uint8)
+        out[i, :, :, 0] = cv2.resize(mask, (TARGET_SIZE, TARGET_SIZE)) > 0.5
+    return out[:n]
@@ -0,0 +1,179 @@
+"""Dynamic micro-batching of segmentation requests.
+
+Each /api/predict call used to run the U-Net on a batch of one. The batcher
+queues preprocessed images from concurrent requests and runs them through
+the model as a single forward pass of up to PREDICT_MAX_BATCH_SIZE images,
+waiting at most PREDICT_MAX_WAIT_MS for a batch to fill. Every caller gets
+its own slice of the output.
+
+Each request is submitted with the model it was admitted under; a batch
+that straddles a model hot reload is split so every request finishes on its
+own model.
+"""
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import PREDICT_MAX_BATCH_SIZE, PREDICT_MAX_WAIT_MS
+from .metrics import Histogram
+
+# (image, model, future, enqueue time)
+_Entry = Tuple[np.ndarray, Any, asyncio.Future, float]
+
+
+class PredictionBatcher:
+    """Coalesce concurrent single-image predictions into batched forward passes."""
+
+    def __init__(
+        self,
+        predict_fn: Callable[[Any, np.ndarray], np.ndarray],
+        max_batch_size: int = PREDICT_MAX_BATCH_SIZE,
+        max_wait_ms: float = PREDICT_MAX_WAIT_MS,
+        executor: Optional[Executor] = None,
+    ):
+        self.predict_fn = predict_fn
+        # Thread pool for the forward pass (None: the loop's default one)
+        self.executor = executor
+        self.concurrency = 1
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Forward passes in flight; `_run` re-reads `concurrency` against it
+        # on every batch, so set_concurrency also applies after start()
+        self._in_flight = 0
+        self._slot_freed: Optional[asyncio.Event] = None
+        self._last_batch_size = 0
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_wait_ms = Histogram([1, 2, 5, 10, 20, 50, 100, 250, 500, 1000])
+
+    def start(self) -> None:
+        """Start the batching task on the running event loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._in_flight = 0
+        self._slot_freed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, image: np.ndarray, model: Any = None) -> np.ndarray:
+        """Predict one preprocessed image of shape (H, W, C) with `model`
+        (passed to predict_fn); returns its output."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        await self._queue.put((image, model, fut, loop.time()))
+        return await fut
+
+    async def _collect(self) -> List[_Entry]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        # Only hold the window open when the last batch was shared; a lone
+        # client is served immediately, and requests arriving during its
+        # forward pass form the next batch anyway.
+        wait = self.max_wait if self._last_batch_size > 1 else 0.0
+        deadline = loop.time() + wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def set_concurrency(self, concurrency: int, executor: Optional[Executor]) -> None:
+        """Allow up to `concurrency` forward passes in flight (engines that
+        serve batches in parallel, e.g. a pool of worker processes). Takes
+        effect from the next batch, also while the batcher is running."""
+        self.concurrency = max(1, concurrency)
+        self.executor = executor
+        if self._slot_freed is not None:
+            self._slot_freed.set()
+
+    async def _acquire_slot(self) -> None:
+        while self._in_flight >= self.concurrency:
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+        self._in_flight += 1
+
+    def _release_slot(self) -> None:
+        self._in_flight -= 1
+        self._slot_freed.set()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._acquire_slot()
+            batch = await self._collect()
+            # Callers that gave up (client disconnected) don't need a slot
+            batch = [entry for entry in batch if not entry[2].cancelled()]
+            if not batch:
+                self._release_slot()
+                continue
+            self._last_batch_size = len(batch)
+
+            started = loop.time()
+            for _, _, _, enqueued in batch:
+                self.queue_wait_ms.observe((started - enqueued) * 1000)
+            self.batch_sizes.observe(len(batch))
+
+            if self.concurrency == 1:
+                await self._forward(batch)
+                self._release_slot()
+            else:
+                task = loop.create_task(self._forward(batch))
+                task.add_done_callback(lambda _: self._release_slot())
+
+    async def _forward(self, batch: List[_Entry]) -> None:
+        # Almost always a single group; two only right after a model swap
+        groups: Dict[int, List[_Entry]] = {}
+        for entry in batch:
+            groups.setdefault(id(entry[1]), []).append(entry)
+        for entries in groups.values():
+            await self._forward_group(entries)
+
+    async def _forward_group(self, batch: List[_Entry]) -> None:
+        loop = asyncio.get_running_loop()
+        model = batch[0][1]
+        images = np.stack([image for image, _, _, _ in batch])
+        try:
+            outputs = await loop.run_in_executor(
+                self.executor, self.predict_fn, model, images
+            )
+        except Exception as e:
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for i, (_, _, fut, _) in enumerate(batch):
+            if not fut.done():
+                fut.set_result(outputs[i])
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "concurrency": self.concurrency,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
@@ -0,0 +1,99 @@
+"""Throughput of /api/predict/batch versus sequential /api/predict calls.
+
+Usage (against a running vision-service):
+
+    python -m app.benchmark_batch --url http://localhost:8001 --count 200
+    python -m app.benchmark_batch --images /app/data/test-image --count 500
+
+Without --images, random 400x300 grayscale PNGs are generated. The same
+images are sent once as N single requests, one after another, and once as
+a single multipart batch request; the report gives images per second and
+the time to the first streamed result.
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+
+import httpx
+import numpy as np
+from PIL import Image
+
+
+def _load_images(directory, count):
+    names = sorted(os.listdir(directory))[:count]
+    images = []
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as f:
+            images.append((name, f.read()))
+    return images
+
+
+def _synthetic_images(count):
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        buf = io.BytesIO()
+        pixels = (rng.random((300, 400)) * 255).astype(np.uint8)
+        Image.fromarray(pixels).save(buf, "PNG")
+        images.append((f"synthetic_{i}.png", buf.getvalue()))
+    return images
+
+
+def run_sequential(client, url, images):
+    start = time.perf_counter()
+    for name, data in images:
+        resp = client.post(f"{url}/api/predict", files={"file": (name, data)})
+        resp.raise_for_status()
+    return time.perf_counter() - start
+
+
+def run_batch(client, url, images):
+    files = [("files", (name, data)) for name, data in images]
+    start = time.perf_counter()
+    first = None
+    results = 0
+    with client.stream("POST", f"{url}/api/predict/batch", files=files) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            if first is None:
+                first = time.perf_counter() - start
+            if json.loads(line).get("success"):
+                results += 1
+    return time.perf_counter() - start, first, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--images", help="Directory of images to send")
+    parser.add_argument("--count", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.images:
+        images = _load_images(args.images, args.count)
+    else:
+        images = _synthetic_images(args.count)
+    n = len(images)
+
+    with httpx.Client(timeout=300.0) as client:
+        # Warm up both paths
+        run_sequential(client, args.url, images[:2])
+        run_batch(client, args.url, images[:2])
+
+        sequential = run_sequential(client, args.url, images)
+        batch, first, ok = run_batch(client, args.url, images)
+
+    print(f"Images: {n} ({ok} segmented by the batch endpoint)")
+    print(f"Sequential /api/predict:  {sequential:8.2f} s  {n / sequential:8.1f} img/s")
+    print(f"/api/predict/batch:       {batch:8.2f} s  {n / batch:8.1f} img/s")
+    print(f"First batch result after: {first:8.2f} s")
+    print(f"Speedup: {sequential / batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
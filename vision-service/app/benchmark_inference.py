@@ -0,0 +1,74 @@
+"""Compare per-request latency of `model.predict` and the InferenceEngine.
+
+Usage (inside the vision-service container):
+
+    python -m app.benchmark_inference
+    python -m app.benchmark_inference --iterations 500 --batch-sizes 1,4,16
+    python -m app.benchmark_inference --untrained   # no trained model needed
+
+Each batch size is timed for both paths after a warmup run; the report
+lists p50/p95/mean milliseconds per call and the speedup of the engine.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from .config import MODEL_PATH
+from .model import InferenceEngine, build_unet_model, load_model
+
+
+def _time_calls(fn, batch, iterations):
+    fn(batch)  # warmup (tracing, allocator)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(batch)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    return {
+        "p50": float(np.percentile(samples, 50)),
+        "p95": float(np.percentile(samples, 95)),
+        "mean": float(samples.mean()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--untrained", action="store_true", help="Use random weights")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--batch-sizes", default="1,4,16")
+    args = parser.parse_args(argv)
+
+    if args.untrained or not os.path.exists(args.model_path):
+        print("⚠️  Using an untrained U-Net (same architecture, random weights)")
+        model = build_unet_model()
+    else:
+        model = load_model(args.model_path)
+    engine = InferenceEngine(model)
+
+    rng = np.random.default_rng(0)
+    print(f"{'batch':>5}  {'path':<14}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}")
+    for size in [int(n) for n in args.batch_sizes.split(",")]:
+        batch = rng.random((size, 128, 128, 1), dtype=np.float32)
+        # Same outputs, within float tolerance
+        reference = model.predict(batch, verbose=0)
+        assert np.allclose(reference, engine.predict(batch), atol=1e-5)
+
+        keras = _time_calls(
+            lambda b: model.predict(b, verbose=0), batch, args.iterations
+        )
+        compiled = _time_calls(engine.predict, batch, args.iterations)
+        for name, r in (("model.predict", keras), ("engine", compiled)):
+            print(
+                f"{size:>5}  {name:<14}"
+                f"{r['p50']:>9.2f}{r['p95']:>9.2f}{r['mean']:>9.2f}"
+            )
+        print(f"{'':>5}  speedup p50: {keras['p50'] / compiled['p50']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
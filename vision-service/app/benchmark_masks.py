@@ -0,0 +1,113 @@
+"""Compare payload size and encode/decode cost of the mask encodings.
+
+Usage (inside the vision-service container):
+
+    python -m app.benchmark_masks
+    python -m app.benchmark_masks --masks /app/data/uploads/masks --limit 200
+    python -m app.benchmark_masks --sizes 128,512,1024 --count 50
+
+Without --masks, synthetic nodule-like masks (a few filled ellipses, some
+empty) are generated at each size. For every encoding in app/mask_codecs.py
+the report lists the mean JSON payload in bytes (as returned by
+/api/predict; bit-packed also without base64, as storage-service serves it),
+mean encode and decode time in microseconds, and how faithful the decoded
+mask is (exact for png / rle / bitpacked, mean IoU for polygons).
+"""
+
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from . import mask_codecs
+
+
+def synthetic_masks(size, count, seed=0):
+    rng = np.random.default_rng(seed)
+    masks = []
+    for i in range(count):
+        mask = np.zeros((size, size), dtype=np.uint8)
+        # About one in ten predictions finds no nodule
+        blobs = 0 if i % 10 == 0 else int(rng.integers(1, 4))
+        for _ in range(blobs):
+            center = tuple(int(c) for c in rng.integers(size // 8, size * 7 // 8, 2))
+            axes = tuple(int(a) for a in rng.integers(size // 32 + 1, size // 4, 2))
+            angle = float(rng.uniform(0, 180))
+            cv2.ellipse(mask, center, axes, angle, 0, 360, 1, -1)
+        masks.append(mask.astype(bool))
+    return masks
+
+
+def load_masks(directory, limit):
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(".png"))
+    masks = []
+    for name in names[:limit]:
+        with open(os.path.join(directory, name), "rb") as f:
+            masks.append(mask_codecs.decode_png(f.read()))
+    return masks
+
+
+def _iou(a, b):
+    union = np.logical_or(a, b).sum()
+    return 1.0 if union == 0 else np.logical_and(a, b).sum() / union
+
+
+def measure(masks, encoding):
+    json_bytes, encode_us, decode_us, ious = [], [], [], []
+    exact = True
+    for mask in masks:
+        start = time.perf_counter()
+        body = mask_codecs.encode(mask, encoding)
+        encode_us.append((time.perf_counter() - start) * 1e6)
+        json_bytes.append(len(json.dumps(body, separators=(",", ":"))))
+
+        start = time.perf_counter()
+        decoded = mask_codecs.decode(body)
+        decode_us.append((time.perf_counter() - start) * 1e6)
+        exact = exact and np.array_equal(decoded, mask)
+        ious.append(_iou(decoded, mask))
+    return {
+        "json_bytes": float(np.mean(json_bytes)),
+        "encode_us": float(np.mean(encode_us)),
+        "decode_us": float(np.mean(decode_us)),
+        "exact": exact,
+        "iou": float(np.mean(ious)),
+    }
+
+
+def report(label, masks):
+    raw_bytes = np.mean([len(mask_codecs.pack_bits(m)) for m in masks])
+    print(f"\n{label}: {len(masks)} masks, raw bit-packed {raw_bytes:.0f} bytes")
+    print(
+        f"{'encoding':<10}{'JSON bytes':>11}{'encode µs':>11}"
+        f"{'decode µs':>11}  fidelity"
+    )
+    for encoding in mask_codecs.ENCODINGS:
+        r = measure(masks, encoding)
+        fidelity = "exact" if r["exact"] else f"IoU {r['iou']:.3f}"
+        print(
+            f"{encoding:<10}{r['json_bytes']:>11.0f}{r['encode_us']:>11.0f}"
+            f"{r['decode_us']:>11.0f}  {fidelity}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--masks", help="Directory of PNG masks to use instead")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--sizes", default="128,512,1024")
+    parser.add_argument("--count", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.masks:
+        report(args.masks, load_masks(args.masks, args.limit))
+        return
+    for size in [int(n) for n in args.sizes.split(",")]:
+        report(f"{size}x{size} synthetic", synthetic_masks(size, args.count))
+
+
+if __name__ == "__main__":
+    main()
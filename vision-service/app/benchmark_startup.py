@@ -0,0 +1,94 @@
+"""Time from process start to first successful prediction.
+
+Usage (inside the vision-service container, with the service stopped or on
+another port):
+
+    python -m app.benchmark_startup
+    python -m app.benchmark_startup --runs 5 --port 8101
+
+Each run starts `uvicorn app.main:app` in a fresh process and polls it:
+/api/live (HTTP server up), /api/ready (model loaded and warmed up), and
+/api/predict with a synthetic image until it returns 200. The report lists
+those times and the startup phases the service recorded.
+"""
+
+import argparse
+import io
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+from PIL import Image
+
+POLL_INTERVAL = 0.05
+
+
+def _image():
+    rng = np.random.default_rng(0)
+    buf = io.BytesIO()
+    Image.fromarray((rng.random((300, 400)) * 255).astype(np.uint8)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _wait_for(start, deadline, request):
+    while time.perf_counter() < deadline:
+        try:
+            if request().status_code == 200:
+                return time.perf_counter() - start
+        except httpx.TransportError:
+            pass
+        time.sleep(POLL_INTERVAL)
+    raise TimeoutError("service did not answer in time")
+
+
+def run_once(port, timeout):
+    url = f"http://127.0.0.1:{port}"
+    image = _image()
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = start + timeout
+    try:
+        with httpx.Client(timeout=30) as client:
+            live = _wait_for(start, deadline, lambda: client.get(f"{url}/api/live"))
+            ready = _wait_for(start, deadline, lambda: client.get(f"{url}/api/ready"))
+            first = _wait_for(
+                start,
+                deadline,
+                lambda: client.post(
+                    f"{url}/api/predict", files={"file": ("startup.png", image)}
+                ),
+            )
+            phases = client.get(f"{url}/api/ready").json()["startup"]["phases_seconds"]
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return live, ready, first, phases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args(argv)
+
+    print(f"{'run':>3}{'live s':>9}{'ready s':>9}{'first ok s':>12}  phases (s)")
+    firsts = []
+    for run in range(1, args.runs + 1):
+        live, ready, first, phases = run_once(args.port, args.timeout)
+        firsts.append(first)
+        print(f"{run:>3}{live:>9.2f}{ready:>9.2f}{first:>12.2f}  {phases}")
+    print(f"Time to first successful prediction: median {np.median(firsts):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""Benchmark every stage of a prediction and write a report.
+
+Usage (inside the vision-service container):
+
+    python -m app.benchmark_suite
+    python -m app.benchmark_suite --quick                # small sweep
+    python -m app.benchmark_suite --untrained            # random weights
+    python -m app.benchmark_suite --image-sizes 256,1024 --concurrency 1,8,32
+
+Stages, each swept over its own parameter:
+
+- `prepare_image_for_prediction` and the served decode path
+  (`predict._decode`: decode, reduced resolution with
+  PREPROCESS_REDUCED_DECODE=1, + batch normalization),
+  per synthetic JPEG upload size
+- the model forward pass, per batch size
+- thresholding and PNG encoding of the mask (`predict.encode_mask`)
+- `/api/predict` in-process (ASGI, no network), per upload size and number
+  of concurrent clients; every request sends a different image, so the
+  result cache never answers
+
+The model is INFERENCE_RUNTIME loaded from MODEL_PATH, or an untrained
+`build_unet_model()` when that file is missing (or with --untrained), so the
+suite runs offline. Each case reports throughput, p50/p95/p99 latency and
+peak RSS (reset before each case where the kernel allows it, otherwise the
+process peak so far). Results go to `<output>.json` and `<output>.md`.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import resource
+import time
+from datetime import datetime, timezone
+
+import cv2
+import httpx
+import numpy as np
+
+from .config import INFERENCE_RUNTIME, MODEL_PATH
+from .preprocessing import prepare_image_for_prediction
+from .threads import cpu_budget, thread_settings
+
+QUICK = {
+    "image_sizes": "256,512",
+    "batch_sizes": "1,4",
+    "concurrency": "1,4",
+    "iterations": 20,
+    "requests": 40,
+}
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS of this process (Linux 4.0+); True if done"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthetic_upload(size, seed=0, quality=90):
+    """JPEG bytes of a size x size ultrasound-like image (speckle and a blob)"""
+    rng = np.random.default_rng(seed)
+    image = rng.normal(90, 40, (size, size)).astype(np.float32)
+    image = cv2.GaussianBlur(image, (0, 0), max(1.0, size / 256))
+    center = (size // 2 + size // 8, size // 2 - size // 10)
+    cv2.ellipse(image, center, (size // 6, size // 9), 20, 0, 360, 30, -1)
+    image = np.clip(image, 0, 255).astype(np.uint8)
+    _, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
+def _unique_uploads(size, start, count):
+    """Distinct JPEG uploads (index drawn into a corner), so no result is cached"""
+    base = cv2.imdecode(
+        np.frombuffer(synthetic_upload(size), np.uint8), cv2.IMREAD_GRAYSCALE
+    )
+    bits = np.arange(32)
+    uploads = []
+    for i in range(start, start + count):
+        image = base.copy()
+        stamp = np.repeat(((i >> bits) & 1) * 255, 4)[:size]
+        image[:4, : len(stamp)] = stamp
+        uploads.append(cv2.imencode(".jpg", image)[1].tobytes())
+    return uploads
+
+
+def _summary(latencies_ms, items, seconds):
+    samples = np.asarray(latencies_ms)
+    return {
+        "items_per_second": round(items / seconds, 1) if seconds else None,
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+    }
+
+
+def time_calls(fn, iterations, items_per_call=1):
+    """Latency of `fn()` over `iterations` calls after one warmup call"""
+    fn()
+    _reset_peak_rss()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - started
+    return {
+        **_summary(latencies, iterations * items_per_call, elapsed),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def load_benchmark_engine(runtime, model_path, untrained):
+    """(engine, runtime, description) for the model, or an untrained U-Net"""
+    from .runtimes import load_engine, model_path_for
+
+    if not untrained and os.path.exists(model_path_for(runtime, model_path)):
+        engine, path = load_engine(runtime, model_path, processes=0)
+        return engine, runtime, path
+
+    print("⚠️  Using an untrained U-Net (same architecture, random weights)")
+    from .model import InferenceEngine, build_unet_model
+    from .threads import configure_tensorflow
+
+    configure_tensorflow(thread_settings("keras", 0))
+    engine = InferenceEngine(build_unet_model())
+    return engine, "keras", "untrained build_unet_model()"
+
+
+def bench_preprocessing(sizes, iterations):
+    from .routes.predict import _decode
+
+    results = []
+    for size in sizes:
+        upload = synthetic_upload(size)
+        for stage, fn in (
+            ("prepare_image_for_prediction", prepare_image_for_prediction),
+            ("served_decode", _decode),
+        ):
+            r = time_calls(lambda: fn(upload), iterations)
+            results.append({"stage": stage, "image_size": size, **r})
+    return results
+
+
+def bench_forward(engine, batch_sizes, iterations):
+    rng = np.random.default_rng(0)
+    results = []
+    for size in batch_sizes:
+        batch = rng.random((size, 128, 128, 1), dtype=np.float32)
+        r = time_calls(lambda: engine.predict(batch), iterations, size)
+        results.append({"stage": "forward", "batch_size": size, **r})
+    return results
+
+
+def bench_encode(iterations):
+    from .routes.predict import encode_mask
+
+    # A smooth probability map with one nodule, like a real prediction
+    mask = np.zeros((128, 128), np.float32)
+    cv2.ellipse(mask, (70, 60), (22, 14), 20, 0, 360, 1.0, -1)
+    mask = cv2.GaussianBlur(mask, (0, 0), 2)
+    r = time_calls(lambda: encode_mask(mask), iterations)
+    return [{"stage": "encode_mask", **r}]
+
+
+async def _run_clients(client, uploads, concurrency):
+    pending = iter(uploads)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        for upload in pending:
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/predict", files={"file": ("bench.jpg", upload, "image/jpeg")}
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def _bench_endpoint_case(app, uploads, concurrency):
+    from .routes import predict
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=300
+        ) as client:
+            # The request log line would be printed once per request
+            with open(os.devnull, "w") as devnull:
+                with contextlib.redirect_stdout(devnull):
+                    # Warm up decoding, the batcher and the engine on this loop
+                    await _run_clients(client, uploads[:concurrency], concurrency)
+                    _reset_peak_rss()
+                    return await _run_clients(
+                        client, uploads[concurrency:], concurrency
+                    )
+    finally:
+        await predict.batcher.stop()
+
+
+def bench_endpoint(engine, version, runtime, sizes, concurrency_levels, requests):
+    from .main import app
+    from .routes import predict
+
+    predict.set_engine(engine, version, runtime)
+    results = []
+    sent = 0
+    for size in sizes:
+        for concurrency in concurrency_levels:
+            uploads = _unique_uploads(size, sent, requests + concurrency)
+            sent += len(uploads)
+            latencies, errors, elapsed = asyncio.run(
+                _bench_endpoint_case(app, uploads, concurrency)
+            )
+            results.append(
+                {
+                    "stage": "api_predict",
+                    "image_size": size,
+                    "concurrency": concurrency,
+                    **_summary(latencies, len(latencies) - errors, elapsed),
+                    "peak_rss_mb": round(_peak_rss_mb(), 1),
+                    "errors": errors,
+                }
+            )
+            r = results[-1]
+            print(
+                f"   api_predict {size}px x{concurrency}: "
+                f"{r['items_per_second']}/s, p95 {r['p95_ms']} ms"
+            )
+    return results
+
+
+COLUMNS = (
+    ("stage", "stage"),
+    ("image_size", "image px"),
+    ("batch_size", "batch"),
+    ("concurrency", "clients"),
+    ("items_per_second", "images/s"),
+    ("p50_ms", "p50 ms"),
+    ("p95_ms", "p95 ms"),
+    ("p99_ms", "p99 ms"),
+    ("peak_rss_mb", "peak RSS MB"),
+    ("errors", "errors"),
+)
+
+
+def markdown_report(report):
+    env = report["environment"]
+    lines = [
+        "# Vision service benchmark",
+        "",
+        f"- Created: {report['created']}",
+        f"- Model: {env['model']}",
+        f"- CPUs: {env['cpus']}, threads: {env['threads']}",
+        f"- Python {env['python']}, numpy {env['numpy']}, OpenCV {env['opencv']}",
+        f"- Peak RSS: {env['rss_scope']}",
+        "",
+        "| " + " | ".join(title for _, title in COLUMNS) + " |",
+        "|" + "---|" * len(COLUMNS),
+    ]
+    for row in report["results"]:
+        cells = ["" if row.get(key) is None else str(row[key]) for key, _ in COLUMNS]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runtime", default=INFERENCE_RUNTIME)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--untrained", action="store_true", help="Use random weights")
+    parser.add_argument("--image-sizes", default="256,512,1024")
+    parser.add_argument("--batch-sizes", default="1,4,16")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--quick", action="store_true", help="Small sweep for a fast check"
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join(os.path.dirname(MODEL_PATH), "benchmark_report"),
+        help="Report path without extension (.json and .md are written)",
+    )
+    args = parser.parse_args(argv)
+    if args.quick:
+        for key, value in QUICK.items():
+            setattr(args, key, value)
+
+    def ints(value):
+        return [int(n) for n in value.split(",")]
+
+    image_sizes = ints(args.image_sizes)
+    rss_scope = "per case" if _reset_peak_rss() else "process peak so far"
+
+    engine, runtime, model = load_benchmark_engine(
+        args.runtime, args.model_path, args.untrained
+    )
+
+    print("⏱️  Preprocessing")
+    results = bench_preprocessing(image_sizes, args.iterations)
+    print("⏱️  Forward pass")
+    results += bench_forward(engine, ints(args.batch_sizes), args.iterations)
+    print("⏱️  Mask encoding")
+    results += bench_encode(args.iterations)
+    print("⏱️  /api/predict")
+    results += bench_endpoint(
+        engine,
+        "benchmark",
+        runtime,
+        image_sizes,
+        ints(args.concurrency),
+        args.requests,
+    )
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "model": f"{runtime} {model}",
+            "cpus": cpu_budget(),
+            "threads": thread_settings(runtime, 0),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "rss_scope": rss_scope,
+        },
+        "parameters": {
+            "iterations": args.iterations,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+    markdown = markdown_report(report)
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    with open(args.output + ".md", "w") as f:
+        f.write(markdown)
+    print()
+    print(markdown)
+    print(f"✅ Report written to {args.output}.json and {args.output}.md")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Throughput of the model worker pool from 1 to N processes.
+
+Usage (inside the vision-service container):
+
+    python -m app.benchmark_workers --max-processes 4
+    python -m app.benchmark_workers --runtime tflite_int8 --batch-size 8
+
+For every process count the pool is started, warmed up, and then kept
+saturated with batches of --batch-size images (one dispatching thread per
+ring slot, as the batcher does) for --batches batches. The in-process
+engine (INFERENCE_PROCESSES=0) is measured first as the baseline.
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .config import INFERENCE_RUNTIME, MODEL_PATH
+from .runtimes import load_engine
+from .workers import ProcessEnginePool
+
+
+def _throughput(engine, batch, batches, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: engine.predict(batch), range(batches)))
+    return batches * len(batch) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runtime", default=INFERENCE_RUNTIME)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    batch = rng.random((args.batch_size, 128, 128, 1), dtype=np.float32)
+
+    engine, _ = load_engine(args.runtime, args.model_path, processes=0)
+    engine.warmup([args.batch_size])
+    baseline = _throughput(engine, batch, args.batches, 1)
+    print(f"{'processes':>9}{'img/s':>10}{'speedup':>9}{'efficiency':>12}")
+    print(f"{'in-proc':>9}{baseline:>10.1f}{1.0:>9.2f}{'':>12}")
+
+    single = None
+    for n in range(1, args.max_processes + 1):
+        pool = ProcessEnginePool(args.runtime, args.model_path, n)
+        try:
+            pool.warmup([args.batch_size])
+            rate = _throughput(pool, batch, args.batches, pool.concurrency)
+        finally:
+            pool.shutdown()
+        single = single or rate
+        print(
+            f"{n:>9}{rate:>10.1f}{rate / baseline:>9.2f}"
+            f"{rate / (single * n):>11.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
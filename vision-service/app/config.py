@@ -0,0 +1,95 @@
+"""Vision service configuration.
+
+Tunables are read from environment variables so deployments can size the
+service for their hardware without editing source.
+"""
+
+import os
+
+# Trained model loaded at startup
+MODEL_PATH = os.environ.get("MODEL_PATH", "/app/models/thyroid_unet_model.keras")
+
+# Versioned models: MODEL_REGISTRY_DIR/<version>/<model file>, serving the
+# version named in MODEL_REGISTRY_DIR/CURRENT (default: the newest; no
+# versions: MODEL_PATH). Changes are picked up every MODEL_WATCH_INTERVAL
+# seconds (0: only by POST /api/models/reload). A replaced model is released
+# once its requests finish, or after MODEL_DRAIN_TIMEOUT seconds
+MODEL_REGISTRY_DIR = os.environ.get(
+    "MODEL_REGISTRY_DIR", os.path.join(os.path.dirname(MODEL_PATH), "registry")
+)
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "10"))
+MODEL_DRAIN_TIMEOUT = float(os.environ.get("MODEL_DRAIN_TIMEOUT", "60"))
+
+# keras | tflite_fp16 | tflite_int8 (TFLite files are exported next to
+# MODEL_PATH by export_tflite.py)
+INFERENCE_RUNTIME = os.environ.get("INFERENCE_RUNTIME", "keras")
+
+# Thread pools of the forward pass (0: derived from the container's CPU
+# quota, or taken from INFERENCE_AUTOTUNE_FILE written by app.autotune)
+TF_INTRA_OP_THREADS = int(os.environ.get("TF_INTRA_OP_THREADS", "0"))
+TF_INTER_OP_THREADS = int(os.environ.get("TF_INTER_OP_THREADS", "0"))
+TFLITE_NUM_THREADS = int(os.environ.get("TFLITE_NUM_THREADS", "0"))
+INFERENCE_AUTOTUNE_FILE = os.environ.get(
+    "INFERENCE_AUTOTUNE_FILE",
+    os.path.join(os.path.dirname(MODEL_PATH), "autotune.json"),
+)
+
+# Micro-batching of /api/predict: concurrent requests arriving within
+# PREDICT_MAX_WAIT_MS are run as one forward pass of up to
+# PREDICT_MAX_BATCH_SIZE images
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", "16"))
+# Unless set explicitly, batches are capped at the best batch size found by
+# app.autotune instead (see app.threads.max_batch_size)
+PREDICT_MAX_BATCH_SIZE_PINNED = "PREDICT_MAX_BATCH_SIZE" in os.environ
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", "5"))
+
+# Worker threads for decode / inference / encode, and how many more requests
+# may wait for them before new ones get 503 with Retry-After
+PREDICT_WORKERS = int(os.environ.get("PREDICT_WORKERS", "2"))
+PREDICT_QUEUE_SIZE = int(os.environ.get("PREDICT_QUEUE_SIZE", "32"))
+PREDICT_RETRY_AFTER_SECONDS = int(os.environ.get("PREDICT_RETRY_AFTER_SECONDS", "1"))
+
+# Batch sizes run once at startup so the first real requests are not slowed
+# by graph tracing (default: powers of two up to PREDICT_MAX_BATCH_SIZE)
+PREDICT_WARMUP_BATCH_SIZES = [
+    int(n)
+    for n in os.environ.get(
+        "PREDICT_WARMUP_BATCH_SIZES",
+        ",".join(
+            str(1 << i) for i in range(PREDICT_MAX_BATCH_SIZE.bit_length())
+        ),
+    ).split(",")
+    if n.strip()
+]
+
+# /api/predict/batch: images per streamed chunk and max files per multipart
+PREDICT_BATCH_CHUNK_SIZE = int(
+    os.environ.get("PREDICT_BATCH_CHUNK_SIZE", str(PREDICT_MAX_BATCH_SIZE))
+)
+PREDICT_BATCH_MAX_FILES = int(os.environ.get("PREDICT_BATCH_MAX_FILES", "1000"))
+
+# Prediction results cached by image hash + model version + threshold:
+# in memory up to PREDICT_CACHE_MAX_BYTES, and on disk under
+# PREDICT_CACHE_DIR (unset: memory only) up to PREDICT_CACHE_DISK_MAX_BYTES
+PREDICT_CACHE_MAX_BYTES = int(
+    os.environ.get("PREDICT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+PREDICT_CACHE_DIR = os.environ.get("PREDICT_CACHE_DIR", "")
+PREDICT_CACHE_DISK_MAX_BYTES = int(
+    os.environ.get("PREDICT_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024))
+)
+
+# Serve forward passes from this many model worker processes (0: in the
+# API process). Each worker has INFERENCE_RING_SLOTS shared-memory batch
+# slots, so the next batch is staged while the current one runs
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", "0"))
+INFERENCE_RING_SLOTS = int(os.environ.get("INFERENCE_RING_SLOTS", "2"))
+# A batch a worker hasn't answered within this many seconds fails, and the
+# worker is restarted
+INFERENCE_WORKER_TIMEOUT = float(os.environ.get("INFERENCE_WORKER_TIMEOUT", "60"))
+
+# Let the JPEG decoder downscale by 2/4/8 while decoding uploads (the model
+# only needs 128x128). Off by default: the decoder's IDCT scaling averages
+# pixels where train.py's full-resolution resize does not, so served inputs
+# would drift from the training inputs (mean abs diff ~0.04-0.07)
+PREPROCESS_REDUCED_DECODE = os.environ.get("PREPROCESS_REDUCED_DECODE", "0") == "1"
@@ -0,0 +1,87 @@
+"""Bounded worker pool for prediction work.
+
+Decoding, the forward pass and PNG encoding are CPU-bound and would block
+the event loop (and with it `/api/health`). They run on a dedicated thread
+pool of PREDICT_WORKERS threads instead; OpenCV and TensorFlow release the
+GIL for the heavy lifting, so threads run in parallel without copying
+images between processes.
+
+Admission is bounded: at most PREDICT_WORKERS + PREDICT_QUEUE_SIZE requests
+are in flight at once. Anything beyond that is rejected immediately so the
+client can retry elsewhere or later, instead of piling up latency.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .config import PREDICT_WORKERS, PREDICT_QUEUE_SIZE, PREDICT_RETRY_AFTER_SECONDS
+
+
+class Overloaded(Exception):
+    """Raised when a request arrives while the queue is full."""
+
+
+class BoundedExecutor:
+    def __init__(
+        self,
+        workers: int = PREDICT_WORKERS,
+        queue_size: int = PREDICT_QUEUE_SIZE,
+        retry_after: int = PREDICT_RETRY_AFTER_SECONDS,
+    ):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.retry_after = retry_after
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="predict"
+        )
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def limit(self) -> int:
+        return self.workers + self.queue_size
+
+    def acquire(self) -> None:
+        """Take a request slot or raise Overloaded; pair with release()."""
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            raise Overloaded()
+        self.in_flight += 1
+        self.admitted += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+    @contextmanager
+    def admit(self):
+        """Hold a request slot for the duration of the block, or raise Overloaded."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, fn, *args):
+        """Run a blocking function on the prediction pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+executor = BoundedExecutor()
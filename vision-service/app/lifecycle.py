@@ -0,0 +1,95 @@
+"""Startup phases of the vision service.
+
+The HTTP server answers /api/live as soon as it is up; the model is loaded
+and warmed up in the background, and /api/ready turns 200 only once a
+synthetic image has gone through the whole prediction path. If the load or
+that warm-up fails, it stays 503 until a later model load (a reload, or a
+model published to the registry) passes the warm-up again. Phase timings
+are measured from process start (read from /proc, so interpreter start-up
+and imports are included) and reported by /api/ready and /api/metrics.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+def process_uptime() -> Optional[float]:
+    """Seconds since this process started (Linux), or None"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name; starttime is field 22
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """Durations of the startup phases, and when the service became usable."""
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self._offset = process_uptime() or 0.0
+        self.phase = "starting"
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+        self.first_prediction_at: Optional[float] = None
+        self.error: Optional[str] = None
+        # Phase that was running when startup failed
+        self.failed_phase: Optional[str] = None
+
+    def elapsed(self) -> float:
+        return round(self._offset + time.perf_counter() - self._t0, 3)
+
+    @contextmanager
+    def measure(self, phase: str):
+        """Record how long `phase` takes (seconds)"""
+        self.phase = phase
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] = round(time.perf_counter() - start, 3)
+
+    def mark(self, phase: str) -> None:
+        """Record a phase that began at process start and ends now"""
+        self.phases[phase] = self.elapsed()
+
+    def ready(self) -> None:
+        self.phase = "ready"
+        self.error = None
+        self.failed_phase = None
+        self.ready_at = self.elapsed()
+        print(f"✅ Ready {self.ready_at:.2f}s after process start ({self.phases})")
+
+    def failed(self, error: str) -> None:
+        self.failed_phase = self.phase
+        self.phase = "failed"
+        self.error = error
+
+    def first_prediction(self) -> None:
+        if self.first_prediction_at is None:
+            self.first_prediction_at = self.elapsed()
+            print(
+                f"⏱️  First successful prediction "
+                f"{self.first_prediction_at:.2f}s after process start"
+            )
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "phase": self.phase,
+            "uptime_seconds": self.elapsed(),
+            "phases_seconds": dict(self.phases),
+            "ready_seconds": self.ready_at,
+            "first_prediction_seconds": self.first_prediction_at,
+            "error": self.error,
+            "failed_phase": self.failed_phase,
+        }
+
+
+timer = StartupTimer()
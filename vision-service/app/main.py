@@ -1,15 +1,57 @@
 """Vision Service - Thyroid Segmentation API"""
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .model import load_model
-from .routes import predict
-import os
+from .executor import executor
+from .lifecycle import timer
+from .registry import manager
+from .routes import predict, batch, metrics, models, health
+
+
+async def _load_model():
+    """Load and warm up the model, then report ready (runs in the background)"""
+    try:
+        with timer.measure("model_load"):
+            await manager.load()
+        with timer.measure("pipeline_warmup"):
+            await predict.warmup_pipeline()
+        reload = manager.last_reload or {}
+        timer.phases["engine_load"] = reload.get("load_seconds")
+        timer.phases["engine_warmup"] = reload.get("warmup_seconds")
+        timer.ready()
+    except FileNotFoundError as e:
+        timer.failed(str(e))
+        print(f"⚠️  {e}")
+        print("   Please run the training script first:")
+        print("   docker-compose exec vision-service python train.py")
+    except Exception as e:
+        timer.failed(str(e))
+        print(f"❌ Error loading model: {e}")
+    # Also picks up a model published after a failed start
+    manager.start_watching()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Serve /api/live at once; load the model without blocking startup"""
+    timer.mark("server_start")
+    predict.batcher.start()
+    loading = asyncio.create_task(_load_model())
+    yield
+    # Waits for a load in progress, then releases the model
+    await manager.stop()
+    loading.cancel()
+    await predict.batcher.stop()
+    executor.shutdown()
+
 
 app = FastAPI(
     title="Thyroid Segmentation Vision Service",
     description="U-Net based thyroid nodule segmentation service",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -22,27 +64,38 @@ app.add_middleware(
 )
 
 
-# Load model on startup
-@app.on_event("startup")
-async def startup_event():
-    """Load the trained model when service starts"""
-    model_path = "/app/models/thyroid_unet_model.keras"
+class ModelVersionHeader:
+    """Tag every response with the model serving it (X-Model-Version)"""
 
-    try:
-        if os.path.exists(model_path):
-            model = load_model(model_path)
-            predict.set_model(model)
-            print("✅ Model loaded successfully")
-        else:
-            print(f"⚠️  Model not found at {model_path}")
-            print("   Please run the training script first:")
-            print("   docker-compose exec vision-service python train.py")
-    except Exception as e:
-        print(f"❌ Error loading model: {e}")
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_version(message):
+            model = predict.active
+            if message["type"] == "http.response.start" and model is not None:
+                headers = list(message.get("headers", []))
+                # Prediction routes set the version of the model they pinned
+                if not any(k.lower() == b"x-model-version" for k, _ in headers):
+                    headers.append((b"x-model-version", model.version.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
+
+
+app.add_middleware(ModelVersionHeader)
 
 
 # Include routers
+app.include_router(health.router, prefix="/api", tags=["health"])
 app.include_router(predict.router, prefix="/api", tags=["prediction"])
+app.include_router(batch.router, prefix="/api", tags=["prediction"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
+app.include_router(models.router, prefix="/api", tags=["models"])
 
 
 @app.get("/")
@@ -51,5 +104,13 @@ async def root():
     return {
         "service": "Thyroid Segmentation Vision Service",
         "status": "running",
-        "endpoints": {"predict": "/api/predict", "health": "/api/health"},
+        "endpoints": {
+            "predict": "/api/predict",
+            "predict_batch": "/api/predict/batch",
+            "health": "/api/health",
+            "live": "/api/live",
+            "ready": "/api/ready",
+            "metrics": "/api/metrics",
+            "models": "/api/models",
+        },
     }
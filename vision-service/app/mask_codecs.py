@@ -0,0 +1,171 @@
+"""Compact encodings of binary segmentation masks.
+
+- `png`: the mask as a grayscale PNG (0 / 255), as stored and returned so far
+- `rle`: run lengths of the row-major flattened mask, alternating background
+  and foreground and starting with background (the first run may be 0):
+  `{"size": [h, w], "counts": [...]}`
+- `bitpacked`: one bit per pixel, row-major, most significant bit first
+  (`np.packbits`): `{"size": [h, w], "bits": "<base64>"}`
+- `polygons`: outer contours simplified by Douglas-Peucker with tolerance
+  `epsilon` pixels, as `[x, y]` points: `{"size": [h, w], "polygons": [...]}`.
+  Lossy (holes are filled, edges move by up to `epsilon`)
+
+Run boundaries and bit packing are computed with whole-array numpy
+operations; contours come from OpenCV. The same file is in vision-service
+and storage-service (app/mask_codecs.py) so both services speak the same
+formats; vision-service/tests/test_mask_codecs.py checks that they match.
+"""
+
+import base64
+
+import cv2
+import numpy as np
+
+ENCODINGS = ("png", "rle", "bitpacked", "polygons")
+
+# Accept header values selecting an encoding
+MEDIA_TYPES = {
+    "png": "image/png",
+    "rle": "application/x-mask-rle+json",
+    "bitpacked": "application/x-mask-bitpacked",
+    "polygons": "application/x-mask-polygons+json",
+}
+
+POLYGON_EPSILON = 1.0
+
+
+def negotiate(encoding=None, accept=None):
+    """
+    Pick an encoding from an explicit parameter, else from an Accept header
+
+    Raises:
+        ValueError: unknown explicit encoding
+    """
+    if encoding:
+        if encoding not in ENCODINGS:
+            raise ValueError(
+                f"Unknown mask encoding {encoding!r}, "
+                f"use one of {', '.join(ENCODINGS)}"
+            )
+        return encoding
+    by_media_type = {v: k for k, v in MEDIA_TYPES.items()}
+    for part in (accept or "").split(","):
+        media_type = part.split(";", 1)[0].strip().lower()
+        if media_type in by_media_type:
+            return by_media_type[media_type]
+    return "png"
+
+
+def _binary(mask):
+    return np.asarray(mask, dtype=bool)
+
+
+def encode_png(mask):
+    _, buffer = cv2.imencode(".png", _binary(mask).astype(np.uint8) * 255)
+    return buffer.tobytes()
+
+
+def decode_png(data):
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError("Invalid PNG mask")
+    return image > 127
+
+
+def encode_rle(mask):
+    mask = _binary(mask)
+    flat = mask.ravel()
+    # Indices where the value changes, plus both ends
+    edges = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], edges, [flat.size])))
+    if flat.size and flat[0]:
+        counts = np.concatenate(([0], counts))
+    return {"size": list(mask.shape), "counts": counts.tolist()}
+
+
+def decode_rle(data):
+    height, width = data["size"]
+    counts = np.asarray(data["counts"], dtype=np.int64)
+    if counts.sum() != height * width:
+        raise ValueError("RLE counts do not add up to the mask size")
+    values = np.arange(len(counts)) % 2 == 1
+    return np.repeat(values, counts).reshape(height, width)
+
+
+def pack_bits(mask):
+    """Raw bit-packed bytes (row-major, MSB first)"""
+    return np.packbits(_binary(mask).ravel()).tobytes()
+
+
+def unpack_bits(data, height, width):
+    bits = np.unpackbits(np.frombuffer(data, np.uint8), count=height * width)
+    return bits.astype(bool).reshape(height, width)
+
+
+def encode_bitpacked(mask):
+    mask = _binary(mask)
+    bits = base64.b64encode(pack_bits(mask)).decode("ascii")
+    return {"size": list(mask.shape), "bits": bits}
+
+
+def decode_bitpacked(data):
+    height, width = data["size"]
+    return unpack_bits(base64.b64decode(data["bits"]), height, width)
+
+
+def encode_polygons(mask, epsilon=POLYGON_EPSILON):
+    mask = _binary(mask)
+    contours, _ = cv2.findContours(
+        mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )
+    polygons = [
+        cv2.approxPolyDP(contour, epsilon, True).reshape(-1, 2).tolist()
+        for contour in contours
+    ]
+    return {"size": list(mask.shape), "epsilon": epsilon, "polygons": polygons}
+
+
+def decode_polygons(data):
+    height, width = data["size"]
+    mask = np.zeros((height, width), dtype=np.uint8)
+    points = [
+        np.asarray(polygon, dtype=np.int32).reshape(-1, 1, 2)
+        for polygon in data["polygons"]
+    ]
+    if points:
+        cv2.fillPoly(mask, points, 1)
+        # Contours run through the boundary pixels; draw them too, so shapes
+        # one pixel wide survive
+        cv2.polylines(mask, points, True, 1)
+    return mask.astype(bool)
+
+
+def encode(mask, encoding):
+    """Encode a mask as a JSON-serializable dict with an `encoding` field"""
+    if encoding == "png":
+        mask = _binary(mask)
+        data = base64.b64encode(encode_png(mask)).decode("ascii")
+        body = {"size": list(mask.shape), "png_base64": data}
+    elif encoding == "rle":
+        body = encode_rle(mask)
+    elif encoding == "bitpacked":
+        body = encode_bitpacked(mask)
+    elif encoding == "polygons":
+        body = encode_polygons(mask)
+    else:
+        raise ValueError(f"Unknown mask encoding {encoding!r}")
+    return {"encoding": encoding, **body}
+
+
+def decode(data):
+    """Inverse of `encode`: a boolean array of shape `size`"""
+    encoding = data.get("encoding")
+    if encoding == "png":
+        return decode_png(base64.b64decode(data["png_base64"]))
+    if encoding == "rle":
+        return decode_rle(data)
+    if encoding == "bitpacked":
+        return decode_bitpacked(data)
+    if encoding == "polygons":
+        return decode_polygons(data)
+    raise ValueError(f"Unknown mask encoding {encoding!r}")
@@ -0,0 +1,33 @@
+"""Lightweight in-process metrics (served as JSON by /api/metrics)"""
+
+import bisect
+from typing import Dict, Sequence
+
+
+class Histogram:
+    """Bucketed distribution with Prometheus-style cumulative counts."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict:
+        cumulative = {}
+        running = 0
+        for bound, n in zip(self.buckets, self._counts):
+            running += n
+            cumulative[f"le_{bound:g}"] = running
+        cumulative["le_inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else None,
+            "buckets": cumulative,
+        }
@@ -1,6 +1,7 @@
 """U-Net model architecture and utilities"""
 
 import tensorflow as tf
+import numpy as np
 import os
 
 
@@ -128,3 +129,43 @@ def load_model(model_path="/app/models/thyroid_unet_model.keras"):
 
     print(f"Model loaded successfully from {model_path}")
     return model
+
+
+class InferenceEngine:
+    """
+    Low-overhead forward pass for a loaded model.
+
+    `model.predict` builds a data adapter and runs the callback machinery on
+    every call, which dominates latency for a single 128x128 image. The engine
+    calls the model through a `tf.function` with a fixed input signature
+    (any batch size, float32), traced once and reused for every request.
+    """
+
+    def __init__(self, model, input_shape=(128, 128, 1)):
+        self.model = model
+        self.input_shape = tuple(input_shape)
+        spec = tf.TensorSpec(shape=(None,) + self.input_shape, dtype=tf.float32)
+        self._forward = tf.function(self._call, input_signature=[spec])
+        self.warm_batch_sizes = []
+
+    def _call(self, images):
+        return self.model(images, training=False)
+
+    def predict(self, images):
+        """
+        Run a batch through the model
+
+        Args:
+            images: numpy array of shape (N, 128, 128, 1)
+
+        Returns:
+            numpy float32 array of shape (N, 128, 128, 1)
+        """
+        images = np.asarray(images, dtype=np.float32)
+        return self._forward(tf.convert_to_tensor(images)).numpy()
+
+    def warmup(self, batch_sizes=(1,)):
+        """Trace the graph and run each batch size once so kernels are ready"""
+        for size in batch_sizes:
+            self.predict(np.zeros((size,) + self.input_shape, dtype=np.float32))
+            self.warm_batch_sizes.append(size)
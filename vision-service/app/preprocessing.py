@@ -37,21 +37,33 @@ def preprocessMask(mask):
     return mask
 
 
-def prepare_image_for_prediction(image_bytes):
+def decode_image(image_bytes):
     """
-    Prepare uploaded image bytes for model prediction
+    Decode uploaded image bytes to a 2D grayscale array
 
     Args:
         image_bytes: Raw image bytes from upload
 
     Returns:
-        Preprocessed image ready for model (128, 128, 1)
+        2D uint8 numpy array at the original resolution
     """
-    # Decode image from bytes
     nparr = np.frombuffer(image_bytes, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError("Could not decode image")
+    return img
+
+
+def prepare_decoded_image(img):
+    """
+    Prepare a decoded grayscale image for model prediction
+
+    Args:
+        img: 2D numpy array from decode_image
 
-    # Preprocess
+    Returns:
+        Preprocessed image batch of shape (1, 128, 128, 1)
+    """
     img = preprocessImg(img)
 
     # Add channel dimension
@@ -61,3 +73,16 @@ def prepare_image_for_prediction(image_bytes):
     img = np.expand_dims(img, axis=0)
 
     return img
+
+
+def prepare_image_for_prediction(image_bytes):
+    """
+    Prepare uploaded image bytes for model prediction
+
+    Args:
+        image_bytes: Raw image bytes from upload
+
+    Returns:
+        Preprocessed image ready for model (128, 128, 1)
+    """
+    return prepare_decoded_image(decode_image(image_bytes))
@@ -0,0 +1,354 @@
+"""Versioned model directory and zero-downtime model reloads.
+
+Layout of MODEL_REGISTRY_DIR (default `/app/models/registry`):
+
+    registry/
+      20261001-120000/thyroid_unet_model.keras   (+ its TFLite exports)
+      20261019-093000/thyroid_unet_model.keras
+      CURRENT                                    version to serve (optional)
+
+Without CURRENT the newest version is served; with no versions at all the
+service serves MODEL_PATH as before. Publish the current model with
+
+    python -m app.registry publish [--version NAME] [--no-activate]
+
+A reload (POST /api/models/reload, or a change noticed by the watcher every
+MODEL_WATCH_INTERVAL seconds) loads and warms up the new version on a
+background thread while the old one keeps serving, then switches new
+requests to it with `predict.set_engine`. Requests already admitted finish
+on the model they started with; the old model is released afterwards.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Set
+
+from .config import (
+    INFERENCE_PROCESSES,
+    INFERENCE_RUNTIME,
+    MODEL_DRAIN_TIMEOUT,
+    MODEL_PATH,
+    MODEL_REGISTRY_DIR,
+    MODEL_WATCH_INTERVAL,
+    PREDICT_WARMUP_BATCH_SIZES,
+)
+from .lifecycle import timer
+from .routes import predict
+from .runtimes import RUNTIMES, load_engine, model_path_for, model_version_for
+from .workers import ProcessEnginePool
+
+CURRENT_FILE = "CURRENT"
+
+
+class ModelRegistry:
+    """Version directories under `root`, each holding a copy of the model file."""
+
+    def __init__(self, root: str = MODEL_REGISTRY_DIR, model_path: str = MODEL_PATH):
+        self.root = root
+        self.model_path = model_path
+        self.filename = os.path.basename(model_path)
+
+    def path_for(self, version: Optional[str]) -> str:
+        """Keras model path of a version (None: the unversioned MODEL_PATH)"""
+        if version is None:
+            return self.model_path
+        return os.path.join(self.root, version, self.filename)
+
+    def versions(self) -> List[str]:
+        """Versions with a model file, oldest first (names sort by time)"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(n for n in names if os.path.isfile(self.path_for(n)))
+
+    def current(self) -> Optional[str]:
+        """Version named in CURRENT, if any"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def selected(self) -> Optional[str]:
+        """Version that should be served (None: MODEL_PATH)"""
+        versions = self.versions()
+        current = self.current()
+        if current is not None and current in versions:
+            return current
+        if current is not None:
+            print(f"⚠️  {CURRENT_FILE} names unknown model version {current!r}")
+        return versions[-1] if versions else None
+
+    def signature(self):
+        """Changes whenever CURRENT or a version's model file changes"""
+        files = []
+        for version in self.versions():
+            stat = os.stat(self.path_for(version))
+            files.append((version, stat.st_size, stat.st_mtime))
+        return self.current(), tuple(files)
+
+    def publish(self, source: str, version: str, activate: bool = True) -> str:
+        """Copy a model (and its TFLite exports) in as a new version"""
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Model not found at {source}")
+        target = os.path.join(self.root, version)
+        if os.path.exists(target):
+            raise FileExistsError(f"Model version {version} already exists")
+        staging = os.path.join(self.root, f".{version}.tmp")
+        os.makedirs(staging, exist_ok=True)
+        for runtime in RUNTIMES:
+            path = model_path_for(runtime, source)
+            if os.path.exists(path):
+                name = os.path.basename(model_path_for(runtime, self.model_path))
+                shutil.copy2(path, os.path.join(staging, name))
+        # Renames are atomic, so the watcher never sees a half-copied version
+        os.rename(staging, target)
+        if activate:
+            self.activate(version)
+        return target
+
+    def activate(self, version: str) -> None:
+        if version not in self.versions():
+            raise FileNotFoundError(f"Unknown model version {version}")
+        tmp = os.path.join(self.root, f".{CURRENT_FILE}.tmp")
+        with open(tmp, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp, os.path.join(self.root, CURRENT_FILE))
+
+
+class ModelManager:
+    """Loads registry versions in the background and swaps them in."""
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        runtime: str = INFERENCE_RUNTIME,
+        processes: int = INFERENCE_PROCESSES,
+        warmup_batch_sizes=PREDICT_WARMUP_BATCH_SIZES,
+    ):
+        self.registry = registry
+        self.runtime = runtime
+        self.processes = processes
+        self.warmup_batch_sizes = list(warmup_batch_sizes)
+        # Registry version being served (None: MODEL_PATH or nothing yet)
+        self.version: Optional[str] = None
+        self.loading: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.last_reload: Optional[dict] = None
+        self._lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+        self._retiring: Set[asyncio.Task] = set()
+        self._signature = None
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def _build(self, keras_path: str, timings: dict):
+        """Load and warm up an engine (blocking; runs off the event loop)"""
+        started = time.perf_counter()
+        if self.processes > 0:
+            model_path = model_path_for(self.runtime, keras_path)
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"Model not found at {model_path}")
+            engine = ProcessEnginePool(self.runtime, keras_path, self.processes)
+        else:
+            engine, model_path = load_engine(self.runtime, keras_path)
+        timings["load_seconds"] = round(time.perf_counter() - started, 3)
+        try:
+            if isinstance(engine, ProcessEnginePool):
+                # Starts the workers; each loads and warms up its own copy
+                started = time.perf_counter()
+                engine.warmup(self.warmup_batch_sizes)
+                timings["warmup_seconds"] = round(time.perf_counter() - started, 3)
+            else:
+                # One dummy forward pass per served batch size
+                warmup_ms = timings.setdefault("warmup_ms", {})
+                for size in self.warmup_batch_sizes:
+                    started = time.perf_counter()
+                    engine.warmup([size])
+                    warmup_ms[size] = round((time.perf_counter() - started) * 1000, 1)
+                timings["warmup_seconds"] = round(sum(warmup_ms.values()) / 1000, 3)
+        except BaseException:
+            if isinstance(engine, ProcessEnginePool):
+                engine.shutdown()
+            raise
+        return engine, model_path
+
+    async def load(self, version: Optional[str] = None) -> str:
+        """
+        Load a version (default: the selected one), warm it up and swap it in
+
+        Returns:
+            The model version string now served
+        """
+        async with self._lock:
+            if version is None:
+                version = self.registry.selected()
+            keras_path = self.registry.path_for(version)
+            self.loading = version or os.path.basename(keras_path)
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            timings: dict = {}
+            try:
+                engine, model_path = await loop.run_in_executor(
+                    None, self._build, keras_path, timings
+                )
+                model_version = await loop.run_in_executor(
+                    None, model_version_for, model_path, version
+                )
+            except Exception as e:
+                self.last_error = f"{self.loading}: {e}"
+                raise
+            finally:
+                self.loading = None
+
+            previous = predict.set_engine(engine, model_version, self.runtime)
+            if isinstance(engine, ProcessEnginePool):
+                predict.batcher.set_concurrency(
+                    engine.concurrency, engine.dispatch_executor
+                )
+            self.version = version
+            self.last_error = None
+            self.last_reload = {
+                "version": model_version,
+                "seconds": round(time.perf_counter() - started, 2),
+                **timings,
+                "at": datetime.now(timezone.utc).isoformat(),
+            }
+            print(
+                f"✅ Serving model {model_version} ({self.runtime}, "
+                f"{self.processes or 'in-process'} workers, warmed up batch "
+                f"sizes {self.warmup_batch_sizes})"
+            )
+        if previous is not None:
+            task = asyncio.create_task(self._retire(previous))
+            self._retiring.add(task)
+            task.add_done_callback(self._retiring.discard)
+        if timer.phase == "failed":
+            await self._recover()
+        return model_version
+
+    async def _recover(self) -> None:
+        """After a failed start, turn ready once the new model is warmed up"""
+        try:
+            with timer.measure("pipeline_warmup"):
+                await predict.warmup_pipeline()
+        except Exception as e:
+            timer.failed(str(e))
+            print(f"❌ Warm-up after reload failed: {e}")
+            return
+        timer.ready()
+
+    async def _retire(self, model) -> None:
+        """Release a replaced model once the requests pinned to it are done"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MODEL_DRAIN_TIMEOUT
+        while model.users > 0 and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if model.users > 0:
+            print(
+                f"⚠️  Releasing model {model.version} with {model.users} "
+                "requests still running"
+            )
+        if isinstance(model.engine, ProcessEnginePool):
+            await loop.run_in_executor(None, model.engine.shutdown)
+        print(f"♻️  Released model {model.version}")
+
+    async def _watch(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        self._signature = await loop.run_in_executor(None, self.registry.signature)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                signature = await loop.run_in_executor(
+                    None, self.registry.signature
+                )
+            except OSError:
+                continue  # a version being deleted while listing
+            if signature == self._signature or self.busy:
+                continue
+            self._signature = signature
+            selected = self.registry.selected()
+            if selected is None or selected == self.version:
+                continue
+            print(f"🔄 Model registry changed, loading version {selected}")
+            try:
+                await self.load(selected)
+            except Exception as e:
+                print(f"❌ Could not load model version {selected}: {e}")
+
+    def start_watching(self, interval: float = MODEL_WATCH_INTERVAL) -> None:
+        if interval > 0 and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch(interval))
+
+    async def stop(self) -> None:
+        """Stop watching and release the served model"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        # A reload in progress finishes first, so its engine is released too
+        async with self._lock:
+            model = predict.active
+            if model is not None and isinstance(model.engine, ProcessEnginePool):
+                model.engine.shutdown()
+        if self._retiring:
+            await asyncio.gather(*self._retiring)
+
+    @property
+    def stats(self) -> dict:
+        model = predict.active
+        return {
+            "active": model.version if model is not None else None,
+            "runtime": self.runtime,
+            "registry": self.registry.root,
+            "registry_version": self.version,
+            "versions": self.registry.versions(),
+            "selected": self.registry.selected(),
+            "loading": self.loading,
+            "last_reload": self.last_reload,
+            "last_error": self.last_error,
+        }
+
+
+registry = ModelRegistry()
+manager = ModelManager(registry)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the model registry")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish = commands.add_parser("publish", help="Add a model as a new version")
+    publish.add_argument("--source", default=MODEL_PATH)
+    publish.add_argument(
+        "--version", default=datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    )
+    publish.add_argument("--no-activate", action="store_true")
+    activate = commands.add_parser("activate", help="Serve an existing version")
+    activate.add_argument("version")
+    commands.add_parser("list", help="List versions")
+    args = parser.parse_args(argv)
+
+    if args.command == "publish":
+        target = registry.publish(args.source, args.version, not args.no_activate)
+        print(f"✅ Published {args.source} as version {args.version} ({target})")
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"✅ Version {args.version} will be served")
+    else:
+        selected = registry.selected()
+        for version in registry.versions():
+            print(f"{'*' if version == selected else ' '} {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Cache of prediction results keyed by image content.
+
+The same image reaches the service repeatedly (upload retries, duplicate
+uploads, tooling re-runs). Results are cached under a hash of the image
+bytes, the model version and the threshold, so a hot reload of the model or
+a different threshold never serves a stale mask. Values are the serialized
+response body (without the filename), kept in a byte-bounded in-memory LRU
+and, if PREDICT_CACHE_DIR is set, also written there so they survive
+restarts. Concurrent requests for the same key share one inference.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from .config import (
+    PREDICT_CACHE_MAX_BYTES,
+    PREDICT_CACHE_DIR,
+    PREDICT_CACHE_DISK_MAX_BYTES,
+)
+from .executor import executor
+
+
+def cache_key(image_bytes: bytes, model_version: str, threshold: float) -> str:
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    scoped = f"{model_version}|{threshold}|{digest}".encode("utf-8")
+    return hashlib.sha256(scoped).hexdigest()
+
+
+class ByteLRU:
+    """LRU cache of bytes values evicted by total size rather than count."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._items[key] = value
+        self._bytes += len(value)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._items),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class DiskStore:
+    """One file per key under `directory`, oldest pruned past max_bytes."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(
+            entry.stat().st_size for entry in os.scandir(directory) if entry.is_file()
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key: str, value: bytes) -> None:
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(value)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp, path)
+        self._bytes += len(value) - replaced
+        if self._bytes > self.max_bytes:
+            self._prune()
+
+    def _prune(self) -> None:
+        # Down to 90% so pruning doesn't run on every write
+        entries = sorted(
+            (e for e in os.scandir(self.directory) if e.is_file()),
+            key=lambda e: e.stat().st_mtime,
+        )
+        total = sum(e.stat().st_size for e in entries)
+        for entry in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._bytes = total
+
+
+def _log_write_failure(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️  Could not persist cached prediction: {task.exception()}")
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_bytes: int = PREDICT_CACHE_MAX_BYTES,
+        directory: str = PREDICT_CACHE_DIR,
+        disk_max_bytes: int = PREDICT_CACHE_DISK_MAX_BYTES,
+    ):
+        self.memory = ByteLRU(max_bytes)
+        self.disk = DiskStore(directory, disk_max_bytes) if directory else None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Cached result for key (memory, then disk), counting hits and misses"""
+        raw = self.memory.get(key)
+        if raw is not None:
+            self.hits += 1
+            return json.loads(raw)
+        if self.disk is not None:
+            raw = await executor.run(self.disk.read, key)
+            if raw is not None:
+                self.disk_hits += 1
+                self.memory.put(key, raw)
+                return json.loads(raw)
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: Dict) -> None:
+        raw = json.dumps(result).encode("utf-8")
+        self.memory.put(key, raw)
+        if self.disk is not None:
+            # Fire and forget; a failed write only costs a future miss
+            task = asyncio.ensure_future(executor.run(self.disk.write, key, raw))
+            task.add_done_callback(_log_write_failure)
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        """Return the cached result for key, running `compute()` once on a miss.
+
+        The lookup and `compute()` run in their own task, so a caller that is
+        cancelled (a client disconnecting) doesn't fail the others waiting
+        for the same key.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._get_or_compute(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task)
+
+    async def _get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        result = await self.get(key)
+        if result is None:
+            result = await compute()
+            self.put(key, result)
+        return result
+
+    def _finished(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark retrieved so waiter-less failures are not logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def stats(self) -> Dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            **self.memory.stats,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (
+                (self.hits + self.disk_hits) / lookups if lookups else None
+            ),
+            "disk_bytes": self.disk._bytes if self.disk is not None else None,
+        }
+
+
+cache = ResultCache()
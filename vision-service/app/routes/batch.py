@@ -0,0 +1,240 @@
+"""Batch prediction endpoint: many images per request, streamed results"""
+
+import asyncio
+import itertools
+import json
+import tarfile
+import tempfile
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile
+
+from . import predict
+from ..config import PREDICT_BATCH_CHUNK_SIZE, PREDICT_BATCH_MAX_FILES
+from ..executor import executor, Overloaded
+from ..batch_preprocessing import decode_reduced, normalize_batch
+from ..result_cache import cache as result_cache, cache_key
+
+router = APIRouter()
+
+TAR_CONTENT_TYPES = (
+    "application/x-tar",
+    "application/gzip",
+    "application/x-gzip",
+    "application/octet-stream",
+)
+
+
+def _iter_uploads(uploads):
+    for upload in uploads:
+        yield upload.filename, upload.file.read()
+
+
+def _iter_tar(tar):
+    for member in tar:
+        if not member.isfile():
+            continue
+        src = tar.extractfile(member)
+        if src is not None:
+            yield member.name, src.read()
+
+
+def _take(source, count):
+    return list(itertools.islice(source, count))
+
+
+def _prepare_chunk(items):
+    """Decode a chunk of (name, bytes); returns per-image entries and the batch"""
+    entries, decoded = [], []
+    for _, image_bytes in items:
+        try:
+            image, (width, height) = decode_reduced(image_bytes)
+        except Exception as e:
+            entries.append({"error": str(e)})
+            continue
+        entries.append({"width": width, "height": height})
+        decoded.append(image)
+    return entries, normalize_batch(decoded)
+
+
+def _encode_chunk(masks):
+    return [predict.encode_mask(mask) for mask in masks]
+
+
+def _keys(items, model_version):
+    return [
+        cache_key(image_bytes, model_version, predict.THRESHOLD)
+        for _, image_bytes in items
+    ]
+
+
+def _convert_masks(results, encoding):
+    return [predict.with_mask_encoding(result, encoding) for result in results]
+
+
+def _line(data):
+    return json.dumps(data) + "\n"
+
+
+async def _segment_chunk(items, model):
+    """Results for a chunk of (name, bytes) that missed the cache, in order"""
+    if not items:
+        return []
+    entries, batch = await executor.run(_prepare_chunk, items)
+    try:
+        # Through the shared batcher, so the model sees one forward pass
+        # per chunk and never runs concurrently with /api/predict
+        outputs = await asyncio.gather(
+            *(predict.batcher.submit(image, model.engine) for image in batch)
+        )
+        masks = [output[:, :, 0] for output in outputs]
+        encoded = iter(await executor.run(_encode_chunk, masks))
+        masks = iter(masks)
+    except Exception as e:
+        print(f"Error during batch prediction: {str(e)}")
+        for entry in entries:
+            entry.setdefault("error", f"Prediction failed: {str(e)}")
+
+    results = []
+    for entry in entries:
+        if "error" in entry:
+            results.append({"success": False, "error": entry["error"]})
+            continue
+        mask_base64, segmented_area = next(encoded)
+        results.append(
+            predict.prediction_result(
+                mask_base64,
+                segmented_area,
+                next(masks).shape,
+                entry["width"],
+                entry["height"],
+                model.version,
+            )
+        )
+    return results
+
+
+async def _stream(source, model, encoding):
+    """Yield one NDJSON line per image, a chunk at a time"""
+    index = 0
+    while True:
+        try:
+            items = await executor.run(_take, source, PREDICT_BATCH_CHUNK_SIZE)
+        except tarfile.TarError as e:
+            yield _line({"success": False, "error": f"Invalid tar archive: {e}"})
+            return
+        if not items:
+            return
+
+        # Images seen before are answered from the result cache
+        keys = await executor.run(_keys, items, model.version)
+        cached = [await result_cache.get(key) for key in keys]
+        misses = [item for item, hit in zip(items, cached) if hit is None]
+        fresh = iter(await _segment_chunk(misses, model))
+
+        results = []
+        for key, hit in zip(keys, cached):
+            result = hit
+            if result is None:
+                result = next(fresh)
+                if result["success"]:
+                    result_cache.put(key, result)
+            results.append(result)
+        if encoding != "png":
+            results = await executor.run(_convert_masks, results, encoding)
+
+        for (name, _), result in zip(items, results):
+            yield _line({"index": index, "filename": name, **result})
+            index += 1
+
+
+async def _open_source(request: Request):
+    """(iterator of (name, bytes), async close) for a multipart or tar body"""
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=PREDICT_BATCH_MAX_FILES)
+        uploads = [
+            upload
+            for upload in form.getlist("files")
+            if isinstance(upload, UploadFile) and upload.filename
+        ]
+        if not uploads:
+            await form.close()
+            raise HTTPException(status_code=400, detail="No files in request")
+        return _iter_uploads(uploads), form.close
+
+    if content_type in TAR_CONTENT_TYPES:
+        spool = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+        try:
+            async for chunk in request.stream():
+                spool.write(chunk)
+            spool.seek(0)
+            # Read sequentially ('r|*'): no seeking, compression auto-detected
+            tar = await executor.run(tarfile.open, None, "r|*", spool)
+        except tarfile.TarError as e:
+            spool.close()
+            raise HTTPException(status_code=400, detail=f"Invalid tar archive: {e}")
+        except BaseException:
+            spool.close()
+            raise
+
+        async def close():
+            tar.close()
+            spool.close()
+
+        return _iter_tar(tar), close
+
+    raise HTTPException(
+        status_code=415,
+        detail="Expected multipart/form-data or application/x-tar body",
+    )
+
+
+@router.post("/predict/batch")
+async def predict_batch(request: Request):
+    """
+    Predict segmentations for many images in one request
+
+    Accepts a multipart form with repeated `files` fields, or a tar stream
+    (`application/x-tar`, optionally gzip'd) of images. Images are decoded
+    and preprocessed a chunk at a time, run through the model together, and
+    one JSON line per image (same fields as /api/predict plus `index`, or
+    `success: false` with an `error`) is streamed back as each chunk
+    completes. `?mask_encoding=` (or Accept) selects the mask encoding as
+    for /api/predict.
+    """
+    encoding = predict.requested_encoding(
+        request.query_params.get("mask_encoding"), request.headers.get("accept")
+    )
+    if predict.active is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+
+    try:
+        executor.acquire()
+    except Overloaded:
+        raise predict.overloaded_error()
+
+    try:
+        source, close = await _open_source(request)
+    except BaseException:
+        executor.release()
+        raise
+
+    # The whole stream is served by one model, even across a hot reload
+    model = predict.active.acquire()
+
+    async def cleanup():
+        # Runs once the response is finished, also if the client went away
+        model.release()
+        executor.release()
+        await close()
+
+    return StreamingResponse(
+        _stream(source, model, encoding),
+        media_type="application/x-ndjson",
+        headers={"X-Model-Version": model.version},
+        background=BackgroundTask(cleanup),
+    )
@@ -0,0 +1,30 @@
+"""Liveness and readiness probes"""
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from . import predict
+from ..lifecycle import timer
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def liveness():
+    """The process is up and its event loop responds (no model needed)"""
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def readiness():
+    """200 once the model is loaded and warmed up, 503 (with the phase) before"""
+    model = predict.active
+    # A model may be active after a failed start (the prediction path failed
+    # its warm-up); the timer only turns ready once a warm-up succeeds
+    ready = model is not None and timer.phase == "ready"
+    body = {
+        "ready": ready,
+        "model_version": model.version if model is not None else None,
+        "startup": timer.stats,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
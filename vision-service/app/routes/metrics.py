@@ -0,0 +1,29 @@
+"""Operational metrics for the vision service"""
+
+from fastapi import APIRouter
+
+from . import predict
+from ..config import INFERENCE_PROCESSES, INFERENCE_RUNTIME
+from ..executor import executor
+from ..lifecycle import timer
+from ..result_cache import cache as result_cache
+from ..threads import thread_settings
+from ..workers import ProcessEnginePool
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Return micro-batching histograms, pool load, cache counters and threads."""
+    metrics = {
+        "batching": predict.batcher.stats,
+        "executor": executor.stats,
+        "result_cache": result_cache.stats,
+        "threads": thread_settings(INFERENCE_RUNTIME, INFERENCE_PROCESSES),
+        "startup": timer.stats,
+    }
+    model = predict.active
+    if model is not None and isinstance(model.engine, ProcessEnginePool):
+        metrics["model_workers"] = model.engine.stats
+    return metrics
@@ -0,0 +1,53 @@
+"""Model registry and hot reload endpoints"""
+
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from ..registry import manager, registry
+
+router = APIRouter()
+
+# Reload started by the endpoint (the watcher reloads through the manager)
+_reload_task: Optional[asyncio.Task] = None
+
+
+class ReloadRequest(BaseModel):
+    # Registry version to load (default: CURRENT, or the newest)
+    version: Optional[str] = None
+
+
+@router.get("/models")
+async def list_models():
+    """Served model, registry versions and the state of the last reload"""
+    return manager.stats
+
+
+async def _reload(version):
+    try:
+        await manager.load(version)
+    except Exception as e:
+        print(f"❌ Could not load model version {version}: {e}")
+
+
+@router.post("/models/reload", status_code=202)
+async def reload_model(request: Optional[ReloadRequest] = None):
+    """
+    Load a model version in the background and swap it in when warmed up
+
+    The current model keeps serving until then; requests already running
+    finish on it. Poll GET /api/models for the outcome.
+    """
+    version = request.version if request is not None else None
+    if version is None:
+        version = registry.selected()
+    elif version not in registry.versions():
+        raise HTTPException(status_code=404, detail=f"Unknown version {version}")
+    global _reload_task
+    if manager.busy or (_reload_task is not None and not _reload_task.done()):
+        raise HTTPException(status_code=409, detail="A reload is already running")
+
+    _reload_task = asyncio.create_task(_reload(version))
+    return {"status": "loading", "version": version}
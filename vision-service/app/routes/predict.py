@@ -1,38 +1,188 @@
 """Prediction endpoint for thyroid segmentation"""
 
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi import APIRouter, File, UploadFile, HTTPException, Header, Query, Response
+from typing import Optional
+from contextlib import contextmanager
 import numpy as np
 import cv2
 import base64
 from io import BytesIO
-from ..preprocessing import prepare_image_for_prediction
+from ..batch_preprocessing import decode_reduced, normalize_batch
+from ..batcher import PredictionBatcher
+from ..executor import executor, Overloaded
+from ..lifecycle import timer
+from .. import mask_codecs
+from ..result_cache import cache as result_cache, cache_key
+from ..threads import max_batch_size
 
 router = APIRouter()
 
-# Global variable to hold the model (loaded on startup)
-model = None
 
+class LoadedModel:
+    """An inference engine with the version and runtime it serves"""
 
-def set_model(loaded_model):
-    """Set the global model instance"""
-    global model
-    model = loaded_model
+    def __init__(self, engine, version, runtime):
+        self.engine = engine
+        self.version = version
+        self.runtime = runtime
+        # Requests (and batch streams) still using this model
+        self.users = 0
+
+    def acquire(self):
+        self.users += 1
+        return self
+
+    def release(self):
+        self.users -= 1
+
+
+# The model serving new requests (loaded on startup, replaced by hot reloads)
+active = None
+
+
+def set_engine(new_engine, version="unknown", runtime_name="keras"):
+    """
+    Switch new requests to an engine (already warmed up) in one assignment
+
+    Returns:
+        The previously active LoadedModel (None on first load); requests
+        that pinned it keep using it until they finish
+    """
+    global active
+    previous = active
+    active = LoadedModel(new_engine, version, runtime_name)
+    return previous
+
+
+@contextmanager
+def use_model():
+    """Pin the active model for one request, so a reload can't change it midway"""
+    if active is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    model = active.acquire()
+    try:
+        yield model
+    finally:
+        model.release()
+
+
+def _predict_batch(engine, images):
+    """Forward pass for a stacked batch of preprocessed images"""
+    return engine.predict(images)
+
+
+# Concurrent requests share forward passes (started on app startup)
+batcher = PredictionBatcher(
+    _predict_batch, max_batch_size=max_batch_size(), executor=executor.pool
+)
+
+THRESHOLD = 0.5
+
+
+def _decode(image_bytes):
+    """Decode and preprocess upload bytes (runs on the prediction pool)"""
+    decoded, (image_width, image_height) = decode_reduced(image_bytes)
+    return normalize_batch([decoded]), image_width, image_height
+
+
+def encode_mask(mask):
+    """Threshold a probability mask and PNG/base64-encode it (prediction pool)"""
+    binary_mask = (mask > THRESHOLD).astype(np.uint8) * 255
+    _, buffer = cv2.imencode(".png", binary_mask)
+    mask_base64 = base64.b64encode(buffer).decode("utf-8")
+    segmented_area = int(np.count_nonzero(binary_mask))
+    return mask_base64, segmented_area
+
+
+def prediction_result(
+    mask_base64, segmented_area, mask_shape, image_width, image_height, version
+):
+    """Response body for one segmented image (callers add the filename)"""
+    total_area = mask_shape[0] * mask_shape[1]
+    coverage_percent = (segmented_area / total_area) * 100
+    return {
+        "success": True,
+        "mask_base64": mask_base64,
+        "model_version": version,
+        "image_width": int(image_width),
+        "image_height": int(image_height),
+        "statistics": {
+            "segmented_pixels": int(segmented_area),
+            "total_pixels": int(total_area),
+            "coverage_percent": round(coverage_percent, 2),
+            "threshold_used": THRESHOLD,
+        },
+    }
+
+
+def requested_encoding(mask_encoding: Optional[str], accept: Optional[str]) -> str:
+    """Requested mask encoding (query parameter, else Accept header); 400 if unknown"""
+    try:
+        return mask_codecs.negotiate(mask_encoding, accept)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def with_mask_encoding(result, encoding):
+    """
+    Replace the PNG `mask_base64` of a result by `mask` in another encoding
+    (results are cached as PNG, so every encoding shares one cache entry)
+    """
+    if encoding == "png" or "mask_base64" not in result:
+        return result
+    mask = mask_codecs.decode_png(base64.b64decode(result["mask_base64"]))
+    converted = {k: v for k, v in result.items() if k != "mask_base64"}
+    converted["mask"] = mask_codecs.encode(mask, encoding)
+    return converted
 
 
 @router.post("/predict")
-async def predict_segmentation(file: UploadFile = File(...)):
+async def predict_segmentation(
+    response: Response,
+    file: UploadFile = File(...),
+    mask_encoding: Optional[str] = Query(
+        None, description="png | rle | bitpacked | polygons"
+    ),
+    accept: Optional[str] = Header(None),
+):
     """
     Predict thyroid nodule segmentation from uploaded image
 
     Args:
         file: Uploaded image file
+        mask_encoding: png (default, `mask_base64`), or rle, bitpacked,
+            polygons (returned as `mask`, see app/mask_codecs.py); also
+            selectable with an Accept header of mask_codecs.MEDIA_TYPES
 
     Returns:
         JSON with segmentation mask and metadata
     """
-    if model is None:
+    encoding = requested_encoding(mask_encoding, accept)
+    if active is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
 
+    try:
+        with executor.admit(), use_model() as model:
+            response.headers["X-Model-Version"] = model.version
+            result = await _predict(file, model)
+            timer.first_prediction()
+            if encoding != "png":
+                result = await executor.run(with_mask_encoding, result, encoding)
+            return result
+    except Overloaded:
+        raise overloaded_error()
+
+
+def overloaded_error():
+    return HTTPException(
+        status_code=503,
+        detail="Prediction queue is full, please retry",
+        headers={"Retry-After": str(executor.retry_after)},
+    )
+
+
+async def _predict(file: UploadFile, model: LoadedModel):
+    """Serve one upload from the result cache, or segment it"""
     try:
         # Read image bytes
         image_bytes = await file.read()
@@ -40,49 +190,63 @@ async def predict_segmentation(file: UploadFile = File(...)):
         # Log receipt
         print(f"Received image: {file.filename}, size: {len(image_bytes)} bytes")
 
-        # Preprocess image
-        processed_image = prepare_image_for_prediction(image_bytes)
+        key = await executor.run(cache_key, image_bytes, model.version, THRESHOLD)
+        result = await result_cache.get_or_compute(
+            key, lambda: _segment(image_bytes, model)
+        )
+        return {"filename": file.filename, **result}
 
-        # Run prediction
-        prediction = model.predict(processed_image, verbose=0)
+    except Exception as e:
+        print(f"Error during prediction: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
-        # Get the mask (remove batch and channel dimensions)
-        mask = prediction[0, :, :, 0]
 
-        # Apply threshold to get binary mask
-        threshold = 0.5
-        binary_mask = (mask > threshold).astype(np.uint8) * 255
+async def _segment(image_bytes, model):
+    """Decode, predict and encode one image; blocking steps run off the loop"""
+    # Decode and preprocess image
+    processed_image, image_width, image_height = await executor.run(
+        _decode, image_bytes
+    )
 
-        # Encode mask as base64 for transmission
-        _, buffer = cv2.imencode(".png", binary_mask)
-        mask_base64 = base64.b64encode(buffer).decode("utf-8")
+    # Run prediction (batched with concurrent requests)
+    prediction = await batcher.submit(processed_image[0], model.engine)
 
-        # Calculate some basic statistics
-        segmented_area = np.sum(mask > threshold)
-        total_area = mask.shape[0] * mask.shape[1]
-        coverage_percent = (segmented_area / total_area) * 100
+    # Get the mask (remove channel dimension)
+    mask = prediction[:, :, 0]
 
-        return {
-            "success": True,
-            "filename": file.filename,
-            "mask_base64": mask_base64,
-            "statistics": {
-                "segmented_pixels": int(segmented_area),
-                "total_pixels": int(total_area),
-                "coverage_percent": round(coverage_percent, 2),
-                "threshold_used": threshold,
-            },
-        }
+    # Threshold and encode mask as base64 for transmission
+    mask_base64, segmented_area = await executor.run(encode_mask, mask)
 
-    except Exception as e:
-        print(f"Error during prediction: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+    return prediction_result(
+        mask_base64,
+        segmented_area,
+        mask.shape,
+        image_width,
+        image_height,
+        model.version,
+    )
+
+
+async def warmup_pipeline():
+    """
+    Segment one synthetic image end to end (decode, batcher, model, encode),
+    bypassing the result cache, so the first real request finds every
+    thread pool and codec initialized
+    """
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (256, 256), dtype=np.uint8)
+    _, buffer = cv2.imencode(".png", image)
+    with use_model() as model:
+        await _segment(buffer.tobytes(), model)
 
 
 @router.get("/health")
 async def health_check():
     """Check if model is loaded and service is ready"""
+    model = active
     return {
         "status": "healthy" if model is not None else "model_not_loaded",
         "model_loaded": model is not None,
+        "model_version": model.version if model is not None else None,
+        "runtime": model.runtime if model is not None else None,
     }
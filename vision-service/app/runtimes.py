@@ -0,0 +1,160 @@
+"""Inference runtimes the service can serve from.
+
+INFERENCE_RUNTIME selects one of
+
+- `keras`: the trained `.keras` model through InferenceEngine (full TensorFlow)
+- `tflite_fp16`: `<model>_fp16.tflite`, float16 weights
+- `tflite_int8`: `<model>_int8.tflite`, int8 weights and activations
+
+The TFLite files are produced by `export_tflite.py` next to the Keras model.
+They run on the `tflite_runtime` interpreter when it is installed, so the
+service does not import TensorFlow at all; otherwise `tf.lite` is used.
+Every engine exposes the same `predict(images)` / `warmup(batch_sizes)`,
+and runs on the thread pools resolved by `app.threads`.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from .config import INFERENCE_PROCESSES
+from .threads import configure_tensorflow, thread_settings
+
+RUNTIMES = ("keras", "tflite_fp16", "tflite_int8")
+
+
+def model_path_for(runtime, keras_path):
+    """Path of the model file a runtime serves, derived from the Keras path"""
+    if runtime == "keras":
+        return keras_path
+    suffix = runtime.split("_", 1)[1]
+    return f"{os.path.splitext(keras_path)[0]}_{suffix}.tflite"
+
+
+def model_version_for(model_path, name=None):
+    """
+    Identify a model file by name and content hash, e.g.
+    `thyroid_unet_model@3f2a9c1be4d0`, so predictions can be traced back to
+    the exact weights that produced them. `name` defaults to the file name
+    (registry models use their version directory).
+    """
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    if name is None:
+        name = os.path.splitext(os.path.basename(model_path))[0]
+    return f"{name}@{digest.hexdigest()[:12]}"
+
+
+def _interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteEngine:
+    """
+    Forward pass on a TFLite interpreter.
+
+    Batches are padded to the next power of two so at most a handful of
+    interpreters (one per padded size, each with its own tensor arena) are
+    ever allocated. Quantized inputs and outputs are converted with the
+    scale / zero point stored in the model.
+    """
+
+    def __init__(self, model_path, num_threads=1):
+        self.path = model_path
+        self.num_threads = num_threads
+        with open(model_path, "rb") as f:
+            self._model_content = f.read()
+        self._Interpreter = _interpreter_class()
+        self._interpreters = {}
+        probe = self._Interpreter(model_content=self._model_content)
+        self.input_shape = tuple(probe.get_input_details()[0]["shape"][1:])
+        self.warm_batch_sizes = []
+
+    def _interpreter(self, batch_size):
+        interpreter = self._interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = self._Interpreter(
+                model_content=self._model_content, num_threads=self.num_threads
+            )
+            index = interpreter.get_input_details()[0]["index"]
+            interpreter.resize_tensor_input(index, (batch_size,) + self.input_shape)
+            interpreter.allocate_tensors()
+            self._interpreters[batch_size] = interpreter
+        return interpreter
+
+    def predict(self, images):
+        """
+        Run a batch through the model
+
+        Args:
+            images: numpy array of shape (N, 128, 128, 1)
+
+        Returns:
+            numpy float32 array of shape (N, 128, 128, 1)
+        """
+        images = np.asarray(images, dtype=np.float32)
+        n = len(images)
+        padded = 1 << (n - 1).bit_length()
+        if padded != n:
+            pad = np.zeros((padded - n,) + images.shape[1:], dtype=np.float32)
+            images = np.concatenate([images, pad])
+
+        interpreter = self._interpreter(padded)
+        inp = interpreter.get_input_details()[0]
+        out = interpreter.get_output_details()[0]
+
+        if inp["dtype"] != np.float32:
+            scale, zero_point = inp["quantization"]
+            info = np.iinfo(inp["dtype"])
+            images = np.clip(np.round(images / scale + zero_point), info.min, info.max)
+            images = images.astype(inp["dtype"])
+        interpreter.set_tensor(inp["index"], images)
+        interpreter.invoke()
+        result = interpreter.get_tensor(out["index"])
+        if out["dtype"] != np.float32:
+            scale, zero_point = out["quantization"]
+            result = (result.astype(np.float32) - zero_point) * scale
+        return result[:n]
+
+    def warmup(self, batch_sizes=(1,)):
+        """Allocate the interpreter for each batch size and run it once"""
+        for size in batch_sizes:
+            self.predict(np.zeros((size,) + self.input_shape, dtype=np.float32))
+            self.warm_batch_sizes.append(size)
+
+
+def load_engine(runtime, keras_path, processes=INFERENCE_PROCESSES):
+    """
+    Load the engine for a runtime
+
+    Args:
+        runtime: One of RUNTIMES
+        keras_path: Path of the Keras model (TFLite paths are derived from it)
+        processes: Model processes sharing the CPUs, for thread sizing
+
+    Returns:
+        (engine, path of the model file it serves)
+    """
+    if runtime not in RUNTIMES:
+        raise ValueError(
+            f"Unknown INFERENCE_RUNTIME {runtime!r}, expected one of {RUNTIMES}"
+        )
+    path = model_path_for(runtime, keras_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model not found at {path}")
+    threads = thread_settings(runtime, processes)
+    if runtime == "keras":
+        from .model import InferenceEngine, load_model
+
+        configure_tensorflow(threads)
+        return InferenceEngine(load_model(path)), path
+    return TFLiteEngine(path, num_threads=threads["intra_op"]), path
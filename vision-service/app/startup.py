@@ -1,10 +1,14 @@
-"""Startup script - downloads data and trains model if needed"""
+"""Startup script - downloads data and trains model if needed
+
+Run as `python -m app.startup` from /app (see the Dockerfile).
+"""
 
 import os
 import sys
 import subprocess
 
-MODEL_PATH = "/app/models/thyroid_unet_model.keras"
+from .config import INFERENCE_RUNTIME, MODEL_PATH
+from .runtimes import RUNTIMES, model_path_for
 
 
 def check_and_train():
@@ -42,6 +46,32 @@ def check_and_train():
         return False
 
 
+def check_and_export():
+    """Export TFLite models if a TFLite runtime is selected and they are missing"""
+    if INFERENCE_RUNTIME not in RUNTIMES:
+        print(
+            f"❌ Unknown INFERENCE_RUNTIME {INFERENCE_RUNTIME!r}, "
+            f"expected one of {RUNTIMES}"
+        )
+        return False
+    if INFERENCE_RUNTIME == "keras" or not os.path.exists(MODEL_PATH):
+        return True
+
+    tflite_path = model_path_for(INFERENCE_RUNTIME, MODEL_PATH)
+    if os.path.exists(tflite_path):
+        return True
+
+    print(f"📦 {tflite_path} missing, exporting TFLite models...")
+    try:
+        subprocess.run(
+            [sys.executable, "/app/export_tflite.py"], check=True, cwd="/app"
+        )
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Export failed: {e}")
+        return False
+
+
 if __name__ == "__main__":
-    success = check_and_train()
+    success = check_and_train() and check_and_export()
     sys.exit(0 if success else 1)
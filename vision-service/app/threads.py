@@ -0,0 +1,169 @@
+"""CPU thread pools of the forward pass, sized to the container.
+
+`os.cpu_count()` reports the host's cores, so unconfigured TensorFlow starts
+one intra-op thread per host core even in a container limited to two CPUs,
+and concurrent batches are throttled by the CFS quota. Thread counts are
+resolved per process, in order of precedence:
+
+1. TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS / TFLITE_NUM_THREADS
+2. INFERENCE_AUTOTUNE_FILE (written by `python -m app.autotune`), if it was
+   tuned for the same runtime, CPU budget and number of model processes
+3. the CPU budget (cgroup quota and CPU affinity) split among the
+   INFERENCE_PROCESSES model workers
+
+The autotune file also records the batch size with the highest throughput.
+Unless PREDICT_MAX_BATCH_SIZE is set, the batcher caps batches at it.
+"""
+
+import json
+import os
+from functools import lru_cache
+
+from .config import (
+    INFERENCE_AUTOTUNE_FILE,
+    INFERENCE_PROCESSES,
+    INFERENCE_RUNTIME,
+    PREDICT_MAX_BATCH_SIZE,
+    PREDICT_MAX_BATCH_SIZE_PINNED,
+    PREDICT_WORKERS,
+    TF_INTER_OP_THREADS,
+    TF_INTRA_OP_THREADS,
+    TFLITE_NUM_THREADS,
+)
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+def cgroup_cpu_quota(root=CGROUP_ROOT):
+    """CPUs allowed by the cgroup (v2 `cpu.max` or v1 CFS quota), None if unlimited"""
+    try:
+        quota, period = _read(os.path.join(root, "cpu.max")).split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    for controller in ("cpu", "cpu,cpuacct"):
+        try:
+            quota = int(_read(os.path.join(root, controller, "cpu.cfs_quota_us")))
+            period = int(_read(os.path.join(root, controller, "cpu.cfs_period_us")))
+        except (OSError, ValueError):
+            continue
+        return quota / period if quota > 0 and period > 0 else None
+    return None
+
+
+def cpu_budget():
+    """Whole CPUs this process may use (affinity mask, capped by the quota)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        # Rounded down: a thread per fractional CPU only gets throttled
+        cpus = min(cpus, max(1, int(quota)))
+    return cpus
+
+
+def load_autotune(path, runtime, cpus, processes):
+    """Tuned settings from `path`, or None if missing or tuned for another setup"""
+    try:
+        with open(path) as f:
+            tuned = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Ignoring autotune file {path}: {e}")
+        return None
+    expected = {"runtime": runtime, "cpus": cpus, "processes": processes}
+    found = {key: tuned.get(key) for key in expected}
+    if found != expected:
+        print(
+            f"⚠️  Ignoring autotune file {path}: tuned for {found}, "
+            f"running with {expected}"
+        )
+        return None
+    return tuned
+
+
+@lru_cache(maxsize=None)
+def tuned_settings(runtime=INFERENCE_RUNTIME, processes=INFERENCE_PROCESSES):
+    """INFERENCE_AUTOTUNE_FILE if it matches this setup, else None (read once)"""
+    return load_autotune(INFERENCE_AUTOTUNE_FILE, runtime, cpu_budget(), processes)
+
+
+@lru_cache(maxsize=None)
+def thread_settings(runtime=INFERENCE_RUNTIME, processes=INFERENCE_PROCESSES):
+    """
+    Resolve the thread pools of one model process
+
+    Args:
+        runtime: Inference runtime (keras, tflite_fp16, tflite_int8)
+        processes: Model worker processes sharing the CPUs (0: in-process)
+
+    Returns:
+        dict with cpus, intra_op, inter_op and source
+    """
+    cpus = cpu_budget()
+    per_process = max(1, cpus // max(1, processes))
+    # Model workers run one batch at a time; in-process, up to
+    # PREDICT_WORKERS batches may be in flight
+    concurrent = 1 if processes > 0 else PREDICT_WORKERS
+    settings = {
+        "cpus": cpus,
+        "intra_op": per_process,
+        "inter_op": max(1, min(concurrent, per_process)),
+        "source": "cpu quota",
+    }
+
+    tuned = tuned_settings(runtime, processes)
+    if tuned is not None:
+        settings["intra_op"] = int(tuned["intra_op"])
+        settings["inter_op"] = int(tuned["inter_op"])
+        settings["source"] = INFERENCE_AUTOTUNE_FILE
+
+    intra = TFLITE_NUM_THREADS if runtime.startswith("tflite") else TF_INTRA_OP_THREADS
+    if intra > 0:
+        settings["intra_op"] = intra
+        settings["source"] = "environment"
+    if TF_INTER_OP_THREADS > 0:
+        settings["inter_op"] = TF_INTER_OP_THREADS
+        settings["source"] = "environment"
+
+    print(
+        f"⚙️  Inference threads: intra-op {settings['intra_op']}, inter-op "
+        f"{settings['inter_op']} ({cpus} CPUs, from {settings['source']})"
+    )
+    return settings
+
+
+def max_batch_size(runtime=INFERENCE_RUNTIME, processes=INFERENCE_PROCESSES):
+    """
+    Largest batch the batcher forms
+
+    Returns:
+        The autotuned best batch size (at most PREDICT_MAX_BATCH_SIZE), or
+        PREDICT_MAX_BATCH_SIZE if it is set explicitly or nothing was tuned
+    """
+    tuned = tuned_settings(runtime, processes)
+    if PREDICT_MAX_BATCH_SIZE_PINNED or not tuned or not tuned.get("best_batch_size"):
+        return PREDICT_MAX_BATCH_SIZE
+    size = min(int(tuned["best_batch_size"]), PREDICT_MAX_BATCH_SIZE)
+    print(f"⚙️  Batches capped at {size} images (from {INFERENCE_AUTOTUNE_FILE})")
+    return size
+
+
+def configure_tensorflow(settings):
+    """Apply thread settings to TensorFlow (before it runs its first op)"""
+    import tensorflow as tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(settings["intra_op"])
+        tf.config.threading.set_inter_op_parallelism_threads(settings["inter_op"])
+    except RuntimeError as e:
+        # The runtime is already initialized in this process
+        print(f"⚠️  Could not set TensorFlow thread pools: {e}")
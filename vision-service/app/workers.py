@@ -0,0 +1,373 @@
+"""Model worker processes fed through shared-memory rings.
+
+With INFERENCE_PROCESSES=N the front (uvicorn) process still decodes,
+batches and encodes, but forward passes run in N worker processes, each
+with its own copy of the model and its own interpreter lock, so inference
+scales across cores and a slow or crashed forward pass only affects the
+batch it was running.
+
+Every worker owns one shared-memory block split into INFERENCE_RING_SLOTS
+slots of PREDICT_MAX_BATCH_SIZE images, with an input and an output half.
+The front copies a batch into a free slot and sends the worker only
+`(seq, slot, n)` over a queue; the worker writes the masks into the same
+slot's output half and answers `(worker, generation, seq, error)`. With two or more
+slots the next batch is staged while the current one is computed.
+
+A supervisor thread restarts workers that exit; the batches they had in
+flight fail with an error instead of hanging. Batches only go to workers
+that are up, and fail at once if none is. A worker that keeps failing (its
+model doesn't load, or it exits before finishing a batch) is restarted with
+exponential backoff, and a worker that doesn't answer a batch within
+INFERENCE_WORKER_TIMEOUT is killed and restarted.
+"""
+
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    INFERENCE_RING_SLOTS,
+    INFERENCE_WORKER_TIMEOUT,
+    PREDICT_MAX_BATCH_SIZE,
+)
+
+INPUT_SHAPE = (128, 128, 1)
+SUPERVISE_INTERVAL = 0.5
+# Delay before restarting a worker after consecutive failures: doubles from
+# RESTART_BACKOFF up to RESTART_BACKOFF_MAX seconds
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 60.0
+
+# Model loading needs TensorFlow / TFLite, neither of which is fork-safe
+_ctx = mp.get_context("spawn")
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _ring_arrays(buf, slots: int, capacity: int) -> Tuple[np.ndarray, np.ndarray]:
+    shape = (slots, capacity) + INPUT_SHAPE
+    inputs = np.ndarray(shape, dtype=np.float32, buffer=buf)
+    outputs = np.ndarray(shape, dtype=np.float32, buffer=buf, offset=inputs.nbytes)
+    return inputs, outputs
+
+
+def _worker_main(
+    worker_id,
+    generation,
+    runtime,
+    model_path,
+    processes,
+    shm_name,
+    slots,
+    capacity,
+    warmup,
+    requests,
+    responses,
+):
+    """Entry point of a model worker process."""
+    from .runtimes import load_engine
+
+    # Spawned children share the front process's resource tracker, which
+    # unlinks the block if the front process dies without shutdown()
+    shm = SharedMemory(name=shm_name)
+    inputs, outputs = _ring_arrays(shm.buf, slots, capacity)
+
+    try:
+        engine, _ = load_engine(runtime, model_path, processes)
+        engine.warmup(warmup)
+    except Exception as e:
+        responses.put((worker_id, generation, None, f"Could not load model: {e}"))
+        return
+    responses.put((worker_id, generation, None, None))
+
+    try:
+        while True:
+            message = requests.get()
+            if message is None:
+                break
+            seq, slot, n = message
+            try:
+                outputs[slot, :n] = engine.predict(inputs[slot, :n])
+                responses.put((worker_id, generation, seq, None))
+            except Exception as e:
+                responses.put((worker_id, generation, seq, repr(e)))
+    finally:
+        del inputs, outputs
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, worker_id: int, slots: int, capacity: int):
+        self.id = worker_id
+        nbytes = 2 * slots * capacity * int(np.prod(INPUT_SHAPE)) * 4
+        self.shm = SharedMemory(create=True, size=nbytes)
+        self.inputs, self.outputs = _ring_arrays(self.shm.buf, slots, capacity)
+        self.free: "queue.Queue[int]" = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.process: Optional[mp.Process] = None
+        self.requests = None
+        self.ready = threading.Event()
+        # Set when the worker could not load the model (until it is restarted)
+        self.error: Optional[str] = None
+        self.outstanding = 0
+        self.completed = 0
+        self.restarts = 0
+        # Restarts since the worker last finished a batch, and when the next
+        # restart may happen (None while the current process hasn't exited)
+        self.failures = 0
+        self.restart_at: Optional[float] = None
+
+    @property
+    def available(self) -> bool:
+        """Loaded and running, so batches sent to it will be answered"""
+        return (
+            self.ready.is_set()
+            and self.error is None
+            and self.process is not None
+            and self.process.is_alive()
+        )
+
+
+class ProcessEnginePool:
+    """Engine (`predict` / `warmup`) backed by model worker processes."""
+
+    def __init__(
+        self,
+        runtime: str,
+        model_path: str,
+        processes: int,
+        slots: int = INFERENCE_RING_SLOTS,
+        capacity: int = PREDICT_MAX_BATCH_SIZE,
+    ):
+        self.runtime = runtime
+        self.model_path = model_path
+        self.slots = max(1, slots)
+        self.capacity = max(1, capacity)
+        self.warmup_sizes: List[int] = []
+        self._workers = [
+            _Worker(i, self.slots, self.capacity) for i in range(max(1, processes))
+        ]
+        self._responses = _ctx.Queue()
+        self._pending: Dict[int, Tuple[Future, _Worker]] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = False
+        # Batcher threads that wait on the workers: one per ring slot
+        self.concurrency = len(self._workers) * self.slots
+        self.dispatch_executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="dispatch"
+        )
+        self._threads: List[threading.Thread] = []
+
+    def _spawn(self, worker: _Worker) -> None:
+        with self._lock:
+            worker.ready.clear()
+            worker.error = None
+            worker.restart_at = None
+            worker.requests = _ctx.Queue()
+        worker.process = _ctx.Process(
+            target=_worker_main,
+            args=(
+                worker.id,
+                worker.restarts,
+                self.runtime,
+                self.model_path,
+                len(self._workers),
+                worker.shm.name,
+                self.slots,
+                self.capacity,
+                self.warmup_sizes,
+                worker.requests,
+                self._responses,
+            ),
+            name=f"model-worker-{worker.id}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    def warmup(self, batch_sizes=(1,), timeout: float = 600.0) -> None:
+        """Start the workers (each loads and warms up its model) and wait for them"""
+        self.warmup_sizes = [s for s in batch_sizes if s <= self.capacity]
+        for worker in self._workers:
+            self._spawn(worker)
+        for target in (self._collect, self._supervise):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            if not worker.ready.wait(max(0.0, deadline - time.monotonic())):
+                raise RuntimeError(f"Model worker {worker.id} did not start")
+            if worker.error is not None:
+                raise RuntimeError(f"Model worker {worker.id}: {worker.error}")
+
+    def _collect(self) -> None:
+        """Route worker answers to the waiting predict() calls."""
+        while True:
+            message = self._responses.get()
+            if message is None:
+                return
+            worker_id, generation, seq, error = message
+            if seq is None:
+                worker = self._workers[worker_id]
+                if generation != worker.restarts:
+                    continue  # from a process that has been replaced
+                if error is not None:
+                    print(f"❌ Model worker {worker_id}: {error}")
+                    worker.error = error
+                worker.ready.set()
+                continue
+            with self._lock:
+                entry = self._pending.pop(seq, None)
+            if entry is None:
+                continue  # failed already (the worker was restarted)
+            future, worker = entry
+            if error is None:
+                worker.failures = 0
+                future.set_result(None)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _supervise(self) -> None:
+        while not self._closing:
+            time.sleep(SUPERVISE_INTERVAL)
+            for worker in self._workers:
+                if self._closing or worker.process.is_alive():
+                    continue
+                if worker.restart_at is None:
+                    self._fail_worker(worker)
+                if time.monotonic() < worker.restart_at:
+                    continue
+                print(f"🔄 Restarting model worker {worker.id}")
+                worker.restarts += 1
+                self._spawn(worker)
+
+    def _fail_worker(self, worker: _Worker) -> None:
+        """Take an exited worker out of service and schedule its restart"""
+        code = worker.process.exitcode
+        reason = worker.error or f"exited ({code})"
+        with self._lock:
+            # predict() checks `available` under the lock, so nothing is sent
+            # to the old request queue from here on
+            worker.ready.clear()
+            lost = [seq for seq, (_, w) in self._pending.items() if w is worker]
+            futures = [self._pending.pop(seq)[0] for seq in lost]
+        for future in futures:
+            future.set_exception(
+                WorkerCrashed(f"Model worker {worker.id} {reason}")
+            )
+        worker.failures += 1
+        delay = 0.0
+        if worker.failures > 1:
+            delay = min(
+                RESTART_BACKOFF * 2 ** (worker.failures - 2), RESTART_BACKOFF_MAX
+            )
+        worker.restart_at = time.monotonic() + delay
+        print(
+            f"⚠️  Model worker {worker.id} {reason}, restarting"
+            + (f" in {delay:.0f}s" if delay else "")
+        )
+
+    def predict(self, images):
+        """
+        Run a batch on the least loaded worker (blocking)
+
+        Args:
+            images: numpy array of shape (N, 128, 128, 1)
+
+        Returns:
+            numpy float32 array of shape (N, 128, 128, 1)
+        """
+        images = np.asarray(images, dtype=np.float32)
+        if len(images) > self.capacity:
+            return np.concatenate(
+                [
+                    self.predict(images[i : i + self.capacity])
+                    for i in range(0, len(images), self.capacity)
+                ]
+            )
+
+        with self._lock:
+            workers = [w for w in self._workers if w.available]
+            if not workers:
+                raise WorkerCrashed("No model worker is running")
+            worker = min(workers, key=lambda w: w.outstanding)
+            worker.outstanding += 1
+        slot = worker.free.get()
+        try:
+            n = len(images)
+            worker.inputs[slot, :n] = images
+            future: Future = Future()
+            with self._lock:
+                # It may have exited while this thread waited for a slot
+                if not worker.available:
+                    raise WorkerCrashed(f"Model worker {worker.id} exited")
+                seq = next(self._seq)
+                self._pending[seq] = (future, worker)
+                worker.requests.put((seq, slot, n))
+            try:
+                future.result(timeout=INFERENCE_WORKER_TIMEOUT)
+            except FutureTimeout:  # not the builtin TimeoutError before 3.11
+                with self._lock:
+                    self._pending.pop(seq, None)
+                # It could still write into the slot: stop it before the slot
+                # is reused; the supervisor restarts it
+                worker.process.kill()
+                worker.process.join(timeout=5)
+                raise WorkerCrashed(
+                    f"Model worker {worker.id} did not answer within "
+                    f"{INFERENCE_WORKER_TIMEOUT:g}s"
+                )
+            return worker.outputs[slot, :n].copy()
+        finally:
+            worker.free.put(slot)
+            with self._lock:
+                worker.outstanding -= 1
+                worker.completed += 1
+
+    def shutdown(self) -> None:
+        self._closing = True
+        for worker in self._workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.requests.put(None)
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        self._responses.put(None)
+        self.dispatch_executor.shutdown(wait=False, cancel_futures=True)
+        for worker in self._workers:
+            del worker.inputs, worker.outputs
+            worker.shm.close()
+            worker.shm.unlink()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "processes": len(self._workers),
+            "ring_slots": self.slots,
+            "workers": [
+                {
+                    "id": w.id,
+                    "pid": w.process.pid if w.process is not None else None,
+                    "alive": w.process is not None and w.process.is_alive(),
+                    "outstanding": w.outstanding,
+                    "completed": w.completed,
+                    "restarts": w.restarts,
+                    "error": w.error,
+                }
+                for w in self._workers
+            ],
+        }
@@ -0,0 +1,210 @@
+"""Export the trained model to TFLite (float16 and int8) and compare runtimes.
+
+Runs after train.py (which calls it) or on its own:
+
+    docker-compose exec vision-service python export_tflite.py
+    docker-compose exec vision-service python export_tflite.py --skip-report
+
+Writes next to the Keras model:
+
+    thyroid_unet_model_fp16.tflite   float16 weights, float32 compute
+    thyroid_unet_model_int8.tflite   int8 weights and activations, calibrated
+                                     on TN3K training images
+    export_report.json               parity and performance report
+
+The report compares each runtime with the Keras model on the TN3K test fold:
+Dice / IoU of the thresholded masks against the Keras masks and against the
+ground truth, batch-1 latency, model file size and the peak memory of a
+process that loads the runtime and serves predictions from it. Serve a
+TFLite model with INFERENCE_RUNTIME=tflite_fp16 or tflite_int8.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from app.config import MODEL_PATH
+from app.model import load_model
+from app.runtimes import RUNTIMES, load_engine, model_path_for
+
+REPORT_NAME = "export_report.json"
+THRESHOLD = 0.5
+
+
+def export_fp16(model, path):
+    """Post-training float16 quantization (weights stored as float16)"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+
+def export_int8(model, calibration_images, path):
+    """Full-integer post-training quantization calibrated on sample images"""
+
+    def representative_dataset():
+        for image in calibration_images:
+            yield [image[np.newaxis].astype(np.float32)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+
+def export_models(model, x_train, keras_path=MODEL_PATH, calibration_samples=200):
+    """Write the float16 and int8 TFLite models next to keras_path"""
+    rng = np.random.default_rng(0)
+    count = min(calibration_samples, len(x_train))
+    calibration = x_train[rng.choice(len(x_train), count, replace=False)]
+
+    print("📦 Exporting TFLite float16 model...")
+    export_fp16(model, model_path_for("tflite_fp16", keras_path))
+    print(f"📦 Exporting TFLite int8 model (calibrated on {count} images)...")
+    export_int8(model, calibration, model_path_for("tflite_int8", keras_path))
+    print("✅ TFLite models exported")
+
+
+def dice_iou(a, b):
+    """Mean Dice and IoU between two stacks of binary masks"""
+    a = a.reshape(len(a), -1)
+    b = b.reshape(len(b), -1)
+    intersection = np.sum(a & b, axis=1)
+    total = np.sum(a, axis=1) + np.sum(b, axis=1)
+    union = np.sum(a | b, axis=1)
+    # Two empty masks agree perfectly
+    dice = np.where(total > 0, 2 * intersection / np.maximum(total, 1), 1.0)
+    iou = np.where(union > 0, intersection / np.maximum(union, 1), 1.0)
+    return round(float(dice.mean()), 4), round(float(iou.mean()), 4)
+
+
+def _predict_all(engine, images, batch_size=16):
+    outputs = [
+        engine.predict(images[i : i + batch_size])
+        for i in range(0, len(images), batch_size)
+    ]
+    return np.concatenate(outputs) > THRESHOLD
+
+
+def _latency_ms(engine, image, iterations=100):
+    engine.predict(image[np.newaxis])
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        engine.predict(image[np.newaxis])
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50": round(float(np.percentile(samples, 50)), 3),
+        "p95": round(float(np.percentile(samples, 95)), 3),
+    }
+
+
+# Runs in a fresh interpreter so only the runtime's own imports count (the
+# TFLite runtimes never import TensorFlow when tflite_runtime is installed)
+PROBE_SCRIPT = """
+import json, resource, sys
+import numpy as np
+from app.runtimes import load_engine
+engine, _ = load_engine(sys.argv[1], sys.argv[2])
+for _ in range(20):
+    engine.predict(np.zeros((1, 128, 128, 1), dtype=np.float32))
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"peak_rss_mb": round(peak_kb / 1024, 1)}))
+"""
+
+
+def probe_memory(runtime, keras_path=MODEL_PATH):
+    """Peak RSS (MB) of a fresh process serving predictions from a runtime"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE_SCRIPT, runtime, keras_path],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])["peak_rss_mb"]
+
+
+def parity_report(x_test, y_test, keras_path=MODEL_PATH):
+    """Compare every runtime with the Keras model on the test images"""
+    truth = y_test > THRESHOLD
+    reference = None
+    report = {"test_images": int(len(x_test)), "runtimes": {}}
+
+    for runtime in RUNTIMES:
+        engine, path = load_engine(runtime, keras_path)
+        masks = _predict_all(engine, x_test)
+        if reference is None:
+            reference = masks
+        dice_keras, iou_keras = dice_iou(masks, reference)
+        dice_truth, iou_truth = dice_iou(masks, truth)
+        report["runtimes"][runtime] = {
+            "file": os.path.basename(path),
+            "size_mb": round(os.path.getsize(path) / 1024 / 1024, 2),
+            "dice_vs_keras": dice_keras,
+            "iou_vs_keras": iou_keras,
+            "dice_vs_ground_truth": dice_truth,
+            "iou_vs_ground_truth": iou_truth,
+            "latency_ms_batch1": _latency_ms(engine, x_test[0]),
+            "peak_rss_mb": probe_memory(runtime, keras_path),
+        }
+
+    print(
+        f"\n{'runtime':<13}{'size MB':>8}{'Dice/K':>8}{'IoU/K':>8}"
+        f"{'Dice/GT':>9}{'p50 ms':>8}{'RSS MB':>8}"
+    )
+    for runtime, r in report["runtimes"].items():
+        print(
+            f"{runtime:<13}{r['size_mb']:>8}{r['dice_vs_keras']:>8}"
+            f"{r['iou_vs_keras']:>8}{r['dice_vs_ground_truth']:>9}"
+            f"{r['latency_ms_batch1']['p50']:>8}{r['peak_rss_mb']:>8}"
+        )
+
+    report_path = os.path.join(os.path.dirname(keras_path), REPORT_NAME)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📊 Report written to {report_path}")
+    return report
+
+
+def export_and_report(model, x_train, x_test, y_test, keras_path=MODEL_PATH):
+    """Export step run at the end of train.py"""
+    export_models(model, x_train, keras_path)
+    parity_report(x_test, y_test, keras_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export TFLite models")
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--skip-report", action="store_true")
+    args = parser.parse_args()
+
+    from train import dataset_arrays, training_datasets
+
+    # Only the test fold and the calibration sample are held as arrays
+    train_data, test_data = training_datasets()
+    x_test, y_test = dataset_arrays(test_data)
+    calibration, _ = dataset_arrays(train_data, limit=args.calibration_samples)
+
+    model = load_model(args.model_path)
+    export_models(model, calibration, args.model_path, args.calibration_samples)
+    if not args.skip_report:
+        parity_report(x_test, y_test, args.model_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.batcher import PredictionBatcher
+
+
+class SlowEngine:
+    """Forward pass that sleeps and records how many calls overlap"""
+
+    def __init__(self, seconds=0.1):
+        self.seconds = seconds
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, model, images):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+        return images
+
+
+def _run_batches(concurrency_after_start):
+    engine = SlowEngine()
+    pool = ThreadPoolExecutor(max_workers=4)
+    batcher = PredictionBatcher(engine, max_batch_size=1, max_wait_ms=0)
+
+    async def main():
+        batcher.start()
+        # Let the batching task start and wait for work, as in the service
+        await asyncio.sleep(0.01)
+        if concurrency_after_start:
+            batcher.set_concurrency(4, pool)
+        image = np.zeros((128, 128, 1), np.float32)
+        started = time.perf_counter()
+        await asyncio.gather(*(batcher.submit(image) for _ in range(8)))
+        elapsed = time.perf_counter() - started
+        await batcher.stop()
+        return elapsed
+
+    try:
+        elapsed = asyncio.run(main())
+        return engine.peak, elapsed
+    finally:
+        pool.shutdown()
+
+
+def test_concurrency_set_after_start_applies():
+    peak, elapsed = _run_batches(concurrency_after_start=True)
+    assert peak == 4
+    # 8 batches of 0.1 s, 4 at a time
+    assert elapsed < 0.6
+
+
+def test_default_concurrency_is_one_pass_at_a_time():
+    peak, _ = _run_batches(concurrency_after_start=False)
+    assert peak == 1
+
+
+def test_outputs_go_to_their_callers():
+    batcher = PredictionBatcher(lambda model, images: images * 2, max_wait_ms=5)
+
+    async def main():
+        images = [np.full((2, 2, 1), i, np.float32) for i in range(5)]
+        outputs = await asyncio.gather(*(batcher.submit(im) for im in images))
+        await batcher.stop()
+        return images, outputs
+
+    images, outputs = asyncio.run(main())
+    for image, output in zip(images, outputs):
+        assert np.array_equal(output, image * 2)
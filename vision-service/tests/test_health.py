@@ -0,0 +1,54 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app import registry
+from app.lifecycle import StartupTimer
+from app.routes import health, predict
+
+
+@pytest.fixture
+def timer(monkeypatch):
+    timer = StartupTimer()
+    monkeypatch.setattr(health, "timer", timer)
+    monkeypatch.setattr(registry, "timer", timer)
+    monkeypatch.setattr(predict, "active", SimpleNamespace(version="v1"))
+    return timer
+
+
+def _ready():
+    resp = asyncio.run(health.readiness())
+    return resp.status_code, json.loads(resp.body)
+
+
+def test_failed_pipeline_warmup_is_not_ready(timer):
+    with pytest.raises(RuntimeError):
+        with timer.measure("pipeline_warmup"):
+            raise RuntimeError("encoder broken")
+    timer.failed("encoder broken")
+    status, body = _ready()
+    assert status == 503
+    assert body["startup"]["failed_phase"] == "pipeline_warmup"
+
+
+def test_reload_after_failed_start_turns_ready_after_warmup(timer, monkeypatch):
+    timer.failed("model not found")
+    manager = registry.ModelManager(registry.ModelRegistry("/nonexistent"))
+
+    async def broken():
+        raise RuntimeError("still broken")
+
+    monkeypatch.setattr(predict, "warmup_pipeline", broken)
+    asyncio.run(manager._recover())
+    assert _ready()[0] == 503
+
+    async def works():
+        pass
+
+    monkeypatch.setattr(predict, "warmup_pipeline", works)
+    asyncio.run(manager._recover())
+    status, body = _ready()
+    assert status == 200
+    assert body["startup"]["error"] is None
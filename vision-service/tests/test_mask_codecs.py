@@ -0,0 +1,50 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from app import mask_codecs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STORAGE_COPY = os.path.join(
+    HERE, "..", "..", "storage-service", "app", "mask_codecs.py"
+)
+
+
+def _mask(size=64):
+    mask = np.zeros((size, size), np.uint8)
+    cv2.ellipse(mask, (size // 2, size // 3), (size // 4, size // 6), 30, 0, 360, 1, -1)
+    mask[-1, -1] = 1
+    return mask.astype(bool)
+
+
+@pytest.mark.skipif(
+    not os.path.exists(STORAGE_COPY), reason="storage-service not checked out"
+)
+def test_storage_service_copy_is_identical():
+    with open(mask_codecs.__file__, "rb") as ours, open(STORAGE_COPY, "rb") as theirs:
+        assert ours.read() == theirs.read()
+
+
+@pytest.mark.parametrize("encoding", ["png", "rle", "bitpacked"])
+def test_lossless_encodings_round_trip(encoding):
+    for mask in (_mask(), np.zeros((5, 7), bool), np.ones((3, 4), bool)):
+        decoded = mask_codecs.decode(mask_codecs.encode(mask, encoding))
+        assert np.array_equal(decoded, mask)
+
+
+def test_polygons_are_close():
+    mask = _mask(128)
+    decoded = mask_codecs.decode(mask_codecs.encode(mask, "polygons"))
+    iou = (decoded & mask).sum() / (decoded | mask).sum()
+    assert iou > 0.9
+
+
+def test_negotiate_prefers_the_query_parameter():
+    rle = mask_codecs.MEDIA_TYPES["rle"]
+    assert mask_codecs.negotiate(None, None) == "png"
+    assert mask_codecs.negotiate(None, rle) == "rle"
+    assert mask_codecs.negotiate("bitpacked", rle) == "bitpacked"
+    with pytest.raises(ValueError):
+        mask_codecs.negotiate("jpeg", None)
@@ -0,0 +1,87 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.batch_preprocessing import binarize_masks, decode_reduced, normalize_batch
+from app.preprocessing import (
+    decode_image,
+    prepare_image_for_prediction,
+    preprocessImg,
+    preprocessMask,
+)
+
+# preprocessImg returns float16 (~3 significant digits in [0, 1])
+FLOAT16_TOLERANCE = 1e-3
+SIZES = [(160, 120), (400, 300), (640, 480), (1280, 960)]
+
+
+def _encode(pixels, fmt):
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, fmt, quality=90)
+    return buf.getvalue()
+
+
+def _frame(width, height, seed=0):
+    """Smooth gradient plus noise, roughly like an ultrasound frame"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    pixels = 128 + 60 * np.sin(xx / (width / 6)) * np.cos(yy / (height / 4))
+    pixels = np.clip(pixels + rng.normal(0, 12, (height, width)), 0, 255)
+    return pixels.astype(np.uint8)
+
+
+@pytest.fixture(scope="module")
+def frames():
+    images = [_frame(w, h, seed=i) for i, (w, h) in enumerate(SIZES)]
+    # A flat image exercises the zero-span branch
+    return images + [np.full((300, 300), 77, np.uint8)]
+
+
+def test_normalize_batch_matches_preprocessImg(frames):
+    reference = np.stack([preprocessImg(img) for img in frames]).astype(np.float32)
+    batched = normalize_batch(frames)
+    assert batched.shape == (len(frames), 128, 128, 1)
+    assert batched.dtype == np.float32
+    assert np.abs(batched[..., 0] - reference).max() <= FLOAT16_TOLERANCE
+
+
+def test_normalize_batch_writes_into_preallocated_buffer(frames):
+    out = np.empty((len(frames) + 3, 128, 128, 1), np.float32)
+    batched = normalize_batch(frames, out=out)
+    assert len(batched) == len(frames)
+    assert np.shares_memory(batched, out)
+    assert np.array_equal(batched, normalize_batch(frames))
+
+
+def test_binarize_masks_matches_preprocessMask(frames):
+    masks = [(img > np.median(img)).astype(np.uint8) for img in frames]
+    reference = np.stack([preprocessMask(m) for m in masks])
+    assert np.array_equal(binarize_masks(masks)[..., 0], reference)
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+@pytest.mark.parametrize("width,height", SIZES)
+def test_served_decode_matches_training_path(fmt, width, height):
+    """What /api/predict feeds the model is what train.py trains on"""
+    data = _encode(_frame(width, height), fmt)
+    decoded, size = decode_reduced(data)
+    assert size == (width, height)
+    served = normalize_batch([decoded])
+    reference = prepare_image_for_prediction(data).astype(np.float32)
+    assert np.abs(served - reference).max() <= FLOAT16_TOLERANCE
+
+
+@pytest.mark.parametrize("width,height", SIZES)
+def test_reduced_decode_keeps_original_size(width, height):
+    data = _encode(_frame(width, height), "JPEG")
+    decoded, size = decode_reduced(data, reduced=True)
+    assert size == (width, height)
+    assert min(decoded.shape) >= min(128, height)
+    assert decoded.shape[0] <= height and decoded.shape[1] <= width
+
+
+def test_decode_image_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_image(b"not an image")
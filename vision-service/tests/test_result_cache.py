@@ -0,0 +1,55 @@
+import asyncio
+
+from app.result_cache import DiskStore, ResultCache
+
+
+def test_cancelling_the_first_caller_keeps_the_shared_result():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"mask": "m"}
+
+    async def main():
+        cache = ResultCache(directory="")
+        first = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+        return cache, result
+
+    cache, result = asyncio.run(main())
+    assert result == {"mask": "m"}
+    assert calls == [1]
+    assert cache.coalesced == 1
+    assert cache.memory.get("k") is not None
+
+
+def test_failures_reach_every_caller_and_are_not_cached():
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("bad image")
+
+    async def main():
+        cache = ResultCache(directory="")
+        results = await asyncio.gather(
+            cache.get_or_compute("k", compute),
+            cache.get_or_compute("k", compute),
+            return_exceptions=True,
+        )
+        return cache, results
+
+    cache, results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert cache.memory.get("k") is None
+
+
+def test_disk_store_counts_overwritten_entries_once(tmp_path):
+    store = DiskStore(str(tmp_path), max_bytes=1 << 20)
+    store.write("k", b"x" * 100)
+    store.write("k", b"y" * 40)
+    assert store._bytes == 40
+    assert store.read("k") == b"y" * 40
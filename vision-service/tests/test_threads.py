@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from app import threads
+
+
+@pytest.fixture
+def autotune_file(tmp_path, monkeypatch):
+    path = tmp_path / "autotune.json"
+    monkeypatch.setattr(threads, "INFERENCE_AUTOTUNE_FILE", str(path))
+    monkeypatch.setattr(threads, "PREDICT_MAX_BATCH_SIZE", 16)
+    monkeypatch.setattr(threads, "PREDICT_MAX_BATCH_SIZE_PINNED", False)
+    threads.tuned_settings.cache_clear()
+    yield path
+    threads.tuned_settings.cache_clear()
+
+
+def _write(path, **values):
+    tuned = {
+        "runtime": "keras",
+        "cpus": threads.cpu_budget(),
+        "processes": 0,
+        "intra_op": 1,
+        "inter_op": 1,
+        **values,
+    }
+    path.write_text(json.dumps(tuned))
+
+
+def test_tuned_batch_size_caps_batches(autotune_file):
+    _write(autotune_file, best_batch_size=8)
+    assert threads.max_batch_size("keras", 0) == 8
+
+
+def test_tuned_batch_size_never_exceeds_the_configured_maximum(autotune_file):
+    _write(autotune_file, best_batch_size=64)
+    assert threads.max_batch_size("keras", 0) == 16
+
+
+def test_explicit_maximum_wins(autotune_file, monkeypatch):
+    monkeypatch.setattr(threads, "PREDICT_MAX_BATCH_SIZE_PINNED", True)
+    _write(autotune_file, best_batch_size=8)
+    assert threads.max_batch_size("keras", 0) == 16
+
+
+def test_file_for_another_setup_is_ignored(autotune_file):
+    _write(autotune_file, best_batch_size=8, processes=3)
+    assert threads.max_batch_size("keras", 0) == 16
+    assert threads.max_batch_size("tflite_int8", 0) == 16
@@ -0,0 +1,75 @@
+import queue
+import time
+
+import numpy as np
+import pytest
+
+from app import workers
+from app.workers import ProcessEnginePool, WorkerCrashed
+
+
+@pytest.fixture
+def broken_pool(monkeypatch):
+    """Pool whose worker can never load its model"""
+    monkeypatch.setattr(workers, "SUPERVISE_INTERVAL", 0.05)
+    monkeypatch.setattr(workers, "RESTART_BACKOFF", 0.5)
+    pool = ProcessEnginePool("missing", "/nonexistent/model.keras", 1, capacity=2)
+    with pytest.raises(RuntimeError, match="Could not load model"):
+        pool.warmup((1,), timeout=60)
+    yield pool
+    pool.shutdown()
+
+
+def test_predict_fails_at_once_without_a_running_worker(broken_pool):
+    start = time.monotonic()
+    with pytest.raises(WorkerCrashed):
+        broken_pool.predict(np.zeros((1, 128, 128, 1), np.float32))
+    assert time.monotonic() - start < 1
+
+
+def test_failing_worker_restarts_back_off(broken_pool):
+    time.sleep(3)
+    worker = broken_pool.stats["workers"][0]
+    # Every 0.05s without backoff; with it after 0s, 0.5s, 1s, 2s
+    assert 1 <= worker["restarts"] <= 4
+    assert broken_pool._workers[0].failures >= 2
+
+
+class HungProcess:
+    """Stands in for a worker process that never answers"""
+
+    def __init__(self):
+        self.killed = False
+        self.pid = None
+        self.exitcode = None
+
+    def is_alive(self):
+        return not self.killed
+
+    def kill(self):
+        self.killed = True
+        self.exitcode = -9
+
+    def join(self, timeout=None):
+        pass
+
+
+def test_hung_worker_is_killed_and_its_batch_fails(monkeypatch):
+    monkeypatch.setattr(workers, "INFERENCE_WORKER_TIMEOUT", 0.2)
+    pool = ProcessEnginePool("keras", "/nonexistent/model.keras", 1, slots=1)
+    worker = pool._workers[0]
+    worker.process = HungProcess()
+    worker.requests = queue.Queue()
+    worker.ready.set()
+    try:
+        start = time.monotonic()
+        with pytest.raises(WorkerCrashed, match="did not answer"):
+            pool.predict(np.zeros((1, 128, 128, 1), np.float32))
+        assert time.monotonic() - start < 2
+        assert worker.process.killed
+        assert not pool._pending
+        # The slot is reusable only because the worker can't write into it
+        assert worker.free.qsize() == 1
+        assert not worker.available
+    finally:
+        pool.shutdown()
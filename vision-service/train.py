@@ -1,17 +1,39 @@
-"""Training script for thyroid segmentation model"""
-
+"""Training script for thyroid segmentation model
+
+Images are streamed through a tf.data pipeline by default: decoded and
+preprocessed in parallel, cached as compact 128x128 tensors after the first
+epoch, shuffled through a bounded buffer and prefetched while the model
+trains, so memory stays near the size of the preprocessed dataset instead of
+several full-resolution copies.
+
+    python train.py                              # streaming pipeline
+    python train.py --cache-dir /app/data/cache  # cache on disk, not in RAM
+    python train.py --pipeline arrays            # previous all-in-RAM path
+    python train.py --compare-pipelines          # memory / epoch time report
+"""
+
+import argparse
+import json
 import os
+import resource
+import subprocess
 import sys
+import time
 import numpy as np
 import cv2
-import subprocess
+import tensorflow as tf
 from app.model import build_unet_model
-from app.preprocessing import preprocessImg, preprocessMask
+from app.batch_preprocessing import TARGET_SIZE, binarize_masks, normalize_batch
 
 # Paths
 DATA_DIR = "/app/data"
 MODEL_PATH = "/app/models/thyroid_unet_model.keras"
 DATASET_NAME = "tjahan/tn3k-thyroid-nodule-region-segmentation-dataset"
+PIPELINE_REPORT_NAME = "input_pipeline_report.json"
+
+BATCH_SIZE = 16
+# Training samples held in the shuffle buffer (about 32 KB each once cached)
+SHUFFLE_BUFFER = 1024
 
 
 def download_dataset():
@@ -44,10 +66,8 @@ def download_dataset():
         sys.exit(1)
 
 
-def load_images_and_masks():
-    """Load all images and masks from dataset"""
-    print("📂 Loading images and masks...")
-
+def list_image_and_mask_files():
+    """Paths of all images and their masks (paired by sorted order)"""
     image_folder = f"{DATA_DIR}/trainval-image"
     mask_folder = f"{DATA_DIR}/trainval-mask"
 
@@ -56,22 +76,41 @@ def load_images_and_masks():
             "Dataset folders not found. Run download_dataset() first."
         )
 
-    image_files = sorted(os.listdir(image_folder))
-    mask_files = sorted(os.listdir(mask_folder))
+    image_files = [
+        os.path.join(image_folder, f) for f in sorted(os.listdir(image_folder))
+    ]
+    mask_files = [
+        os.path.join(mask_folder, f) for f in sorted(os.listdir(mask_folder))
+    ]
+    return image_files, mask_files
+
+
+def fold_indices(count, test_fold=2):
+    """Train and test indices of 5-fold cross-validation (every 5th is test)"""
+    test_idx = [i for i in range(count) if i % 5 == test_fold]
+    train_idx = [i for i in range(count) if i % 5 != test_fold]
+    return train_idx, test_idx
+
 
-    images = []
-    masks = []
+def read_image(path):
+    """First channel of an image file at full resolution"""
+    return cv2.imread(os.fsdecode(path))[:, :, 0]
 
-    for img_file in image_files:
-        img_path = os.path.join(image_folder, img_file)
-        img = cv2.imread(img_path)[:, :, 0]
-        images.append(img)
 
-    for mask_file in mask_files:
-        mask_path = os.path.join(mask_folder, mask_file)
-        mask = cv2.imread(mask_path)[:, :, 0]
-        mask = np.array(mask > 0.5, dtype=np.uint8)
-        masks.append(mask)
+def read_mask(path):
+    """Mask file as a 0 / 1 uint8 array"""
+    mask = cv2.imread(os.fsdecode(path))[:, :, 0]
+    return np.array(mask > 0.5, dtype=np.uint8)
+
+
+def load_images_and_masks():
+    """Load all images and masks from dataset (in-memory path)"""
+    print("📂 Loading images and masks...")
+
+    image_files, mask_files = list_image_and_mask_files()
+
+    images = [read_image(path) for path in image_files]
+    masks = [read_mask(path) for path in mask_files]
 
     print(f"✅ Loaded {len(images)} images and {len(masks)} masks")
     return images, masks
@@ -88,55 +127,283 @@ def prepare_training_data(images, masks, test_fold=2):
     """
     print(f"🔄 Preparing data (test fold: {test_fold})...")
 
-    x_train = []
-    y_train = []
-    x_test = []
-    y_test = []
-
-    for i in range(len(images)):
-        if i % 5 == test_fold:
-            x_test.append(preprocessImg(images[i]))
-            y_test.append(preprocessMask(masks[i]))
-        else:
-            x_train.append(preprocessImg(images[i]))
-            y_train.append(preprocessMask(masks[i]))
+    train_idx, test_idx = fold_indices(len(images), test_fold)
 
-    x_train = np.array(x_train, dtype="float32")  # Changed from float16
-    y_train = np.array(y_train, dtype="float32")  # Changed from uint8
-    x_test = np.array(x_test, dtype="float32")  # Changed from float16
-    y_test = np.array(y_test, dtype="float32")  # Changed from uint8
-
-    # Add channel dimension
-    x_train = x_train[..., np.newaxis]
-    y_train = y_train[..., np.newaxis]
-    x_test = x_test[..., np.newaxis]
-    y_test = y_test[..., np.newaxis]
+    # Whole splits are resized and scaled at once into float32 arrays with
+    # a channel dimension (see app/batch_preprocessing.py)
+    x_train = normalize_batch([images[i] for i in train_idx])
+    y_train = binarize_masks([masks[i] for i in train_idx])
+    x_test = normalize_batch([images[i] for i in test_idx])
+    y_test = binarize_masks([masks[i] for i in test_idx])
 
     print(f"   Train: {x_train.shape}, Test: {x_test.shape}")
     return x_train, y_train, x_test, y_test
 
 
-def train_model(x_train, y_train, x_test, y_test, epochs=120):
-    """Train the U-Net model"""
+def _load_pair(image_path, mask_path):
+    """
+    Read one image / mask pair and resize both to 128x128 uint8, exactly as
+    prepare_training_data does (runs on tf.data threads; OpenCV releases the
+    GIL while decoding and resizing)
+    """
+    image = cv2.resize(read_image(image_path), (TARGET_SIZE, TARGET_SIZE))
+    out = np.empty((1, TARGET_SIZE, TARGET_SIZE, 1), np.uint8)
+    mask = binarize_masks([read_mask(mask_path)], out=out)[0]
+    return image[..., np.newaxis], mask
+
+
+def _load_pair_op(image_path, mask_path):
+    image, mask = tf.numpy_function(
+        _load_pair, [image_path, mask_path], [tf.uint8, tf.uint8]
+    )
+    image.set_shape((TARGET_SIZE, TARGET_SIZE, 1))
+    mask.set_shape((TARGET_SIZE, TARGET_SIZE, 1))
+    return image, mask
+
+
+def _normalize(images, masks):
+    """Per-image min-max scaling of a batch, as normalize_batch"""
+    images = tf.cast(images, tf.float32)
+    low = tf.reduce_min(images, axis=[1, 2, 3], keepdims=True)
+    span = tf.reduce_max(images, axis=[1, 2, 3], keepdims=True) - low
+    # Flat images become all zeros, as in preprocessImg
+    scaled = (images - low) / tf.maximum(span, 1.0)
+    images = tf.where(span > 0, scaled, tf.zeros_like(scaled))
+    return images, tf.cast(masks, tf.float32)
+
+
+def make_dataset(
+    image_paths, mask_paths, training, cache_file="", batch_size=BATCH_SIZE
+):
+    """
+    Streaming dataset of (image, mask) batches
+
+    Args:
+        image_paths, mask_paths: Files of the split, paired by position
+        training: Shuffle through SHUFFLE_BUFFER, differently every epoch
+        cache_file: Cache the decoded uint8 tensors in this file ("": memory)
+        batch_size: Images per batch
+    """
+    dataset = tf.data.Dataset.from_tensor_slices(
+        (list(image_paths), list(mask_paths))
+    )
+    dataset = dataset.map(_load_pair_op, num_parallel_calls=tf.data.AUTOTUNE)
+    # uint8 tensors, 4x smaller than the float32 batches they become
+    dataset = dataset.cache(cache_file)
+    if training:
+        dataset = dataset.shuffle(SHUFFLE_BUFFER, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(_normalize, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def training_datasets(test_fold=2, cache_dir=""):
+    """
+    Train and test datasets for a fold of 5-fold cross-validation
+
+    Args:
+        test_fold: Which fold to use as test set (0-4)
+        cache_dir: Directory for the tensor cache files ("": cache in memory).
+            Delete it when the dataset or preprocessing changes.
+    """
+    print(f"🔄 Building input pipeline (test fold: {test_fold})...")
+    image_files, mask_files = list_image_and_mask_files()
+    train_idx, test_idx = fold_indices(len(image_files), test_fold)
+    # Fixed file order for the cache; the shuffle buffer then mixes batches
+    # differently every epoch
+    train_idx = list(np.random.default_rng(0).permutation(train_idx))
+
+    def cache_file(split):
+        if not cache_dir:
+            return ""
+        os.makedirs(cache_dir, exist_ok=True)
+        return os.path.join(cache_dir, f"fold{test_fold}-{split}")
+
+    train_data = make_dataset(
+        [image_files[i] for i in train_idx],
+        [mask_files[i] for i in train_idx],
+        training=True,
+        cache_file=cache_file("train"),
+    )
+    test_data = make_dataset(
+        [image_files[i] for i in test_idx],
+        [mask_files[i] for i in test_idx],
+        training=False,
+        cache_file=cache_file("test"),
+    )
+    print(f"   Train: {len(train_idx)} images, Test: {len(test_idx)} images")
+    return train_data, test_data
+
+
+def dataset_arrays(dataset, limit=None):
+    """Stack (up to `limit` images of) a dataset into numpy arrays"""
+    images, masks = [], []
+    count = 0
+    for x, y in dataset:
+        images.append(x.numpy())
+        masks.append(y.numpy())
+        count += len(images[-1])
+        if limit is not None and count >= limit:
+            break
+    x, y = np.concatenate(images), np.concatenate(masks)
+    return (x[:limit], y[:limit]) if limit is not None else (x, y)
+
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    """Wall time of every epoch (seconds)"""
+
+    def on_train_begin(self, logs=None):
+        self.seconds = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.seconds.append(round(time.perf_counter() - self._start, 2))
+
+
+def train_model(x, y=None, validation_data=None, epochs=120, callbacks=None):
+    """
+    Train the U-Net model
+
+    Args:
+        x: A tf.data dataset of batches, or the training images (with y)
+        y: Training masks when x is an array
+        validation_data: Dataset or (images, masks)
+    """
     print(f"🚀 Starting training for {epochs} epochs...")
 
     model = build_unet_model()
 
     history = model.fit(
-        x=x_train,
-        y=y_train,
-        validation_data=(x_test, y_test),
+        x=x,
+        y=y,
+        validation_data=validation_data,
         epochs=epochs,
-        batch_size=16,
-        shuffle=True,
+        # Datasets come batched and shuffled
+        batch_size=BATCH_SIZE if y is not None else None,
+        shuffle=y is not None,
+        callbacks=callbacks,
         verbose=1,
     )
 
     return model, history
 
 
-def main():
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def probe_pipeline(pipeline, epochs, cache_dir=""):
+    """Train `epochs` epochs on one input path and measure it (no saving)"""
+    started = time.perf_counter()
+    if pipeline == "arrays":
+        images, masks = load_images_and_masks()
+        x_train, y_train, x_test, y_test = prepare_training_data(images, masks)
+        train_args = {"x": x_train, "y": y_train}
+        validation = (x_test, y_test)
+    else:
+        train_data, test_data = training_datasets(cache_dir=cache_dir)
+        train_args = {"x": train_data}
+        validation = test_data
+    data_seconds = round(time.perf_counter() - started, 2)
+    rss_after_data = _rss_mb()
+
+    timer = EpochTimer()
+    train_model(
+        **train_args, validation_data=validation, epochs=epochs, callbacks=[timer]
+    )
+    return {
+        "data_ready_seconds": data_seconds,
+        "rss_after_data_mb": rss_after_data,
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "epoch_seconds": timer.seconds,
+    }
+
+
+def compare_pipelines(epochs, cache_dir=""):
+    """
+    Run both input paths in fresh processes and report memory and epoch times
+
+    Peak RSS covers the whole process (TensorFlow and the model are the same
+    for both), so the difference is what the input path costs.
+    """
+    image_files, mask_files = list_image_and_mask_files()
+    dataset_mb = sum(os.path.getsize(p) for p in image_files + mask_files) / 2**20
+    report = {
+        "dataset_images": len(image_files),
+        "dataset_files_mb": round(dataset_mb, 1),
+        "epochs": epochs,
+        "pipelines": {},
+    }
+    for pipeline in ("arrays", "stream"):
+        print(f"⏱️  Training {epochs} epochs with the {pipeline} input path...")
+        command = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--probe",
+            "--pipeline",
+            pipeline,
+            "--epochs",
+            str(epochs),
+            "--cache-dir",
+            cache_dir,
+        ]
+        result = subprocess.run(
+            command, check=True, stdout=subprocess.PIPE, text=True
+        )
+        report["pipelines"][pipeline] = json.loads(result.stdout.splitlines()[-1])
+
+    print(
+        f"\n{'pipeline':<9}{'data s':>8}{'RSS MB':>9}{'peak MB':>9}"
+        f"{'epoch 1 s':>11}{'later s':>9}"
+    )
+    for pipeline, r in report["pipelines"].items():
+        later = r["epoch_seconds"][1:]
+        later_s = f"{np.mean(later):.1f}" if later else "-"
+        print(
+            f"{pipeline:<9}{r['data_ready_seconds']:>8}{r['rss_after_data_mb']:>9}"
+            f"{r['peak_rss_mb']:>9}{r['epoch_seconds'][0]:>11}{later_s:>9}"
+        )
+
+    report_path = os.path.join(os.path.dirname(MODEL_PATH), PIPELINE_REPORT_NAME)
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📊 Report written to {report_path}")
+    return report
+
+
+def main(argv=None):
     """Main training pipeline"""
+    parser = argparse.ArgumentParser(description="Train the segmentation model")
+    parser.add_argument("--pipeline", choices=("stream", "arrays"), default="stream")
+    parser.add_argument("--epochs", type=int, default=120)
+    parser.add_argument(
+        "--cache-dir",
+        default="",
+        help="Cache preprocessed tensors on disk here instead of in memory",
+    )
+    parser.add_argument(
+        "--compare-pipelines",
+        action="store_true",
+        help="Report memory and epoch time of both input paths, then exit",
+    )
+    parser.add_argument("--compare-epochs", type=int, default=2)
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        result = probe_pipeline(args.pipeline, args.epochs, args.cache_dir)
+        print(json.dumps(result))
+        return
+
     print("=" * 60)
     print("THYROID SEGMENTATION MODEL TRAINING")
     print("=" * 60)
@@ -144,14 +411,25 @@ def main():
     # Step 1: Download dataset
     download_dataset()
 
-    # Step 2: Load data
-    images, masks = load_images_and_masks()
+    if args.compare_pipelines:
+        compare_pipelines(args.compare_epochs, args.cache_dir)
+        return
 
-    # Step 3: Prepare training data
-    x_train, y_train, x_test, y_test = prepare_training_data(images, masks)
+    # Step 2 and 3: Load and prepare training data
+    if args.pipeline == "arrays":
+        images, masks = load_images_and_masks()
+        x_train, y_train, x_test, y_test = prepare_training_data(images, masks)
+        train_args = {"x": x_train, "y": y_train}
+        validation = (x_test, y_test)
+    else:
+        train_data, test_data = training_datasets(cache_dir=args.cache_dir)
+        train_args = {"x": train_data}
+        validation = test_data
 
     # Step 4: Train model
-    model, history = train_model(x_train, y_train, x_test, y_test, epochs=120)
+    model, history = train_model(
+        **train_args, validation_data=validation, epochs=args.epochs
+    )
 
     # Step 5: Save model
     print(f"💾 Saving model to {MODEL_PATH}...")
@@ -161,10 +439,27 @@ def main():
 
     # Step 6: Evaluate
     print("\n📊 Final Evaluation:")
-    loss, accuracy = model.evaluate(x_test, y_test, verbose=0)
+    if not isinstance(validation, tuple):
+        validation = (validation,)
+    loss, accuracy = model.evaluate(*validation, verbose=0)
     print(f"   Test Loss: {loss:.4f}")
     print(f"   Test Accuracy: {accuracy:.4f}")
 
+    # Step 7: Export lightweight TFLite models and compare them with Keras.
+    # The test fold (a fifth of the data) and the int8 calibration sample
+    # are the only parts held in memory as arrays.
+    try:
+        from export_tflite import export_and_report
+
+        if args.pipeline == "arrays":
+            calibration = x_train
+        else:
+            x_test, y_test = dataset_arrays(test_data)
+            calibration, _ = dataset_arrays(train_data, limit=200)
+        export_and_report(model, calibration, x_test, y_test, MODEL_PATH)
+    except Exception as e:
+        print(f"⚠️  TFLite export failed (Keras model is unaffected): {e}")
+
     print("\n" + "=" * 60)
     print("✅ TRAINING COMPLETE!")
     print("=" * 60)